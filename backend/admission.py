@@ -0,0 +1,283 @@
+"""Admission control in front of Bedrock: every model call takes a permit first.
+
+Two token buckets bound what this process sends upstream: one in requests
+(BEDROCK_RPS, burst BEDROCK_BURST) and one in estimated tokens (BEDROCK_TPM, burst
+BEDROCK_TOKEN_BURST). Those limits are for the whole deployment on this host: each of the
+BEDROCK_ADMISSION_PROCESSES server processes (default WEB_CONCURRENCY, which gunicorn and
+uvicorn both use as their worker count) gets an equal share. A call's token cost is estimated from its prompt plus its expected
+output, and corrected with the real usage Bedrock reports once the call returns.
+
+Calls that can't be admitted at once queue in priority order: the 'premium' lane (users
+whose profile has `is_premium`) is always served before 'standard'. A call waits at most
+its lane's max wait; if the estimated wait is already longer, or BEDROCK_ADMISSION_MAX_WAITING
+calls are queued, it fails fast with Throttled (HTTP 429) instead of piling onto the
+upstream. BEDROCK_ADMISSION_MODE=reject turns waiting off for interactive requests.
+
+The lane is taken from a context variable set per request (see `lane`); it may hold a
+zero-argument callable so the profile lookup only happens for requests that reach the model.
+"""
+import collections
+import contextlib
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+
+import material_chunks
+
+PREMIUM, STANDARD = 'premium', 'standard'
+LANES = (PREMIUM, STANDARD)
+
+# 0 disables a bucket
+BEDROCK_RPS = float(os.getenv('BEDROCK_RPS', 10))
+BEDROCK_BURST = float(os.getenv('BEDROCK_BURST') or max(1.0, BEDROCK_RPS * 2))
+BEDROCK_TPM = float(os.getenv('BEDROCK_TPM', 200000))
+BEDROCK_TOKEN_BURST = float(os.getenv('BEDROCK_TOKEN_BURST') or BEDROCK_TPM / 4)
+# Output tokens reserved per call until the real usage is known (capped by the call's maxTokens)
+BEDROCK_OUTPUT_TOKEN_ESTIMATE = int(os.getenv('BEDROCK_OUTPUT_TOKEN_ESTIMATE', 1500))
+# 'wait' queues up to the lane's max wait; 'reject' answers 429 whenever there's no capacity right now
+BEDROCK_ADMISSION_MODE = os.getenv('BEDROCK_ADMISSION_MODE', 'wait').lower()
+BEDROCK_ADMISSION_MAX_WAIT = float(os.getenv('BEDROCK_ADMISSION_MAX_WAIT', 5))
+BEDROCK_ADMISSION_PREMIUM_MAX_WAIT = float(os.getenv('BEDROCK_ADMISSION_PREMIUM_MAX_WAIT', 20))
+# Background jobs (jobs.py) have no client holding a connection open, so they may wait longer
+BEDROCK_ADMISSION_JOB_MAX_WAIT = float(os.getenv('BEDROCK_ADMISSION_JOB_MAX_WAIT', 120))
+BEDROCK_ADMISSION_MAX_WAITING = int(os.getenv('BEDROCK_ADMISSION_MAX_WAITING', 64))
+# Every server process has its own buckets, so the limits above are split between them
+BEDROCK_ADMISSION_PROCESSES = max(1, int(os.getenv('BEDROCK_ADMISSION_PROCESSES') or os.getenv('WEB_CONCURRENCY') or 1))
+
+_lane = contextvars.ContextVar('bedrock_lane', default=STANDARD)
+_max_wait = contextvars.ContextVar('bedrock_max_wait', default=None)
+
+
+class Throttled(Exception):
+    """No capacity for this call within its allowed wait; callers answer 429."""
+
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(f"Bedrock admission: {reason}")
+        self.retry_after = max(1, int(retry_after + 0.999))
+        self.reason = reason
+
+    def payload(self) -> dict:
+        return {'error': 'Too many generation requests, retry shortly', 'reason': self.reason, 'retryAfter': self.retry_after}
+
+
+class TokenBucket:
+    """`rate` units per second, holding at most `capacity`; the level may go negative after settling."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.level = capacity
+        self._stamp = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def wait_for(self, amount: float) -> float:
+        """Seconds until `amount` is available (call refill first)."""
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+    def give(self, amount: float):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class LaneMetrics:
+    def __init__(self, samples: int = 512):
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.waiting = 0
+        self.queue_ms = collections.deque(maxlen=samples)
+
+    def snapshot(self) -> dict:
+        times = sorted(self.queue_ms)
+
+        def pct(p):
+            return round(times[min(len(times) - 1, int(p * len(times)))], 1) if times else 0.0
+        return {'admitted': self.admitted, 'queued': self.queued, 'rejected': self.rejected,
+                'timedOut': self.timed_out, 'waiting': self.waiting,
+                'queueMs': {'p50': pct(0.5), 'p95': pct(0.95), 'max': round(times[-1], 1) if times else 0.0}}
+
+
+class Permit:
+    def __init__(self, controller, tokens: float, lane: str, queue_ms: float):
+        self.controller = controller
+        self.tokens = tokens
+        self.lane = lane
+        self.queue_ms = queue_ms
+
+    def settle(self, usage=None):
+        """Correct the token reservation with Bedrock's reported usage; None refunds it (call failed)."""
+        actual = 0
+        if isinstance(usage, dict):
+            actual = usage.get('totalTokens') or (usage.get('inputTokens', 0) + usage.get('outputTokens', 0))
+        self.controller._refund(self.tokens - actual)
+
+
+class AdmissionController:
+    def __init__(self, rps: float = BEDROCK_RPS, burst: float = BEDROCK_BURST, tpm: float = BEDROCK_TPM,
+                 token_burst: float = BEDROCK_TOKEN_BURST, max_waiting: int = BEDROCK_ADMISSION_MAX_WAITING):
+        self.requests = TokenBucket(rps, burst) if rps > 0 else None
+        self.tokens = TokenBucket(tpm / 60, token_burst) if tpm > 0 and token_burst > 0 else None
+        self.max_waiting = max_waiting
+        self.metrics = {name: LaneMetrics() for name in LANES}
+        self._cond = threading.Condition()
+        self._waiting = []
+        self._seq = itertools.count()
+
+    @property
+    def enabled(self) -> bool:
+        return self.requests is not None or self.tokens is not None
+
+    def _wait_for(self, requests: int, tokens: float, now: float) -> float:
+        wait = 0.0
+        if self.requests is not None:
+            self.requests.refill(now)
+            wait = self.requests.wait_for(requests)
+        if self.tokens is not None:
+            self.tokens.refill(now)
+            wait = max(wait, self.tokens.wait_for(tokens))
+        return wait
+
+    def _take(self, tokens: float):
+        if self.requests is not None:
+            self.requests.take(1)
+        if self.tokens is not None:
+            self.tokens.take(tokens)
+
+    def _refund(self, tokens: float):
+        if self.tokens is None or not tokens:
+            return
+        with self._cond:
+            self.tokens.refill(time.monotonic())
+            self.tokens.give(tokens)
+            self._cond.notify_all()
+
+    def _admitted(self, metrics: LaneMetrics, tokens: float, lane: str, started: float) -> Permit:
+        queue_ms = (time.monotonic() - started) * 1000
+        metrics.admitted += 1
+        metrics.queue_ms.append(queue_ms)
+        if queue_ms >= 1000:
+            print(f"admission: {lane} call waited {queue_ms:.0f} ms for Bedrock capacity")
+        return Permit(self, tokens, lane, queue_ms)
+
+    def acquire(self, tokens: float, lane: str = STANDARD, max_wait: float = 0.0) -> Permit:
+        """Block until the call may go upstream, or raise Throttled."""
+        if not self.enabled:
+            return Permit(self, 0, lane, 0.0)
+        started = time.monotonic()
+        metrics = self.metrics[lane]
+        with self._cond:
+            ticket = (LANES.index(lane), next(self._seq), tokens)
+            ahead = [t for t in self._waiting if t < ticket]
+            # everything queued ahead of this call is served first, so it waits for their share too
+            estimate = self._wait_for(len(ahead) + 1, sum(t[2] for t in ahead) + tokens, started)
+            if not ahead and estimate == 0:
+                self._take(tokens)
+                return self._admitted(metrics, tokens, lane, started)
+            if estimate > max_wait:
+                metrics.rejected += 1
+                raise Throttled(estimate, 'rate limit')
+            if len(self._waiting) >= self.max_waiting:
+                metrics.rejected += 1
+                raise Throttled(estimate, 'too many calls waiting')
+
+            heapq.heappush(self._waiting, ticket)
+            metrics.queued += 1
+            metrics.waiting += 1
+            deadline = started + max_wait
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = deadline - now
+                    if self._waiting[0] == ticket:
+                        needed = self._wait_for(1, tokens, now)
+                        if needed == 0:
+                            heapq.heappop(self._waiting)
+                            self._take(tokens)
+                            self._cond.notify_all()
+                            return self._admitted(metrics, tokens, lane, started)
+                        wait = min(wait, needed)
+                    if deadline - now <= 0:
+                        metrics.timed_out += 1
+                        raise Throttled(self._wait_for(1, tokens, now), 'timed out waiting for capacity')
+                    self._cond.wait(wait)
+            finally:
+                metrics.waiting -= 1
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                    self._cond.notify_all()
+
+    def stats(self) -> dict:
+        with self._cond:
+            now = time.monotonic()
+            buckets = {}
+            for name, bucket in (('requests', self.requests), ('tokens', self.tokens)):
+                if bucket is not None:
+                    bucket.refill(now)
+                    buckets[name] = {'level': round(bucket.level, 1), 'capacity': bucket.capacity,
+                                     'ratePerSecond': round(bucket.rate, 2)}
+            return {'enabled': self.enabled, 'mode': BEDROCK_ADMISSION_MODE, 'processes': BEDROCK_ADMISSION_PROCESSES,
+                    'buckets': buckets,
+                    'lanes': {name: m.snapshot() for name, m in self.metrics.items()}}
+
+
+controller = AdmissionController(BEDROCK_RPS / BEDROCK_ADMISSION_PROCESSES,
+                                 max(1.0, BEDROCK_BURST / BEDROCK_ADMISSION_PROCESSES),
+                                 BEDROCK_TPM / BEDROCK_ADMISSION_PROCESSES,
+                                 BEDROCK_TOKEN_BURST / BEDROCK_ADMISSION_PROCESSES)
+
+
+@contextlib.contextmanager
+def lane(name, max_wait: float = None):
+    """Run the enclosed model calls in lane `name` (or a callable returning it), optionally with a max wait."""
+    lane_token = _lane.set(name)
+    wait_token = _max_wait.set(max_wait)
+    try:
+        yield
+    finally:
+        _lane.reset(lane_token)
+        _max_wait.reset(wait_token)
+
+
+def set_lane(name):
+    """Set the lane for the rest of the current context (e.g. a Flask before_request hook)."""
+    _lane.set(name)
+    _max_wait.set(None)
+
+
+def current_lane() -> str:
+    name = _lane.get()
+    if callable(name):
+        try:
+            name = name()
+        except Exception as e:
+            print(f"admission: lane lookup failed, using {STANDARD}: {e}")
+            name = STANDARD
+    return name if name in LANES else STANDARD
+
+
+def estimate_cost(body: dict, request: str) -> float:
+    """Prompt tokens plus the output we expect, never more than the call's maxTokens."""
+    max_tokens = (body.get('inferenceConfig') or {}).get('maxTokens') or BEDROCK_OUTPUT_TOKEN_ESTIMATE
+    return material_chunks.estimate_tokens(request) + min(max_tokens, BEDROCK_OUTPUT_TOKEN_ESTIMATE)
+
+
+def admit(body: dict, request: str) -> Permit:
+    """Permit for one model call in the current lane; raises Throttled when there's no room."""
+    name = current_lane()
+    max_wait = _max_wait.get()
+    if max_wait is None:
+        if BEDROCK_ADMISSION_MODE == 'reject':
+            max_wait = 0.0
+        else:
+            max_wait = BEDROCK_ADMISSION_PREMIUM_MAX_WAIT if name == PREMIUM else BEDROCK_ADMISSION_MAX_WAIT
+    return controller.acquire(estimate_cost(body, request), name, max_wait)
@@ -1,18 +1,29 @@
+import settings
+settings.load_env()
+
+import admission
 import aws
+import aws_clients
 import auth
-import boto3
 import os
-import PyPDF2
-import stripe
-from botocore.exceptions import BotoCoreError, ClientError
-from dotenv import load_dotenv, find_dotenv
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS, cross_origin
 import json
+import threading
+import time
 import uuid
 import string
 import random
 import dynamodb_helper as db
+import game_events
+import jobs
+import leaderboard
+import question_scheduler
+import extraction
+import material_index
+import mcq_validation
+import warmup
+from response_cache import ResponseCache
 
 # import aws_cdk as cdk
 # from lib.quiz_stack import QuizRealtimeStack
@@ -24,31 +35,96 @@ import dynamodb_helper as db
 from werkzeug.utils import secure_filename
 
 
-dotenv_path = find_dotenv()
-if dotenv_path:
-    load_dotenv(dotenv_path)
-    print(f"Loaded .env from: {dotenv_path}")
-else:
-    print("No .env file found (falling back to shell environment / instance role)")
+# 'inline' sends the full question list to the Step Function, 'reference' only the S3 key of the bank
+STEP_FUNCTION_INPUT_MODE = os.getenv('STEP_FUNCTION_INPUT_MODE', 'inline').lower()
+# 'inline' copies the questions onto the QuizSessions item, 'items' writes QUESTION#<n> rows instead
+SESSION_QUESTION_STORAGE = os.getenv('SESSION_QUESTION_STORAGE', 'inline').lower()
+# 'stepfunctions' advances questions with the AWS state machine, 'local' with an in-process timing wheel
+QUESTION_SCHEDULER = os.getenv('QUESTION_SCHEDULER', 'stepfunctions').lower()
+# 'local' saves uploads under uploads/, 's3' streams them into S3 deduplicated by content hash
+UPLOAD_STORAGE = os.getenv('UPLOAD_STORAGE', 'local').lower()
+
 bedrock = None
 dynamo = None
 s3 = None
+_services_lock = threading.Lock()
+
+
+def get_bedrock():
+    # double-checked so concurrent first requests don't each build a wrapper
+    global bedrock
+    if bedrock is None:
+        with _services_lock:
+            if bedrock is None:
+                bedrock = aws.Bedrock()
+    return bedrock
+
+
+def get_dynamo():
+    global dynamo
+    if dynamo is None:
+        with _services_lock:
+            if dynamo is None:
+                dynamo = aws.DynamoDB()
+    return dynamo
+
+
+def get_s3():
+    global s3
+    if s3 is None:
+        with _services_lock:
+            if s3 is None:
+                s3 = aws.S3()
+    return s3
+
+
+scheduler = None
 app = Flask(__name__)
 # Enables cross-origin resource sharing support
 # (Allows app to make requests to other domains)
-CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}})
+CORS_ORIGINS = ["http://localhost:3000"]
+CORS(app, resources={r"/api/*": {"origins": CORS_ORIGINS}})
+
+
+def on_question_advance(session_id, current_q, status):
+    """Local scheduler callback: persist the new position and push it to connected clients."""
+    dynamo = get_dynamo()
+    dynamo.set_current_question(session_id, current_q, status)
+    game_events.publish(session_id, 'question', {'currentQ': current_q, 'status': status})
+    if status == 'ended':
+        leaderboard.drop_board(session_id)
+
 
 
 @app.route('/api/start_game',methods=["POST"])
 def start_game():
     try:
-        global dynamo
-        if dynamo is None:
-            dynamo = aws.DynamoDB()
+        dynamo = get_dynamo()
         sessionId = request.headers.get("X-Key")
         secPerQ = request.headers.get("X-Seconds-Per-Question",2)
-        questions = game_info()[0].json["questions"]
-        print(dynamo.start_quiz_step_function(sessionId, secPerQ,questions))
+        if QUESTION_SCHEDULER == 'local':
+            if scheduler is None:
+                # only start_background() creates it, in the one process that may run it
+                return {"ok": False, "error": "Local question scheduler is not running in this process; "
+                        "start the backend with gunicorn, uvicorn or python app.py"}, 503
+            ref = dynamo.get_question_ref(sessionId)
+            if ref.get('ok'):
+                num_questions = int(ref['data'].get('numQuestions', 0))
+            else:
+                num_questions = len(game_info()[0].json["questions"])
+            game = scheduler.start_game(sessionId, float(secPerQ), num_questions)
+            game_events.publish(sessionId, 'status', {'status': 'started', 'secondsPerQuestion': secPerQ})
+            return {"ok": True, "scheduler": "local", "deadline": game['deadline']}
+        if STEP_FUNCTION_INPUT_MODE == 'reference':
+            # Only the S3 location of the bank goes into the execution input; no questions read here
+            ref = dynamo.get_question_ref(sessionId)
+            if not ref.get('ok'):
+                return {"ok": False, "error": ref.get('error')}
+            print(dynamo.start_quiz_step_function(sessionId, secPerQ, question_ref=ref['data']))
+        else:
+            questions = game_info()[0].json["questions"]
+            print(dynamo.start_quiz_step_function(sessionId, secPerQ,questions))
+        game_events.publish(sessionId, 'status', {'status': 'started', 'secondsPerQuestion': secPerQ})
         return {"ok":True}
     except Exception as e:
         print(e)
@@ -59,10 +135,10 @@ def game_info():
     """
     Get game info by session ID. Expects X-Key header.
     Returns JSON: sessionID, players, questions, status, currentQ.
+    For sessions whose questions are stored as QUESTION#<n> rows, an optional
+    X-Question-Index header returns just that question instead of the whole list.
     """
-    global dynamo
-    if dynamo is None:
-        dynamo = aws.DynamoDB()
+    dynamo = get_dynamo()
     session_id = request.headers.get('X-Key')
     if not session_id:
         return jsonify({'ok': False, 'error': 'Missing X-Key header'}), 400
@@ -71,11 +147,19 @@ def game_info():
         game_data = dynamo.get_game_info(session_id)["data"]
         if not game_data:
             return jsonify({'ok': False, 'error': 'Session not found'}), 404
+        questions = game_data.get('questions', [])
+        if game_data.get('questionStorage') == 'items':
+            q_index = request.headers.get('X-Question-Index')
+            if q_index is not None:
+                question = db.get_question(session_id, int(q_index))
+                questions = [question] if question else []
+            else:
+                questions = sorted(db.list_questions(session_id), key=lambda q: int(q.get('index', 0)))
         # Extract expected fields
         resp = {
             'sessionID': game_data.get('sessionID'),
             'players': game_data.get('players', []),
-            'questions': game_data.get('questions', []),
+            'questions': questions,
             'status': game_data.get('status', None),
             'currentQ': game_data.get('currentQ', game_data.get('currentQuestion', None)),
         }
@@ -83,20 +167,63 @@ def game_info():
     except Exception as e:
         print(e)
         return jsonify({'ok': False, 'error': str(e)}), 500
+@app.route('/api/game/<session_id>/events', methods=['GET'], endpoint='game_events')
+def game_events_stream(session_id):
+    """Live game state over Server-Sent Events, replacing /api/game_info polling.
+
+    Sends one `snapshot` event with the current game info (the only DynamoDB read for
+    this connection), then deltas as they happen: player_joined, status, question,
+    score, leaderboard. A `resync` event means the client fell behind and should
+    re-read /api/game_info.
+    """
+    dynamo = get_dynamo()
+    # subscribe before reading so nothing published in between is lost
+    sub = game_events.hub.subscribe(session_id)
+    info = dynamo.get_game_info(session_id)
+    if not info.get('ok'):
+        sub.close()
+        return jsonify({'ok': False, 'error': info.get('error')}), 404
+
+    def stream():
+        with sub:
+            yield game_events.sse_format({'type': 'snapshot', 'gameId': session_id, 'seq': 0, 'data': info['data']})
+            for event in sub.events():
+                yield game_events.sse_format(event)
+
+    return Response(stream_with_context(stream()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/aws/buckets', methods=['GET'])
 def list_buckets():
     """List S3 buckets using boto3. Reads AWS credentials from environment or from IAM role."""
     try:
-        # Create an S3 client. Credentials are pulled from environment or IAM role automatically.
-        s3 = boto3.client('s3', region_name=os.getenv('AWS_REGION'))
-        resp = s3.list_buckets()
+        # Shared S3 client. Credentials are pulled from environment or IAM role automatically.
+        resp = aws_clients.client('s3', os.getenv('AWS_REGION')).list_buckets()
         buckets = [b['Name'] for b in resp.get('Buckets', [])]
         return jsonify({"buckets": buckets}), 200
-    except (BotoCoreError, ClientError) as e:
+    except Exception as e:
         # Return structured error for easier debugging in frontend
         return jsonify({"error": str(e)}), 500
 
 
+def _warm_clients():
+    # The service wrappers and the Quiz table, built through the same accessors requests use
+    get_dynamo()
+    get_s3()
+    get_bedrock()
+    db._table()
+    return aws_clients.stats()
+
+
+warmup.register('clients', _warm_clients)
+
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 200 once this worker's warm-up has finished, 503 until then."""
+    return jsonify(warmup.status()), 200 if warmup.is_ready() else 503
+
+
 @app.route('/api/debug/env', methods=['GET'])
 def debug_env():
     """Non-sensitive debug endpoint: shows presence of key env vars (does NOT return secret values)."""
@@ -109,12 +236,68 @@ def debug_env():
     return jsonify(present), 200
 
 
+@app.route('/api/debug/cache', methods=['GET'])
+def debug_cache():
+    """Hit/miss counters for the shared Bedrock response cache."""
+    return jsonify(aws.bedrock_cache.stats()), 200
+
+
+@app.route('/api/debug/admission', methods=['GET'])
+def debug_admission():
+    """Bedrock admission buckets plus per-lane admitted/rejected counts and queue times."""
+    return jsonify(admission.controller.stats()), 200
+
+
+# Premium lane lookups (sub -> lane), so only a user's first model call in a while reads their profile
+_lanes = ResponseCache(max_entries=4096, ttl=float(os.getenv('PREMIUM_LANE_CACHE_TTL', 300)))
+
+
+def _verified_sub(headers):
+    """The Cognito sub of a verified token in Authorization / X-Id-Token, else None."""
+    auth_header = headers.get('Authorization') or headers.get('X-Id-Token')
+    if not auth_header:
+        return None
+    try:
+        token = auth_header.split(' ')[1] if ' ' in auth_header else auth_header
+        claims = auth.verify_cognito_jwt(token)
+        return claims.get('sub') or claims.get('username') or claims.get('cognito:username')
+    except Exception:
+        return None
+
+
+def request_lane(headers) -> str:
+    """Admission lane for a request: 'premium' when the signed-in user's profile has is_premium.
+
+    Only a verified token counts; a client-supplied user id could claim anyone's plan.
+    """
+    sub = _verified_sub(headers)
+    if not sub:
+        return admission.STANDARD
+    lane = _lanes.get(sub)
+    if lane is None:
+        res = get_s3().load_user_profile(sub)
+        premium = res.get('ok') and (res.get('data') or {}).get('is_premium')
+        lane = admission.PREMIUM if premium else admission.STANDARD
+        _lanes.set(sub, lane)
+    return lane
+
+
+@app.before_request
+def _admission_lane():
+    # resolved lazily: only requests that actually call the model pay for the profile lookup
+    headers = request.headers
+    admission.set_lane(lambda: request_lane(headers))
+
+
+def _throttled(e: admission.Throttled):
+    return jsonify(e.payload()), 429, {'Retry-After': str(e.retry_after)}
+
+
 @app.route('/api/debug/identity', methods=['GET'])
 def debug_identity():
     """Return non-sensitive STS caller identity (account/ARN) or an error message."""
     try:
-        sts = boto3.client('sts')
-        identity = sts.get_caller_identity()
+        identity = aws_clients.client('sts').get_caller_identity()
         # Only return non-secret fields
         return jsonify({
             'Account': identity.get('Account'),
@@ -130,91 +313,315 @@ def parse_response():
     # Array is a triple containing a name, a description, and a type of each expected return val
     # Returns a json parsed with nova-micro of the response
     try:
-        global bedrock
-        if bedrock is None:
-            bedrock = aws.Bedrock()
+        payload, status = parse_response_result(request.get_json(silent=True) or {})
+        return jsonify(payload), status
+    except admission.Throttled as e:
+        return _throttled(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        data = request.get_json(silent=True) or {}
-        input_text = data.get('input_text', '')
-        expected_output = data.get('expected_output', [])
-        app.logger.info(f"Parsing response for input_text: {input_text} with expected_output: {expected_output}")
-        parsed = bedrock.parse_response(input_text=input_text, expected_output=expected_output)
 
-        # If parse_response returned a raw fallback, forward it so frontend can inspect
-        if isinstance(parsed, dict) and parsed.get('raw'):
-            return jsonify({'raw': parsed.get('raw')}), 200
+def parse_response_result(data: dict):
+    input_text = data.get('input_text', '')
+    expected_output = data.get('expected_output', [])
+    app.logger.info(f"Parsing response for input_text: {input_text} with expected_output: {expected_output}")
+    parsed = get_bedrock().parse_response(input_text=input_text, expected_output=expected_output)
 
-        # If parsed is a dict containing the expected fields, return it directly.
-        if isinstance(parsed, dict):
-            return jsonify(parsed), 200
+    # If parse_response returned a raw fallback, forward it so frontend can inspect
+    if isinstance(parsed, dict) and parsed.get('raw'):
+        return {'raw': parsed.get('raw')}, 200
 
-        # For non-dict parsed values, wrap under `parsed` key to keep response JSON-safe
-        return jsonify({'parsed': parsed}), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    # If parsed is a dict containing the expected fields, return it directly.
+    if isinstance(parsed, dict):
+        return parsed, 200
+
+    # For non-dict parsed values, wrap under `parsed` key to keep response JSON-safe
+    return {'parsed': parsed}, 200
 
 @app.route('/api/generate_desc', methods=["GET"])
 def generate_desc():
     try:
-        global bedrock
-        if bedrock is None:
-            bedrock = aws.Bedrock()
-
-        prompt = request.headers.get("X-Prompt")
-        app.logger.info(f"Generating description for prompt: {prompt}")
-        return jsonify({"description":bedrock.generate_desc(prompt=prompt)}),200
+        payload, status = generate_desc_result(request.headers.get("X-Prompt"))
+        return jsonify(payload), status
+    except admission.Throttled as e:
+        return _throttled(e)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+
+def generate_desc_result(prompt):
+    app.logger.info(f"Generating description for prompt: {prompt}")
+    return {"description": get_bedrock().generate_desc(prompt=prompt)}, 200
+
 @app.route('/api/generate_mcq', methods=["GET", "POST"])
 def generate_mcq():
     try:
-        global bedrock
-        if bedrock is None:
-            bedrock = aws.Bedrock()
+        data = request.get_json(silent=True) or {}
+        # Support POST with JSON body for better client semantics, fall back to headers for GET
+        args = mcq_args(request.method == 'POST' or request.is_json, data, request.headers)
+        payload, status = mcq_result(owner=_material_owner(), **args)
+        return jsonify(payload), status
+    except admission.Throttled as e:
+        return _throttled(e)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 
-        # Support POST with JSON body for better client semantics, fall back to headers for GET
-        if request.method == 'POST' or request.is_json:
-            data = request.get_json(silent=True) or {}
-            num_questions = int(data.get('num_questions', data.get('numQuestions', 1)))
-            topic = data.get('topic') or data.get('prompt')
+def mcq_args(use_body: bool, data: dict, headers) -> dict:
+    """generate_mcq inputs from a JSON body, or from X-* headers for GET requests."""
+    if use_body:
+        topic = data.get('topic') or data.get('prompt')
+        return {
+            'num_questions': int(data.get('num_questions', data.get('numQuestions', 1))),
+            'topic': topic,
+            'parallel': bool(data.get('parallel', False)),
+            # parse_response output (e.g. topics/focus fields) sharpens the materials query
+            'query': ' '.join([topic or ''] + _field_text(data.get('fields'))),
+        }
+    topic = headers.get("X-Topic")
+    return {
+        'num_questions': int(headers.get("X-Num-Questions", 1)),
+        'topic': topic,
+        'parallel': headers.get("X-Parallel", "").lower() in ("1", "true", "yes"),
+        'query': topic or '',
+    }
+
+
+def mcq_result(num_questions: int, topic, parallel: bool, query: str, owner=None):
+    """Generate questions and shape the /api/generate_mcq response: (payload, status).
+
+    Shared by the Flask route and the async (ASGI) route in asgi.py.
+    """
+    # Only the uploaded passages relevant to the topic go into the prompt
+    material = ''
+    if owner and query.strip():
+        material = material_index.get_index().context(owner, query)
+
+    # Large quizzes are split into concurrent chunked model calls (see aws.MCQ_CHUNK_SIZE)
+    result = get_bedrock().generate_mcq(num_questions, prompt=topic, parallel=parallel, material=material)
+
+    # If aws returned an error dict, surface it
+    if isinstance(result, dict) and result.get('Error'):
+        return result, 500
+
+    # Validated/deduplicated bank from aws.Bedrock.generate_mcq
+    if isinstance(result, dict) and isinstance(result.get('questions'), list):
+        payload = {'questions': result['questions']}
+        for report in ('validation', 'dedup'):
+            if report in result:
+                payload[report] = result[report]
+        return payload, 200
+
+    # If aws returned the mock shape {'output': [...]}
+    if isinstance(result, dict) and result.get('output') and isinstance(result.get('output'), list):
+        return { 'questions': result.get('output') }, 200
+
+    # If aws returned a string (model text), try to parse JSON
+    if isinstance(result, str):
+        try:
+            parsed = json.loads(result)
+            if isinstance(parsed, list):
+                return { 'questions': parsed }, 200
+            if isinstance(parsed, dict) and parsed.get('questions'):
+                return { 'questions': parsed.get('questions') }, 200
+            if isinstance(parsed, dict):
+                return { 'questions': [parsed] }, 200
+        except Exception:
+            # fallback: keep whichever question objects parse and are valid
+            checked = mcq_validation.validate_batch(mcq_validation.salvage(result))
+            broken = {item['index'] for item in checked['invalid']}
+            questions = [q for i, q in enumerate(checked['questions']) if i not in broken]
+            if questions:
+                return { 'questions': questions, 'validation': {'checked': len(checked['questions']), 'invalid': checked['invalid'], 'repaired': 0, 'dropped': len(broken)} }, 200
+        # final fallback: return raw text
+        return { 'raw': result }, 200
+
+    # If aws returned a dict we didn't explicitly handle, return it under 'raw'
+    return { 'raw': result }, 200
+
+@app.route('/api/generate_mcq/stream', methods=["GET", "POST"])
+def generate_mcq_stream():
+    """Streaming variant of /api/generate_mcq.
+
+    Same inputs as /api/generate_mcq. Responds with Server-Sent Events: one `question` event per
+    question as soon as the model finishes writing it, then a `done` event with the count
+    (or an `error` event if the model call fails).
+    """
+    bedrock = get_bedrock()
+
+    if request.method == 'POST' or request.is_json:
+        data = request.get_json(silent=True) or {}
+        num_questions = int(data.get('num_questions', data.get('numQuestions', 1)))
+        topic = data.get('topic') or data.get('prompt')
+    else:
+        num_questions = int(request.headers.get("X-Num-Questions", 1))
+        topic = request.headers.get("X-Topic")
+
+    def sse(event, payload):
+        return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+    def events():
+        count = 0
+        try:
+            for question in bedrock.generate_mcq_stream(num_questions, prompt=topic):
+                yield sse('question', {'index': count, 'question': question})
+                count += 1
+            yield sse('done', {'count': count})
+        except admission.Throttled as e:
+            yield sse('error', dict(e.payload(), count=count))
+        except Exception as e:
+            app.logger.exception('Streaming MCQ generation failed')
+            yield sse('error', {'error': str(e), 'count': count})
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+# ---- background generation jobs (jobs.py): POST /api/jobs, then poll or stream the result ----
+
+def _mcq_job(params: dict) -> dict:
+    payload, status = mcq_result(**params)
+    if status != 200:
+        raise RuntimeError(payload.get('error') or payload.get('Error') or f'generation failed ({status})')
+    return payload
+
+
+def _bank_job(params: dict) -> dict:
+    """generate_mcq, then save the questions to S3 like /api/save."""
+    payload = _mcq_job(params['mcq'])
+    if not isinstance(payload.get('questions'), list):
+        raise RuntimeError('model output could not be parsed into questions')
+    bank = {'name': params.get('name'), 'questions': payload['questions']}
+    # a generated bank isn't anyone's edit, so duplicates across chunks are dropped before saving
+    saved = get_s3().save_to_s3(bank, filename=params.get('filename'), key=params.get('key'), dedupe=True)
+    if not saved.get('ok'):
+        raise RuntimeError(saved.get('error') or 'Failed to save')
+    result = {'ok': True, 'key': saved['key'], 'bucket': saved['bucket'],
+              'numQuestions': saved['dedup']['kept'] if saved.get('dedup', {}).get('applied') else len(bank['questions'])}
+    if 'validation' in payload:
+        result['validation'] = payload['validation']
+    # the save-time pass sees the whole bank, so its report supersedes generation's
+    if saved.get('dedup') or 'dedup' in payload:
+        result['dedup'] = saved.get('dedup') or payload['dedup']
+    return result
+
+
+def _in_lane(handler):
+    # jobs run on worker threads long after the request; they keep the lane it resolved to
+    def run(params: dict):
+        params = dict(params)
+        with admission.lane(params.pop('lane', admission.STANDARD), max_wait=admission.BEDROCK_ADMISSION_JOB_MAX_WAIT):
+            return handler(params)
+    return run
+
+
+job_runner = None
+
+
+def get_job_runner():
+    # built on first use: the sqlite store opens (and creates) its state file
+    global job_runner
+    if job_runner is None:
+        with _services_lock:
+            if job_runner is None:
+                job_runner = jobs.JobRunner.from_env({'generate_mcq': _in_lane(_mcq_job),
+                                                      'create_bank': _in_lane(_bank_job)})
+    return job_runner
+
+
+_background_started = False
+
+
+def start_background():
+    """Start this process's background threads: job workers, stream pollers, the local scheduler.
+
+    Called once per serving process (gunicorn post_worker_init, the ASGI lifespan startup and
+    the dev server below), never at import, so importing the app (tests, tools, a preloading
+    master) doesn't recover scheduler state or spawn threads that a fork would lose.
+    """
+    global scheduler, _background_started
+    with _services_lock:
+        if _background_started:
+            return
+        _background_started = True
+    if jobs.JOB_WORKERS > 0:
+        get_job_runner().start()
+    # Optional: also push changes made outside this process (AppSync, Lambdas, Step Functions)
+    # by tailing the Quiz table's DynamoDB stream into the game event hub.
+    if os.getenv('GAME_EVENTS_STREAM_ARN'):
+        game_events.StreamPoller(os.getenv('GAME_EVENTS_STREAM_ARN'), translate=db.apply_stream_record).start()
+    # Step Functions advance questions on QuizSessions (us-east-1), so tail that stream too; the local
+    # scheduler publishes its own advances and would see every one twice.
+    if os.getenv('SESSION_EVENTS_STREAM_ARN') and QUESTION_SCHEDULER != 'local':
+        game_events.StreamPoller(os.getenv('SESSION_EVENTS_STREAM_ARN'), region_name=aws.AWS_REGION,
+                                 translate=game_events.events_from_sessions_record).start()
+    # The local scheduler resumes running games from its state file, so it has to live in
+    # exactly one process (run the backend with a single worker in this mode).
+    if QUESTION_SCHEDULER == 'local':
+        scheduler = question_scheduler.QuestionScheduler.from_env(on_question_advance).start()
+
+
+@app.route('/api/jobs', methods=['POST'])
+def create_job():
+    """Queue a generation job and return at once with 202 and its id.
+
+    Body: the /api/generate_mcq JSON body plus `type` ('generate_mcq' or 'create_bank');
+    create_bank also takes the /api/save `name`, `filename` and `key`. Poll
+    GET /api/jobs/<id> or stream GET /api/jobs/<id>/events for the result. 429 means the
+    queue is full.
+    """
+    data = request.get_json(silent=True) or {}
+    kind = data.get('type') or data.get('kind') or 'generate_mcq'
+    try:
+        args = mcq_args(True, data, request.headers)
+        args['owner'] = _material_owner()
+        if kind == 'create_bank':
+            params = {'mcq': args, 'name': data.get('name'), 'filename': data.get('filename') or data.get('name'),
+                      'key': request.headers.get('X-Key') or data.get('key')}
         else:
-            num_questions = int(request.headers.get("X-Num-Questions", 1))
-            topic = request.headers.get("X-Topic")
+            params = dict(args)
+        params['lane'] = request_lane(request.headers)
+        job = get_job_runner().submit(kind, params, owner=args['owner'])
+    except jobs.QueueFull:
+        return jsonify({'ok': False, 'error': 'Too many queued jobs, retry shortly'}), 429, {'Retry-After': '5'}
+    except ValueError as e:
+        return jsonify({'ok': False, 'error': str(e)}), 400
+    return jsonify({'ok': True, 'jobId': job['id'], 'status': job['status'],
+                    'statusUrl': f"/api/jobs/{job['id']}", 'eventsUrl': f"/api/jobs/{job['id']}/events"}), 202
+
+
+def _visible_job(job_id):
+    """The job if this request may read it: a signed-in user's jobs only with their token.
+
+    Anyone else gets None, the same answer as for an unknown id. Anonymous jobs are readable
+    by whoever holds the (random) id.
+    """
+    job = get_job_runner().get(job_id)
+    if job is None or (job.get('owner') and job['owner'] != _verified_sub(request.headers)):
+        return None
+    return job
 
-        result = bedrock.generate_mcq(num_questions, prompt=topic)
 
-        # If aws returned an error dict, surface it
-        if isinstance(result, dict) and result.get('Error'):
-            return jsonify(result), 500
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = _visible_job(job_id)
+    if job is None:
+        return jsonify({'ok': False, 'error': 'job not found'}), 404
+    return jsonify(jobs.public_view(job)), 200
 
-        # If aws returned the mock shape {'output': [...]}
-        if isinstance(result, dict) and result.get('output') and isinstance(result.get('output'), list):
-            return jsonify({ 'questions': result.get('output') }), 200
 
-        # If aws returned a string (model text), try to parse JSON
-        if isinstance(result, str):
-            try:
-                parsed = json.loads(result)
-                if isinstance(parsed, list):
-                    return jsonify({ 'questions': parsed }), 200
-                if isinstance(parsed, dict) and parsed.get('questions'):
-                    return jsonify({ 'questions': parsed.get('questions') }), 200
-                if isinstance(parsed, dict):
-                    return jsonify({ 'questions': [parsed] }), 200
-            except Exception:
-                # fallback: split into non-empty lines
-                lines = [l.strip() for l in result.split('\n') if l.strip()]
-                if lines:
-                    return jsonify({ 'questions': lines }), 200
-            # final fallback: return raw text
-            return jsonify({ 'raw': result }), 200
-
-        # If aws returned a dict we didn't explicitly handle, return it under 'raw'
-        return jsonify({ 'raw': result }), 200
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """Job status over Server-Sent Events: a `job` event per change, ending once it finishes."""
+    if _visible_job(job_id) is None:
+        return jsonify({'ok': False, 'error': 'job not found'}), 404
+    return Response(stream_with_context(jobs.stream(get_job_runner(), job_id)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/api/debug/jobs', methods=['GET'])
+def debug_jobs():
+    return jsonify(get_job_runner().stats()), 200
 
 @app.route('/api/create_quiz', methods=['POST'])
 def create_quiz():
@@ -227,16 +634,30 @@ def create_quiz():
         questions = response["data"]["questions"]
         name = response["data"]["name"]
         sessionID = generate_session_id()
-        global dynamo
-        if dynamo == None:
-            dynamo = aws.DynamoDB()
+        dynamo = get_dynamo()
         json_data = {
             "sessionID" : sessionID,
+            "playerStorage": aws.PLAYER_STORAGE,
             "players" : {},
             "questions": questions,
             "currentQuestion": -1,
-            "timeLeft": 0
+            "timeLeft": 0,
+            "questionStorage": "inline",
+            # lets /api/start_game hand the Step Function a pointer instead of the questions
+            "questionRef": {
+                "bucket": response["bucket"],
+                "key": response["key"],
+                "versionId": response.get("version_id"),
+                "numQuestions": len(questions)
+            }
         }
+        if SESSION_QUESTION_STORAGE == 'items':
+            # Keep the session item tiny; questions live as QUESTION#<n> rows in the game partition
+            db.put_questions(sessionID, questions)
+            del json_data["questions"]
+            json_data["questionStorage"] = "items"
+        if aws.PLAYER_STORAGE == 'items':
+            del json_data["players"]
         dynamo.put_session(json_data)
         return {"ok" : True, "sessionID": sessionID}
         
@@ -250,9 +671,7 @@ def generate_session_id():
 
 @app.route("/api/get",methods=["GET"])
 def get():
-    global s3
-    if s3 == None:
-        s3 = aws.S3()
+    s3 = get_s3()
     
     try:
         key = request.headers.get("X-Key")
@@ -263,19 +682,22 @@ def get():
 
 @app.route("/api/save", methods=["POST"])
 def save():
-    global s3
-    if s3 == None:
-        s3 = aws.S3()
+    s3 = get_s3()
     try:
         data = request.get_json(silent=True) or {}
         # Accept optional filename and key from header or JSON body
         key = request.headers.get("X-Key") or data.get('key')
         filename = data.get('filename') or data.get('name')
+        # The bank is saved as sent; near-duplicates are only reported unless ?dedupe=true
+        dedupe = request.args.get('dedupe', '').lower() in ('1', 'true', 'yes')
 
         # Call aws.save_to_s3 with filename/key if provided. aws.save_to_s3 will generate a key if None.
-        result = s3.save_to_s3(data, filename=filename, key=key)
+        result = s3.save_to_s3(data, filename=filename, key=key, dedupe=dedupe)
         if isinstance(result, dict) and result.get('ok'):
-            return jsonify({ 'ok': True, 'key': result.get('key'), 'bucket': result.get('bucket') }), 200
+            payload = { 'ok': True, 'key': result.get('key'), 'bucket': result.get('bucket') }
+            if result.get('dedup'):
+                payload['dedup'] = result['dedup']
+            return jsonify(payload), 200
         return jsonify({ 'error': result }), 500
         
     except Exception as e:
@@ -366,6 +788,9 @@ def upload_material():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
+    if file and allowed_file(file.filename) and UPLOAD_STORAGE == 's3':
+        return upload_material_s3(file)
+
     if file and allowed_file(file.filename):
         # Create uploads directory if it doesn't exist
         upload_dir = 'uploads'
@@ -383,6 +808,7 @@ def upload_material():
         
         # Update user data
         user_data = json.loads(request.form.get('userData', '{}'))
+        _index_material(extraction.file_sha256(file_path), filename, content)
         user_data['materials'].append({
             'filename': filename,
             'path': file_path,
@@ -402,6 +828,80 @@ def upload_material():
     return jsonify({'error': 'Invalid file type'}), 400
 
 
+def upload_material_s3(file):
+    """S3 variant of /api/upload-material: nothing is kept on local disk.
+
+    The uploaded file is streamed into S3 (multipart, hashed on the fly) and stored once per
+    distinct content. Werkzeug still spools large multipart files to a temporary file while
+    parsing the form; that file is gone when the request ends, and nothing goes to uploads/.
+    Clients that send X-Content-SHA256 (64 hex digits) skip the transfer when the file is
+    already there; otherwise the header must match the streamed content or the upload is
+    rejected with 400. Text is extracted from the stored object, or from the cache for known content.
+    """
+    s3 = get_s3()
+    filename = secure_filename(file.filename)
+    ext = os.path.splitext(filename)[1].lower()
+    stored = s3.upload_stream(file.stream, ext, content_sha256=request.headers.get('X-Content-SHA256'))
+    if not stored.get('ok'):
+        return jsonify({'error': stored.get('error')}), stored.get('status', 500)
+
+    try:
+        content = extraction.cached_text(stored['sha256'], ext, lambda: extraction.iter_object_text(
+            s3.s3_client, stored['bucket'], stored['key']))
+    except Exception as e:
+        content = f"Error extracting content: {str(e)}"
+
+    user_data = json.loads(request.form.get('userData', '{}'))
+    _index_material(stored['sha256'], filename, content)
+    user_data['materials'].append({
+        'filename': filename,
+        'path': f"s3://{stored['bucket']}/{stored['key']}",
+        'sha256': stored['sha256'],
+        'content': content[:1000]  # Store first 1000 chars for preview
+    })
+
+    response = f"Great! I've processed your {filename} file. " \
+              "I can see it contains information about your study topics. " \
+              "Would you like to upload more materials or should I create your quiz now?"
+
+    return jsonify({
+        'response': response,
+        'nextState': 'materials',
+        'updatedUserData': user_data,
+        'deduplicated': stored['deduplicated']
+    })
+
+
+def _material_owner(headers=None):
+    """Whose material index a request reads/writes: the verified token's sub, or None.
+
+    A client-supplied user id would let anyone read or poison another user's materials, so
+    anonymous requests neither index nor retrieve. Reads the current Flask request unless
+    `headers` are given (the ASGI routes pass them).
+    """
+    return _verified_sub(request.headers if headers is None else headers)
+
+
+def _field_text(fields) -> list:
+    if isinstance(fields, dict):
+        fields = list(fields.values())
+    if not isinstance(fields, list):
+        return []
+    return [' '.join(map(str, f)) if isinstance(f, list) else str(f) for f in fields if f]
+
+
+def _index_material(material_id, filename, content):
+    owner = _material_owner()
+    # failed or unsupported extractions have no text worth retrieving
+    if not owner or content.startswith("Error extracting content") or content.strip() == extraction.UNSUPPORTED_TEXT:
+        return
+    try:
+        added = material_index.get_index().add_material(owner, material_id, content, filename)
+        print(f"material_index: {filename} -> {added} passages for {owner}")
+    except Exception as e:
+        print(f"material_index: indexing {filename} failed: {e}")
+
+
 @app.route('/api/game/create', methods=['GET','POST'], endpoint='game_create')
 def game_create_route():
     host_id = request.args.get('hostId') or request.form.get('hostId') or 'host123'
@@ -429,8 +929,52 @@ def game_join_route(game_id):
         return jsonify({"error": "playerId and name are required"}), 400
 
     item = db.join_game(game_id, player_id, name)
+    if item is None:
+        return jsonify({'error': 'Player already joined'}), 409
     return jsonify({'player': item}), 200
 
+# Attributes returned by the paged listing endpoints; question answers are never exposed here
+PLAYER_FIELDS = ['playerId', 'name', 'score', 'joinedAt']
+QUESTION_FIELDS = ['index', 'type', 'question', 'options', 'explanation']
+
+
+@app.route('/api/game/<game_id>/players', methods=['GET'], endpoint='game_players')
+def game_players_route(game_id):
+    """One page of PLAYER# rows. ?limit=N&cursor=<nextCursor from the previous page>."""
+    return _partition_page(game_id, "PLAYER#", PLAYER_FIELDS)
+
+
+@app.route('/api/game/<game_id>/questions', methods=['GET'], endpoint='game_questions')
+def game_questions_route(game_id):
+    """One page of QUESTION# rows (without answers). ?limit=N&cursor=..."""
+    return _partition_page(game_id, "QUESTION#", QUESTION_FIELDS)
+
+
+def _partition_page(game_id, prefix, fields):
+    try:
+        limit = max(1, min(int(request.args.get('limit', 50)), 500))
+        items, next_cursor = db.query_page(game_id, prefix, cursor=request.args.get('cursor'),
+                                           limit=limit, projection=fields)
+    except ValueError as e:
+        # bad limit or a malformed/foreign cursor token
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'items': items, 'nextCursor': next_cursor}), 200
+
+
+@app.route('/api/game/<game_id>/leaderboard', methods=['GET'], endpoint='game_leaderboard')
+def game_leaderboard_route(game_id):
+    """Top-K leaderboard from the persisted snapshot; ?playerId=... adds that player's rank."""
+    try:
+        resp = {'top': db.get_leaderboard(game_id, int(request.args.get('k', 10)))}
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    player_id = request.args.get('playerId')
+    if player_id:
+        resp['player'] = db.get_rank(game_id, player_id)
+    return jsonify(resp), 200
+
 def allowed_file(filename):
     """Check if file type is allowed"""
     ALLOWED_EXTENSIONS = {'txt', 'pdf', 'doc', 'docx'}
@@ -438,23 +982,13 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def extract_file_content(file_path):
-    """Extract text content from uploaded file"""
+    """Extract text content from uploaded file.
+
+    PDF pages are extracted in parallel in a process pool with page/byte caps, and results
+    are cached by the file's SHA-256 so re-uploading the same notes is instant (see extraction.py).
+    """
     try:
-        if file_path.endswith('.txt'):
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return f.read()
-        elif file_path.endswith('.pdf'):
-
-            with open(file_path, 'rb') as f:
-                reader = PyPDF2.PdfReader(f)
-                text = ""
-                for page in reader.pages:
-                    p = page.extract_text()
-                    if p:
-                        text += p
-                return text
-        # Add more file type handlers as needed
-        return "File content extracted successfully"
+        return extraction.extract_text(file_path)
     except Exception as e:
         return f"Error extracting content: {str(e)}"
 
@@ -467,6 +1001,7 @@ def create_checkout_session():
     Returns { ok: True, url: checkout_url } on success.
     """
     try:
+        import stripe  # heavy; only the billing routes need it
         stripe_secret = os.getenv('STRIPE_SECRET_KEY')
         stripe_price = os.getenv('STRIPE_PRICE_ID')  # price ID for subscription
         if not stripe_secret or not stripe_price:
@@ -517,6 +1052,8 @@ def create_checkout_session():
 
                 if found:
                     customer_id = found.id
+                    if sub:
+                        get_s3().link_stripe_customer(sub, customer_id)
                 else:
                     cust_params = {'metadata': {}}
                     if sub:
@@ -528,9 +1065,7 @@ def create_checkout_session():
 
                     # Save stripe_customer_id to user's profile if we have sub
                     try:
-                        global s3
-                        if s3 is None:
-                            s3 = aws.S3()
+                        s3 = get_s3()
                         if sub:
                             # load existing profile (if any)
                             res = s3.load_user_profile(sub)
@@ -541,6 +1076,7 @@ def create_checkout_session():
                             }
                             profile_payload['stripe_customer_id'] = customer_id
                             s3.save_user_profile(sub, profile_payload)
+                            s3.link_stripe_customer(sub, customer_id)
                     except Exception:
                         app.logger.exception('Failed to persist stripe_customer_id to user profile')
             except Exception:
@@ -565,8 +1101,26 @@ def create_checkout_session():
         return jsonify({'ok': False, 'error': str(e)}), 500
 
 
+# Profile fields only the billing flow may set; /api/profile keeps whatever is stored
+BILLING_FIELDS = ('stripe_customer_id', 'stripe_subscription_id', 'is_premium')
+
+
+def _stripe_customer_sub(stripe, customer_id: str):
+    """The sub create_checkout_session stored in the Stripe customer's metadata, if any."""
+    stripe.api_key = stripe.api_key or os.getenv('STRIPE_SECRET_KEY')
+    if not stripe.api_key:
+        return None
+    try:
+        customer = stripe.Customer.retrieve(customer_id)
+        return (customer.get('metadata') or {}).get('sub')
+    except Exception:
+        app.logger.exception('Failed to read Stripe customer metadata')
+        return None
+
+
 @app.route('/api/stripe/webhook', methods=['POST'])
 def stripe_webhook():
+    import stripe
     payload = request.data
     sig_header = request.headers.get('Stripe-Signature')
     webhook_secret = os.getenv('STRIPE_WEBHOOK_SECRET')
@@ -599,20 +1153,24 @@ def stripe_webhook():
             # Try to get subscription info and mark the user premium
             # If customer exists, we may find the user by stripe_customer_id in S3
             try:
-                global s3
-                if s3 is None:
-                    s3 = aws.S3()
+                s3 = get_s3()
 
                 user_sub = sub
                 if not user_sub and customer:
-                    # search for profile with stripe_customer_id matching customer
-                    # This is a linear scan in S3 helper - optimize as needed
+                    # checkout creates customers with metadata.sub; that's authoritative
+                    user_sub = _stripe_customer_sub(stripe, customer)
+                if not user_sub and customer:
+                    # look up the profile with stripe_customer_id matching customer (indexed, see stripe_index.py)
                     user_sub = s3.find_sub_by_stripe_customer(customer)
+                elif customer:
+                    s3.link_stripe_customer(user_sub, customer)
 
                 if user_sub:
                     res = s3.load_user_profile(user_sub)
                     profile_payload = res.get('data') if res.get('ok') and res.get('data') else {'sub': user_sub}
                     profile_payload['is_premium'] = True
+                    # this worker switches lanes at once; others when their cached lookup expires
+                    _lanes.set(user_sub, admission.PREMIUM)
                     # optionally store subscription id or customer
                     if data_obj.get('subscription'):
                         profile_payload['stripe_subscription_id'] = data_obj.get('subscription')
@@ -640,43 +1198,44 @@ def generate_reply():
     Returns: { "chat_response": "..." }
     """
     try:
-        global bedrock
-        if bedrock is None:
-            bedrock = aws.Bedrock()
+        payload, status = generate_reply_result(request.get_json(silent=True) or {})
+        return jsonify(payload), status
+    except admission.Throttled as e:
+        return _throttled(e)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        data = request.get_json(silent=True) or {}
-        input_text = data.get('input_text', '')
-        mandatory = data.get('mandatory_empty_values', data.get('mandatory', [])) or []
-        one_of = data.get('one_of_empty_values', data.get('one_of', [])) or []
-
-        # Coerce to lists of strings
-        if not isinstance(mandatory, list):
-            mandatory = [mandatory]
-        if not isinstance(one_of, list):
-            one_of = [one_of]
-        mandatory = [str(x) for x in mandatory]
-        one_of = [str(x) for x in one_of]
-
-        app.logger.info(f"Generating chat reply for input_text (len={len(str(input_text))}) with mandatory={mandatory} one_of={one_of}")
-
-        resp = bedrock.generate_reply(input_text=input_text, mandatory_empty_values=mandatory, one_of_empty_values=one_of)
-
-        # bedrock.generate_reply returns a string on success or a dict with Error on failure
-        if isinstance(resp, dict) and resp.get('Error'):
-            return jsonify({'error': resp}), 500
-        if not isinstance(resp, str):
-            # If it returned something unexpected, stringify safely
-            try:
-                chat_text = str(resp)
-            except Exception:
-                chat_text = ""
-        else:
-            chat_text = resp
 
-        return jsonify({'chat_response': chat_text}), 200
+def generate_reply_result(data: dict):
+    input_text = data.get('input_text', '')
+    mandatory = data.get('mandatory_empty_values', data.get('mandatory', [])) or []
+    one_of = data.get('one_of_empty_values', data.get('one_of', [])) or []
 
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    # Coerce to lists of strings
+    if not isinstance(mandatory, list):
+        mandatory = [mandatory]
+    if not isinstance(one_of, list):
+        one_of = [one_of]
+    mandatory = [str(x) for x in mandatory]
+    one_of = [str(x) for x in one_of]
+
+    app.logger.info(f"Generating chat reply for input_text (len={len(str(input_text))}) with mandatory={mandatory} one_of={one_of}")
+
+    resp = get_bedrock().generate_reply(input_text=input_text, mandatory_empty_values=mandatory, one_of_empty_values=one_of)
+
+    # bedrock.generate_reply returns a string on success or a dict with Error on failure
+    if isinstance(resp, dict) and resp.get('Error'):
+        return {'error': resp}, 500
+    if not isinstance(resp, str):
+        # If it returned something unexpected, stringify safely
+        try:
+            chat_text = str(resp)
+        except Exception:
+            chat_text = ""
+    else:
+        chat_text = resp
+
+    return {'chat_response': chat_text}, 200
 
 @app.route('/api/profile', methods=['GET'])
 def get_profile():
@@ -693,9 +1252,7 @@ def get_profile():
         sub = claims.get('sub') or claims.get('username') or claims.get('cognito:username')
         if not sub:
             return jsonify({'ok': False, 'error': 'Unable to determine user id from token'}), 400
-        global s3
-        if s3 is None:
-            s3 = aws.S3()
+        s3 = get_s3()
         res = s3.load_user_profile(sub)
         if not res.get('ok'):
             # If profile not found, return a default skeleton so frontend can save it later
@@ -733,15 +1290,20 @@ def save_profile():
         payload = request.get_json(silent=True) or {}
         # Ensure the profile's sub is the authenticated subject
         payload['sub'] = sub
+        s3 = get_s3()
+        # Billing fields are written only by checkout and the Stripe webhook; keep the stored values
+        existing = s3.load_user_profile(sub)
+        existing = existing.get('data') if existing.get('ok') and isinstance(existing.get('data'), dict) else {}
+        for field in BILLING_FIELDS:
+            payload.pop(field, None)
+            if field in existing:
+                payload[field] = existing[field]
         # If email/displayName missing, default from token
         if not payload.get('displayName'):
             payload['displayName'] = claims.get('name') or claims.get('email') or 'Learner'
         if not payload.get('email'):
             payload['email'] = claims.get('email', '')
 
-        global s3
-        if s3 is None:
-            s3 = aws.S3()
         res = s3.save_user_profile(sub, payload)
         if not res.get('ok'):
             return jsonify({'ok': False, 'error': res.get('error')}), 500
@@ -749,14 +1311,6 @@ def save_profile():
     except Exception as e:
         return jsonify({'ok': False, 'error': str(e)}), 401
 
-if __name__ == '__main__':
-    # Development server
-    host = os.getenv('FLASK_HOST', '0.0.0.0')
-    port = int(os.getenv('FLASK_PORT', 6767))
-    debug = os.getenv('FLASK_ENV', 'development') == 'development'
-    #app.run(host=host, port=port, debug=debug)
-    app.run(host='0.0.0.0', port=int(os.getenv('FLASK_PORT', 6767)), debug=True)
-
 @app.route('/api/join_game', methods=['POST'])
 def join_game_api():
     """
@@ -764,9 +1318,7 @@ def join_game_api():
     Calls dynamo.join_game(sessionID, playerName).
     Returns JSON response with player data or error.
     """
-    global dynamo
-    if dynamo is None:
-        dynamo = aws.DynamoDB()
+    dynamo = get_dynamo()
     session_id = request.headers.get('X-Key')
     player_name = request.headers.get('X-Player-Name')
     if not session_id or not player_name:
@@ -777,12 +1329,17 @@ def join_game_api():
         return jsonify({'ok': True, 'player': player_data}), 200
     except Exception as e:
         return jsonify({'ok': False, 'error': str(e)}), 500
-    
+
+
 if __name__ == '__main__':
     # Development server
     host = os.getenv('FLASK_HOST', '0.0.0.0')
     port = int(os.getenv('FLASK_PORT', 6767))
     debug = os.getenv('FLASK_ENV', 'development') == 'development'
+    # The reloader runs this module in a watcher process and again in the serving child; only
+    # the child may recover the scheduler and claim jobs, or every game would advance twice
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_background()
+        warmup.start()
     #app.run(host=host, port=port, debug=debug)
     app.run(host='0.0.0.0', port=int(os.getenv('FLASK_PORT', 6767)), debug=True)
-
@@ -0,0 +1,180 @@
+"""ASGI entry point: `uvicorn asgi:application --port 6767` from backend/.
+
+The LLM-bound routes (/api/generate_mcq, /api/parse_response, /api/generate_reply,
+/api/generate_desc) are served natively here: the request is read and answered on the event
+loop and only the model call runs off it, on a bounded executor. A process therefore holds up
+to ASYNC_MAX_INFLIGHT generations at once instead of one per sync worker. When that many are
+already running, a new request waits up to ASYNC_QUEUE_TIMEOUT seconds for a slot and then gets
+429. Every other route is handed to the Flask app unchanged, on a pool of ASYNC_WSGI_THREADS
+threads so slow handlers and open SSE streams don't queue behind each other. Each model call
+is then admitted by admission.py, which rate-limits what actually goes upstream.
+
+One process handles a lot of concurrent traffic this way. Only add `--workers` once the
+per-process state has shared backends (see gunicorn.conf.py): live game events need the
+stream pollers, jobs need JOB_QUEUE_BACKEND=sqlite, and QUESTION_SCHEDULER=local needs one process.
+
+boto3 has no asyncio transport, so "off the loop" means a thread blocked on the Bedrock socket.
+Those threads are cheap; the bedrock-runtime connection pool is sized to match (see
+aws_clients.client_config).
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from a2wsgi import WSGIMiddleware
+from werkzeug.datastructures import Headers
+
+import admission
+import app as flask_backend
+import warmup
+
+ASYNC_MAX_INFLIGHT = int(os.getenv('ASYNC_MAX_INFLIGHT', 256))
+ASYNC_QUEUE_TIMEOUT = float(os.getenv('ASYNC_QUEUE_TIMEOUT', 10))
+MAX_BODY_BYTES = 1024 * 1024
+# Threads running delegated Flask routes; every open SSE stream (game or job events) holds one
+ASYNC_WSGI_THREADS = int(os.getenv('ASYNC_WSGI_THREADS', 64))
+
+
+class Busy(Exception):
+    pass
+
+
+class ModelGate:
+    """Caps in-flight model calls per process and runs them on a dedicated executor."""
+
+    def __init__(self, limit: int = ASYNC_MAX_INFLIGHT, queue_timeout: float = ASYNC_QUEUE_TIMEOUT):
+        self.limit = limit
+        self.queue_timeout = queue_timeout
+        self.executor = ThreadPoolExecutor(max_workers=limit, thread_name_prefix='llm')
+        self._semaphore = None
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    async def run(self, fn, *args):
+        if self._semaphore is None:
+            # created lazily so it binds to the server's running loop
+            self._semaphore = asyncio.Semaphore(self.limit)
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise Busy()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, lambda: fn(*args))
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {'limit': self.limit, 'inFlight': self.in_flight, 'waiting': self.waiting, 'rejected': self.rejected}
+
+
+gate = ModelGate()
+
+
+# ---- native routes: (method, path) -> handler(headers, data) returning a callable for the gate ----
+
+def _generate_mcq(method, headers, data):
+    args = flask_backend.mcq_args(method == 'POST' or 'json' in headers.get('Content-Type', ''), data, headers)
+    return lambda: flask_backend.mcq_result(owner=flask_backend._material_owner(headers=headers), **args)
+
+
+def _in_lane(headers, call):
+    # executor threads are reused, so every call sets its own admission lane (see app.request_lane)
+    with admission.lane(lambda: flask_backend.request_lane(headers)):
+        return call()
+
+
+ROUTES = {
+    ('POST', '/api/generate_mcq'): _generate_mcq,
+    ('GET', '/api/generate_mcq'): _generate_mcq,
+    ('POST', '/api/parse_response'): lambda method, headers, data: lambda: flask_backend.parse_response_result(data),
+    ('POST', '/api/generate_reply'): lambda method, headers, data: lambda: flask_backend.generate_reply_result(data),
+    ('GET', '/api/generate_desc'): lambda method, headers, data: lambda: flask_backend.generate_desc_result(headers.get('X-Prompt')),
+}
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ValueError('request body too large')
+        chunks.append(chunk)
+        if not message.get('more_body'):
+            return b''.join(chunks)
+
+
+async def _send_json(send, status: int, payload, headers: Headers, retry_after: int = 1):
+    body = json.dumps(payload, default=str).encode('utf-8')
+    response_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    origin = headers.get('Origin')
+    if origin and origin in flask_backend.CORS_ORIGINS:
+        # same policy flask_cors applies to the Flask routes
+        response_headers += [(b'access-control-allow-origin', origin.encode('latin-1')), (b'vary', b'Origin')]
+    if status == 429:
+        response_headers.append((b'retry-after', str(retry_after).encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _native(route, scope, receive, send):
+    headers = Headers([(k.decode('latin-1'), v.decode('latin-1')) for k, v in scope['headers']])
+    try:
+        raw = await _read_body(receive)
+        data = json.loads(raw) if raw.strip() else {}
+        if not isinstance(data, dict):
+            data = {}
+    except ValueError as e:
+        return await _send_json(send, 400, {'error': str(e)}, headers)
+    call = route(scope['method'], headers, data)
+    retry_after = 1
+    try:
+        payload, status = await gate.run(_in_lane, headers, call)
+    except Busy:
+        payload, status = {'error': 'Too many generations in progress, retry shortly'}, 429
+    except admission.Throttled as e:
+        payload, status, retry_after = e.payload(), 429, e.retry_after
+    except Exception as e:
+        payload, status = {'error': str(e)}, 500
+    await _send_json(send, status, payload, headers, retry_after)
+
+
+async def _lifespan(receive, send):
+    # uvicorn has no post-fork hook; lifespan startup runs once in each worker process
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            flask_backend.start_background()
+            await asyncio.get_running_loop().run_in_executor(None, warmup.start)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            gate.executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+# asgiref's WsgiToAsgi runs every request on one shared thread (thread_sensitive), which would
+# serialise the whole Flask app; a2wsgi gives it a real pool
+_wsgi = WSGIMiddleware(flask_backend.app, workers=ASYNC_WSGI_THREADS)
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _lifespan(receive, send)
+    if scope['type'] == 'http':
+        if scope['path'] == '/api/debug/gate':
+            return await _send_json(send, 200, gate.stats(), Headers())
+        route = ROUTES.get((scope['method'], scope['path']))
+        if route:
+            return await _native(route, scope, receive, send)
+    return await _wsgi(scope, receive, send)
@@ -1,9 +1,9 @@
 import os
 import time
 import json
-import requests
-from jose import jwk, jwt
-from jose.utils import base64url_decode
+import hashlib
+import threading
+from collections import OrderedDict
 
 # Assumptions:
 # - Environment provides COGNITO_USER_POOL_ID and COGNITO_REGION
@@ -13,27 +13,134 @@ from jose.utils import base64url_decode
 COGNITO_USER_POOL_ID = os.getenv('COGNITO_USER_POOL_ID')
 COGNITO_REGION = os.getenv('COGNITO_REGION') or os.getenv('AWS_REGION') or 'us-east-1'
 
+JWKS_TTL = 3600            # seconds before the cached JWKS is considered stale
+JWKS_MIN_REFRESH = 60      # don't force-refetch for an unknown kid more often than this
+VERIFIED_TOKEN_CACHE_SIZE = int(os.getenv('VERIFIED_TOKEN_CACHE_SIZE', 1024))
+
 _jwks_cache = None
 _jwks_last_fetch = 0
+_jwks_lock = threading.Lock()
+_jwks_refreshing = False
+
+# Pooled HTTP connection for JWKS downloads; requests/jose are imported on first verification
+_session = None
+_session_lock = threading.Lock()
+
+
+def _http():
+    global _session
+    with _session_lock:
+        if _session is None:
+            import requests
+            _session = requests.Session()
+        return _session
+
+# kid -> constructed public key; rebuilt whenever the JWKS changes
+_key_cache = {}
 
-def _fetch_jwks():
-    global _jwks_cache, _jwks_last_fetch
-    if _jwks_cache and (time.time() - _jwks_last_fetch) < 3600:
-        return _jwks_cache
+# sha256(token) -> claims for tokens whose signature already verified, kept until exp
+_verified_tokens = OrderedDict()
+_verified_lock = threading.Lock()
+
+
+def _jwks_url():
     if not COGNITO_USER_POOL_ID:
         raise ValueError('COGNITO_USER_POOL_ID environment variable is required for token verification')
-    jwks_url = f'https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}/.well-known/jwks.json'
-    resp = requests.get(jwks_url, timeout=5)
+    return f'https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}/.well-known/jwks.json'
+
+
+def _download_jwks():
+    global _jwks_cache, _jwks_last_fetch, _key_cache
+    resp = _http().get(_jwks_url(), timeout=5)
     resp.raise_for_status()
-    _jwks_cache = resp.json()
-    _jwks_last_fetch = time.time()
-    return _jwks_cache
+    jwks = resp.json()
+    with _jwks_lock:
+        if jwks != _jwks_cache:
+            _key_cache = {}
+        _jwks_cache = jwks
+        _jwks_last_fetch = time.time()
+    return jwks
+
+
+def _background_refresh():
+    global _jwks_refreshing
+    try:
+        _download_jwks()
+    except Exception as e:
+        # keep serving the stale keys; the next request past the TTL will try again
+        print(f"JWKS background refresh failed: {e}")
+    finally:
+        with _jwks_lock:
+            _jwks_refreshing = False
+
+
+def _fetch_jwks(force: bool = False):
+    """Return the JWKS, stale-while-revalidate.
+
+    Only the very first call (or a forced refetch) downloads on the request path. Once
+    keys are cached, an expired cache is returned immediately while a background thread
+    fetches a fresh copy.
+    """
+    global _jwks_refreshing
+    with _jwks_lock:
+        cached = _jwks_cache
+        age = time.time() - _jwks_last_fetch
+        if cached and not force and age < JWKS_TTL:
+            return cached
+        if cached and not force:
+            if not _jwks_refreshing:
+                _jwks_refreshing = True
+                threading.Thread(target=_background_refresh, name='jwks-refresh', daemon=True).start()
+            return cached
+        if cached and force and age < JWKS_MIN_REFRESH:
+            return cached
+    return _download_jwks()
+
+
+def _public_key(kid: str):
+    # Cheap when fresh; past the TTL this returns the cached copy and refreshes in the background
+    jwks = _fetch_jwks()
+    key = _key_cache.get(kid)
+    if key is not None:
+        return key
+    key_data = next((k for k in jwks.get('keys', []) if k.get('kid') == kid), None)
+    if not key_data:
+        # Cognito may have rotated keys since our last download
+        jwks = _fetch_jwks(force=True)
+        key_data = next((k for k in jwks.get('keys', []) if k.get('kid') == kid), None)
+    if not key_data:
+        raise ValueError('Unable to find matching JWKS key')
+    from jose import jwk
+    key = jwk.construct(key_data)
+    _key_cache[kid] = key
+    return key
+
+
+def _cached_claims(digest: str):
+    with _verified_lock:
+        claims = _verified_tokens.get(digest)
+        if claims is None:
+            return None
+        if 'exp' in claims and time.time() > claims['exp']:
+            del _verified_tokens[digest]
+            return None
+        _verified_tokens.move_to_end(digest)
+        return claims
+
+
+def _remember_claims(digest: str, claims: dict):
+    with _verified_lock:
+        _verified_tokens[digest] = claims
+        _verified_tokens.move_to_end(digest)
+        while len(_verified_tokens) > VERIFIED_TOKEN_CACHE_SIZE:
+            _verified_tokens.popitem(last=False)
 
 
 def verify_cognito_jwt(token: str, audience: str = None) -> dict:
     """Verify an Amazon Cognito JWT (ID token) and return the decoded claims.
 
     Raises an exception on invalid token. If `audience` is provided, the token's aud must match it.
+    Tokens that already verified are served from a bounded cache until their `exp`.
     """
     if not token:
         raise ValueError('Missing token')
@@ -41,22 +148,32 @@ def verify_cognito_jwt(token: str, audience: str = None) -> dict:
     if token.lower().startswith('bearer '):
         token = token.split(' ', 1)[1]
 
+    digest = hashlib.sha256(token.encode('utf-8')).hexdigest()
+    claims = _cached_claims(digest)
+    if claims is None:
+        claims = _verify_signature(token)
+        _remember_claims(digest, claims)
+
+    # Check token expiration
+    if 'exp' in claims and time.time() > claims['exp']:
+        raise ValueError('Token is expired')
+
+    if audience and claims.get('aud') != audience:
+        raise ValueError('Token audience mismatch')
+
+    return dict(claims)
+
+
+def _verify_signature(token: str) -> dict:
+    from jose import jwt
+    from jose.utils import base64url_decode
     # Split token headers
     headers = jwt.get_unverified_header(token)
     kid = headers.get('kid')
     if not kid:
         raise ValueError('Token header missing kid')
 
-    jwks = _fetch_jwks()
-    key_data = None
-    for key in jwks.get('keys', []):
-        if key.get('kid') == kid:
-            key_data = key
-            break
-    if not key_data:
-        raise ValueError('Unable to find matching JWKS key')
-
-    public_key = jwk.construct(key_data)
+    public_key = _public_key(kid)
 
     # Validate signature
     message, encoded_signature = token.rsplit('.', 1)
@@ -67,12 +184,7 @@ def verify_cognito_jwt(token: str, audience: str = None) -> dict:
     # Decode claims without verifying signature again (we've verified manually)
     claims = jwt.get_unverified_claims(token)
 
-    # Check token expiration
+    # Check token expiration before caching anything
     if 'exp' in claims and time.time() > claims['exp']:
         raise ValueError('Token is expired')
-
-    if audience and claims.get('aud') != audience:
-        raise ValueError('Token audience mismatch')
-
     return claims
-
@@ -1,33 +1,79 @@
-import boto3
 import os
+import contextvars
+import re
 import json
 import uuid
 import time
+import hashlib
+import datetime
+from decimal import Decimal
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Any, Optional
-from botocore.exceptions import ClientError
-from dotenv import load_dotenv, find_dotenv
+from mcq_stream import IncrementalQuestionParser
+from response_cache import ResponseCache
+import admission
+import aws_clients
+import settings
+from stripe_index import make_customer_index
+import dynamodb_helper as db
+import extraction
+import material_chunks
+import question_dedup
+import mcq_validation
+import game_events
 
 AWS_REGION = "us-east-1"
+_SHA256_HEX = re.compile(r'^[0-9a-f]{64}$')
 
 
 
-dotenv_path = find_dotenv()
-if dotenv_path:
-    load_dotenv(dotenv_path)
-    print(f"Loaded .env from: {dotenv_path}")
-else:
-    print("No .env file found (falling back to shell environment / instance role)")
+settings.load_env()
+
+# Parallel MCQ generation: questions per model call and max concurrent calls
+MCQ_CHUNK_SIZE = int(os.getenv("MCQ_CHUNK_SIZE", 10))
+MCQ_MAX_WORKERS = int(os.getenv("MCQ_MAX_WORKERS", 4))
+# Material longer than this (estimated tokens) is split and generated from chunk by chunk
+MCQ_MATERIAL_CHUNK_TOKENS = int(os.getenv("MCQ_MATERIAL_CHUNK_TOKENS", 3000))
+MCQ_MATERIAL_OVERLAP_TOKENS = int(os.getenv("MCQ_MATERIAL_OVERLAP_TOKENS", 100))
+# Drop near-duplicate questions from generated/saved banks, and how many calls may fill the gap
+MCQ_DEDUP = os.getenv("MCQ_DEDUP", "true").lower() in ("1", "true", "yes")
+MCQ_TOPUP_ATTEMPTS = int(os.getenv("MCQ_TOPUP_ATTEMPTS", 1))
+# Follow-up calls that regenerate only the questions failing validation
+MCQ_REPAIR_ATTEMPTS = int(os.getenv("MCQ_REPAIR_ATTEMPTS", 1))
+QUESTION_DEDUP_ON_SAVE = os.getenv("QUESTION_DEDUP_ON_SAVE", "true").lower() in ("1", "true", "yes")
+
+# Multipart part size for streamed uploads (S3 minimum is 5 MiB for all but the last part)
+UPLOAD_PART_SIZE = max(int(os.getenv("UPLOAD_PART_SIZE", 8 * 1024 * 1024)), 5 * 1024 * 1024)
+
+# Shared by every Bedrock instance; configured with BEDROCK_CACHE_SIZE / _TTL / _DIR
+bedrock_cache = ResponseCache.from_env()
+
+# 'map' keeps players in a map on the QuizSessions item, 'items' writes one PLAYER#<name> row per join
+PLAYER_STORAGE = os.getenv("PLAYER_STORAGE", "map").lower()
+
+
+def _iso_timestamp(value) -> str:
+    """joinedAt as an ISO-8601 UTC string; the players map stored epoch seconds."""
+    if isinstance(value, str) and value:
+        return value
+    seconds = float(value) if isinstance(value, (int, float, Decimal)) else time.time()
+    return datetime.datetime.utcfromtimestamp(seconds).isoformat() + "Z"
 
 
 class DynamoDB:
     def __init__(self):
-        self.dynamodb = boto3.resource('dynamodb', region_name=AWS_REGION)
-        self.sf = boto3.client("stepfunctions",region_name=AWS_REGION)
-        self.table = self.dynamodb.Table("QuizSessions")
+        self.dynamodb = aws_clients.resource('dynamodb', AWS_REGION)
+        self.sf = aws_clients.client("stepfunctions", AWS_REGION)
+        self.table = aws_clients.table("QuizSessions", AWS_REGION)
 
-    def start_quiz_step_function(self, gameId: str, secondsPerQuestion: int, questions: list) -> dict:
+    def start_quiz_step_function(self, gameId: str, secondsPerQuestion: int, questions: list = None,
+                                 question_ref: dict = None) -> dict:
         """
         Start an execution of the quiz Step Function using boto3 Step Functions client.
+        Pass either the full `questions` list (inline) or a `question_ref` dict
+        ({"bucket", "key", "versionId", "numQuestions"}) pointing at the question bank in S3;
+        with a reference the execution input stays a few hundred bytes regardless of quiz size
+        and the state machine loads each question per step (see lambda/get_question.py).
         Returns a dict indicating success or failure, with executionArn or error message.
         """
         try:
@@ -38,8 +84,11 @@ class DynamoDB:
             input_payload = {
                 "gameId": gameId,
                 "secondsPerQuestion": secondsPerQuestion,
-                "questions": questions
             }
+            if question_ref is not None:
+                input_payload["questionRef"] = question_ref
+            else:
+                input_payload["questions"] = questions
             response = self.sf.start_execution(
                 stateMachineArn=step_function_arn,
                 name=f"{gameId}-{int(time.time())}",
@@ -51,6 +100,8 @@ class DynamoDB:
             return {"ok": False, "error": str(e)}
 
     def join_game(self, session_id: str, player_name: str) -> dict:
+        if PLAYER_STORAGE == "items":
+            return self._join_game_item(session_id, player_name)
         try:
             # Add player to the 'players' map, using player_name as the key, and set default fields
             now = int(time.time())
@@ -66,10 +117,95 @@ class DynamoDB:
                 ExpressionAttributeValues={':playerinfo': {'score': 0, 'joinedAt': now}},
                 ReturnValues='UPDATED_NEW'
                 )  
+            game_events.publish(session_id, 'player_joined', {'name': player_name, 'score': 0})
             return {'ok': True, 'response': response}
         except Exception as e:
             print(e)
             return {'ok': False, 'error': str(e)}
+    def _join_game_item(self, session_id: str, player_name: str) -> dict:
+        # One conditional put on the player's own row; joins never contend on the session item
+        try:
+            item = db.join_game(session_id, player_name, player_name)
+            if item is None:
+                return {'ok': True, 'rejoined': True, 'response': {'playerId': player_name}}
+            # db.join_game has already published player_joined
+            return {'ok': True, 'response': item}
+        except Exception as e:
+            print(e)
+            return {'ok': False, 'error': str(e)}
+
+    def migrate_players(self, session_id: str, attempts: int = 5) -> dict:
+        """Move a session's `players` map into PLAYER#<name> rows and mark it playerStorage=items.
+
+        The map is only removed if it is unchanged since it was read; a player joining in
+        between fails the condition and the migration re-reads and copies again. Safe to
+        re-run: rows are plain puts keyed by name, and sessions already migrated (no map
+        left) are a no-op apart from the flag. `joinedAt` is written in the ISO-8601 form
+        dynamodb_helper.join_game uses for PLAYER rows.
+        """
+        try:
+            for _ in range(attempts):
+                response = self.table.get_item(Key={'sessionID': session_id}, ProjectionExpression='players')
+                item = response.get('Item')
+                if not item:
+                    return {'ok': False, 'error': 'Session not found'}
+                players = item.get('players') or {}
+                rows = []
+                for name, info in players.items():
+                    info = info if isinstance(info, dict) else {}
+                    rows.append({
+                        "pk": f"GAME#{session_id}",
+                        "sk": f"PLAYER#{name}",
+                        "entity": "PLAYER",
+                        "playerId": name,
+                        "name": name,
+                        "score": info.get('score', 0),
+                        "joinedAt": _iso_timestamp(info.get('joinedAt'))
+                    })
+                if rows:
+                    db.batch_put(rows)
+                update = {
+                    'Key': {'sessionID': session_id},
+                    'UpdateExpression': 'SET playerStorage = :items REMOVE players',
+                    'ExpressionAttributeValues': {':items': 'items'},
+                }
+                if 'players' in item:
+                    update['ConditionExpression'] = 'players = :players'
+                    update['ExpressionAttributeValues'][':players'] = item['players']
+                else:
+                    update['ConditionExpression'] = 'attribute_not_exists(players)'
+                try:
+                    self.table.update_item(**update)
+                except Exception as e:
+                    if aws_clients.error_code(e) == 'ConditionalCheckFailedException':
+                        continue
+                    raise
+                return {'ok': True, 'migrated': len(rows)}
+            return {'ok': False, 'error': f'players map kept changing; retried {attempts} times'}
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
+    def migrate_all_players(self) -> dict:
+        """Run migrate_players over every QuizSessions item that still has a players map."""
+        migrated = sessions = 0
+        errors = []
+        kwargs = {'ProjectionExpression': 'sessionID, players'}
+        while True:
+            page = self.table.scan(**kwargs)
+            for item in page.get('Items', []):
+                if 'players' not in item:
+                    continue
+                res = self.migrate_players(item['sessionID'])
+                if res.get('ok'):
+                    sessions += 1
+                    migrated += res['migrated']
+                else:
+                    errors.append({'sessionID': item['sessionID'], 'error': res.get('error')})
+            if 'LastEvaluatedKey' not in page:
+                break
+            kwargs['ExclusiveStartKey'] = page['LastEvaluatedKey']
+        return {'ok': not errors, 'sessions': sessions, 'players': migrated, 'errors': errors}
+
     def put_session(self, session_data: dict) -> dict:
         try:
             response = self.table.put_item(
@@ -90,6 +226,35 @@ class DynamoDB:
         except Exception as e:
             return {'ok': False, 'error': str(e)}
 
+    def set_current_question(self, session_id: str, current_q: int, status: str) -> dict:
+        """Record question advancement made by the local scheduler on the session item."""
+        try:
+            self.table.update_item(
+                Key={'sessionID': session_id},
+                UpdateExpression='SET currentQ = :q, #st = :st',
+                ExpressionAttributeNames={'#st': 'status'},
+                ExpressionAttributeValues={':q': current_q, ':st': status}
+            )
+            return {'ok': True}
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
+    def get_question_ref(self, session_id: str) -> dict:
+        """Fetch only the question bank reference stored on a session by /api/create_quiz."""
+        try:
+            response = self.table.get_item(
+                Key={'sessionID': session_id},
+                ProjectionExpression='questionRef'
+            )
+            item = response.get('Item')
+            if not item:
+                return {'ok': False, 'error': 'Session not found'}
+            if not item.get('questionRef'):
+                return {'ok': False, 'error': 'Session has no question reference'}
+            return {'ok': True, 'data': item['questionRef']}
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
     def get_game_info(self, session_id: str) -> dict:
         try:
             response = self.table.get_item(Key={'sessionID': session_id})
@@ -103,11 +268,15 @@ class DynamoDB:
                 player_names = list(players_map.keys())
             else:
                 player_names = []
+            if item.get('playerStorage') == 'items' or PLAYER_STORAGE == 'items':
+                # joins made in 'items' mode live as PLAYER#<name> rows in the game partition
+                player_names += [p.get('name') for p in db.list_players(session_id, projection=['name']) if p.get('name') not in player_names]
 
             data = {
                 'sessionID': item.get('sessionID'),
                 'players': player_names,  # only names
                 'questions': item.get('questions', []),
+                'questionStorage': item.get('questionStorage', 'inline'),
                 'status': item.get('status', 'pending'),
                 'currentQ': item.get('currentQ', item.get('currentQuestion', 0))
             }
@@ -118,7 +287,8 @@ class DynamoDB:
 
 class S3:
     def __init__(self):
-        self.s3_client = boto3.client('s3', region_name=AWS_REGION)
+        self.s3_client = aws_clients.client('s3', AWS_REGION)
+        self.customer_index = make_customer_index(self.s3_client)
 
     def load_from_s3(self,id: str, bucket_name: str = None, ):
         try:
@@ -128,13 +298,14 @@ class S3:
             key = f"questionbank/questions-{id}.json"
             response = self.s3_client.get_object(Bucket=bucket, Key=key)
             data = json.loads(response['Body'].read().decode('utf-8'))
-            return {"ok": True, "data": data}
+            return {"ok": True, "data": data, "bucket": bucket, "key": key, "version_id": response.get('VersionId')}
         except Exception as e:
             if isinstance(e, self.s3_client.exceptions.NoSuchKey):
                 return {"ok": False, "error": 404}
             return {"ok": False, "error": e}
 
-    def save_to_s3(self, data: any, filename: str = None, bucket_name: str = None, key: str = None):
+    def save_to_s3(self, data: any, filename: str = None, bucket_name: str = None, key: str = None,
+                   dedupe: bool = False):
         """Save JSON-serializable `data` to S3.
 
         Parameters:
@@ -142,11 +313,23 @@ class S3:
         - filename: optional friendly filename to include in ContentDisposition and metadata
         - bucket_name: optional S3 bucket (falls back to QUESTIONBANK_BUCKET env or default)
         - key: optional explicit S3 key. If not provided one will be generated under questionbank/
+        - dedupe: drop near-duplicate questions before saving (opt-in; a user's own save is
+          stored as given)
+
+        Question banks ({"questions": [...]}) are checked for near-duplicates
+        (QUESTION_DEDUP_ON_SAVE) and the result then carries a `dedup` report; its `applied`
+        says whether the duplicates were removed or only reported.
 
         Returns: { ok: True, key: <s3-key>, bucket: <bucket> } or { ok: False, error: msg }
         """
         try:
             bucket = bucket_name or os.getenv('QUESTIONBANK_BUCKET', 'questionbankaristotle')
+            report = None
+            if QUESTION_DEDUP_ON_SAVE and isinstance(data, dict) and isinstance(data.get('questions'), list):
+                questions, report = question_dedup.dedupe(data['questions'])
+                report['applied'] = dedupe
+                if dedupe:
+                    data = dict(data, questions=questions)
             json_text = json.dumps(data, ensure_ascii=False, indent=2)
 
 
@@ -171,7 +354,10 @@ class S3:
                 put_args['ContentDisposition'] = content_disposition
 
             self.s3_client.put_object(**put_args)
-            return {'ok': True, 'key': key, 'bucket': bucket}
+            result = {'ok': True, 'key': key, 'bucket': bucket}
+            if report is not None:
+                result['dedup'] = report
+            return result
         except Exception as e:
             return {'ok': False, 'error': str(e)}
 
@@ -187,7 +373,7 @@ class S3:
             return {'ok': True, 'data': data, 'key': key, 'bucket': bucket}
         except Exception as e:
             # AWS raises a ClientError for missing key; detect and return 404 for frontend convenience
-            if isinstance(e, ClientError) and e.response.get('Error', {}).get('Code') == 'NoSuchKey':
+            if aws_clients.error_code(e) == 'NoSuchKey':
                 return {'ok': False, 'error': 404}
             return {'ok': False, 'error': str(e)}
 
@@ -203,16 +389,105 @@ class S3:
         except Exception as e:
             return {'ok': False, 'error': str(e)}
 
+    def link_stripe_customer(self, sub: str, stripe_customer_id: str):
+        """Record stripe_customer_id -> sub in the reverse index (billing flow only, see stripe_index.py)."""
+        try:
+            self.customer_index.record(stripe_customer_id, sub)
+        except Exception as e:
+            # the webhook falls back to Stripe's customer metadata and a profile scan
+            print(f"Failed to update stripe customer index: {e}")
+
+    def upload_stream(self, stream, ext: str, content_sha256: str = None, bucket_name: str = None,
+                      part_size: int = None):
+        """Stream a file-like object into S3, content-addressed by its SHA-256.
+
+        The body is read in `part_size` chunks and sent as a multipart upload to a temporary
+        key while being hashed, so memory use doesn't grow with file size. The object ends up
+        at uploads/<sha256><ext>; if that already exists the temporary upload is discarded.
+        When the caller already knows the hash (`content_sha256`, 64 hex digits) and the object
+        exists, nothing is uploaded at all; otherwise the hash must match what was streamed.
+
+        Returns { ok, key, bucket, sha256, deduplicated, size } or { ok: False, error, status },
+        where status is 400 for a malformed or mismatched content_sha256 and 500 otherwise.
+        """
+        bucket = bucket_name or os.getenv('UPLOADS_BUCKET') or os.getenv('QUESTIONBANK_BUCKET', 'questionbankaristotle')
+        part_size = part_size or UPLOAD_PART_SIZE
+        if content_sha256:
+            content_sha256 = content_sha256.strip().lower()
+            if not _SHA256_HEX.match(content_sha256):
+                return {'ok': False, 'error': 'content_sha256 must be 64 hex digits', 'status': 400}
+        try:
+            if content_sha256:
+                key = f"uploads/{content_sha256}{ext}"
+                if self._object_exists(bucket, key):
+                    return {'ok': True, 'key': key, 'bucket': bucket, 'sha256': content_sha256,
+                            'deduplicated': True, 'size': None}
+
+            digest = hashlib.sha256()
+            tmp_key = f"uploads/tmp/{uuid.uuid4().hex}{ext}"
+            first = stream.read(part_size)
+            digest.update(first)
+            size = len(first)
+            if len(first) < part_size:
+                # fits in one part: a plain put is cheaper than a multipart round trip
+                self.s3_client.put_object(Bucket=bucket, Key=tmp_key, Body=first)
+            else:
+                upload_id = self.s3_client.create_multipart_upload(Bucket=bucket, Key=tmp_key)['UploadId']
+                try:
+                    parts = []
+                    chunk = first
+                    while chunk:
+                        part = self.s3_client.upload_part(Bucket=bucket, Key=tmp_key, UploadId=upload_id,
+                                                          PartNumber=len(parts) + 1, Body=chunk)
+                        parts.append({'ETag': part['ETag'], 'PartNumber': len(parts) + 1})
+                        chunk = stream.read(part_size)
+                        digest.update(chunk)
+                        size += len(chunk)
+                    self.s3_client.complete_multipart_upload(Bucket=bucket, Key=tmp_key, UploadId=upload_id,
+                                                             MultipartUpload={'Parts': parts})
+                except Exception:
+                    self.s3_client.abort_multipart_upload(Bucket=bucket, Key=tmp_key, UploadId=upload_id)
+                    raise
+
+            sha = digest.hexdigest()
+            if content_sha256 and content_sha256 != sha:
+                self.s3_client.delete_object(Bucket=bucket, Key=tmp_key)
+                return {'ok': False, 'error': 'content_sha256 does not match the uploaded content', 'status': 400}
+            key = f"uploads/{sha}{ext}"
+            deduplicated = self._object_exists(bucket, key)
+            if not deduplicated:
+                self.s3_client.copy({'Bucket': bucket, 'Key': tmp_key}, bucket, key)
+            self.s3_client.delete_object(Bucket=bucket, Key=tmp_key)
+            return {'ok': True, 'key': key, 'bucket': bucket, 'sha256': sha, 'deduplicated': deduplicated, 'size': size}
+        except Exception as e:
+            return {'ok': False, 'error': str(e), 'status': 500}
+
+    def _object_exists(self, bucket: str, key: str) -> bool:
+        try:
+            self.s3_client.head_object(Bucket=bucket, Key=key)
+            return True
+        except Exception as e:
+            if aws_clients.error_code(e) in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
     def find_sub_by_stripe_customer(self, stripe_customer_id: str, bucket_name: str = None):
-        """Find a user 'sub' by their stored stripe_customer_id in user/{sub}.json files.
+        """Find a user 'sub' by their stored stripe_customer_id.
 
-        This performs a shallow scan of user/ objects in the configured bucket and returns the
-        first matching subject (sub) or None if not found. This is intended for small-scale
-        user counts or dev usage. For production, add an index (DynamoDB) mapping customers.
+        Looks the customer up in the reverse index maintained by the billing flow (see
+        link_stripe_customer and stripe_index.py). Only if the index has no entry does it fall back to scanning
+        user/{sub}.json objects, and a match found that way is written back to the index.
+        Run `python stripe_index.py rebuild` once to backfill existing profiles.
         """
         try:
             if not stripe_customer_id:
                 return None
+            try:
+                sub = self.customer_index.lookup(stripe_customer_id)
+                if sub:
+                    return sub
+            except Exception as e:
+                print(f"Stripe customer index lookup failed, scanning profiles: {e}")
             bucket = bucket_name or os.getenv('QUESTIONBANK_BUCKET', 'questionbankaristotle')
             paginator = self.s3_client.get_paginator('list_objects_v2')
             prefix = 'user/'
@@ -234,6 +509,10 @@ class S3:
                                 fname = key.split('/')[-1]
                                 if fname.endswith('.json'):
                                     sub = fname[:-5]
+                            try:
+                                self.customer_index.record(stripe_customer_id, sub)
+                            except Exception:
+                                pass
                             return sub
                     except Exception:
                         # ignore individual read errors and continue scanning
@@ -245,10 +524,66 @@ class S3:
 class Bedrock:
 
     def __init__(self):
-        load_dotenv()
+        settings.load_env()
         self.model_id = "amazon.nova-micro-v1:0"
         # Create a Bedrock Runtime client in the AWS Region of your choice.
-        self.client = boto3.client("bedrock-runtime", region_name=AWS_REGION)
+        self.client = aws_clients.client("bedrock-runtime", AWS_REGION)
+        self.cache = bedrock_cache
+
+    def _cache_key(self, body: dict, variant=None) -> str:
+        prompt = body["messages"][0]["content"][0]["text"]
+        return self.cache.make_key(self.model_id, prompt, body.get("inferenceConfig"), variant)
+
+    def _cache_store(self, key: str, result):
+        # Never cache failures or unparseable output, so the next identical call retries the model
+        if isinstance(result, dict) and (result.get("Error") or "raw" in result):
+            return
+        self.cache.set(key, result)
+
+    def _invoke(self, body: dict, request: str = None, stream: bool = False):
+        """One model call, admitted by admission.controller first; returns the decoded response body.
+
+        Raises admission.Throttled when there's no capacity within the caller's lane wait.
+        With `stream=True` returns the invoke_model_with_response_stream response instead.
+        """
+        request = request or json.dumps(body)
+        permit = admission.admit(body, request)
+        try:
+            if stream:
+                response = self.client.invoke_model_with_response_stream(modelId=self.model_id, body=request)
+                return dict(response, body=self._settled_stream(response["body"], permit))
+            response = self.client.invoke_model(modelId=self.model_id, body=request)
+            model_response = json.loads(response["body"].read())
+        except Exception:
+            permit.settle(None)
+            raise
+        permit.settle(model_response.get("usage"))
+        return model_response
+
+    @staticmethod
+    def _settled_stream(events, permit):
+        """Pass stream events through, settling `permit` with the usage in the final event.
+
+        A stream abandoned before that event keeps its estimate: the tokens were spent upstream.
+        """
+        usage = None
+        try:
+            for event in events:
+                data = (event.get("chunk") or {}).get("bytes") or b""
+                # only the last event carries usage; skip parsing every text delta twice
+                if b"usage" in data or b"invocationMetrics" in data:
+                    payload = json.loads(data)
+                    metrics = payload.get("amazon-bedrock-invocationMetrics") or {}
+                    usage = (payload.get("metadata") or {}).get("usage") or usage or (
+                        {"inputTokens": metrics.get("inputTokenCount", 0), "outputTokens": metrics.get("outputTokenCount", 0)}
+                        if metrics else None)
+                yield event
+        finally:
+            close = getattr(events, "close", None)
+            if close:
+                close()
+        if usage is not None:
+            permit.settle(usage)
 
     def generate_desc(self, prompt=""):
         body = {
@@ -264,15 +599,20 @@ class Bedrock:
                 }
             ],
         }
+        key = self._cache_key(body)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
         try:
-            response = self.client.invoke_model(modelId=self.model_id, body=json.dumps(body))
-            # Decode the response body.
-            model_response = json.loads(response["body"].read())
+            model_response = self._invoke(body)
 
             # Extract and print the response text.
             text = model_response["output"]["message"]["content"][0]["text"]
+            self._cache_store(key, text)
             return text
-        except (ClientError, Exception) as e:
+        except admission.Throttled:
+            raise
+        except Exception as e:
             print(e)
             # Surface full exception information for debugging
             resp = getattr(e, 'response', None)
@@ -312,8 +652,10 @@ class Bedrock:
         try:
             # Invoke the model with the request.
             print(f"Invoking model {self.model_id} with body length={len(json.dumps(body))}")
-            response = self.client.invoke_model(modelId=self.model_id, body=json.dumps(body))
-        except (ClientError, Exception) as e:
+            model_response = self._invoke(body)
+        except admission.Throttled:
+            raise
+        except Exception as e:
             # Surface full exception information for debugging
             resp = getattr(e, 'response', None)
             print("Bedrock invoke failed:")
@@ -323,8 +665,6 @@ class Bedrock:
                 print(str(e))
             # Return a structured error so callers can see details
             return {'Error': resp.get('Error') if resp and isinstance(resp, dict) and 'Error' in resp else {'Message': str(e), 'Code': getattr(e, 'code', None)}, 'ResponseMetadata': resp.get('ResponseMetadata') if resp and isinstance(resp, dict) and 'ResponseMetadata' in resp else None, 'message': str(e)}
-        # Decode the response body.
-        model_response = json.loads(response["body"].read())
         # Extract and print the response text.
         text = model_response["output"]["message"]["content"][0]["text"]
         return text
@@ -364,11 +704,18 @@ class Bedrock:
             "messages": [{"role": "user", "content": [{"text": prompt}]}],
         }
 
+        key = self._cache_key(body)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
         request = json.dumps(body)
         try:
             print(f"Invoking model {self.model_id} with body length={len(request)}")
-            response = self.client.invoke_model(modelId=self.model_id, body=request)
-        except (ClientError, Exception) as e:
+            model_response = self._invoke(body, request)
+        except admission.Throttled:
+            raise
+        except Exception as e:
             resp = getattr(e, "response", None)
             print("Bedrock invoke failed:")
             try:
@@ -377,7 +724,6 @@ class Bedrock:
                 print(str(e))
             return {"Error": resp.get("Error") if resp and isinstance(resp, dict) and "Error" in resp else {"Message": str(e), "Code": getattr(e, "code", None)}, "ResponseMetadata": resp.get("ResponseMetadata") if resp and isinstance(resp, dict) and "ResponseMetadata" in resp else None, "message": str(e)}
 
-        model_response = json.loads(response["body"].read())
         text = model_response["output"]["message"]["content"][0]["text"]
 
         def default_for_type(type_str: str):
@@ -407,21 +753,268 @@ class Bedrock:
                 else:
                     result[name] = default_for_type(type_)
 
+            self._cache_store(key, result)
             return result
         except Exception:
             # Fallback: return raw text so caller can inspect
             return {"raw": text}
 
 
-    def generate_mcq(self, num_questions : int, input_file= "", prompt = ""):
-        
+    def generate_mcq(self, num_questions : int, input_file= "", prompt = "", parallel: bool = False,
+                     chunk_size: Optional[int] = None, max_workers: Optional[int] = None, material: str = ""):
+        """Generate `num_questions` multiple-choice questions from a prompt or an input file.
 
-        file_text = ''
+        With `parallel=True` the request is split into chunks of at most `chunk_size` questions
+        which are generated concurrently on a bounded thread pool (`max_workers`) and merged
+        back into a single {"questions": [...]} result. A chunk that fails or returns malformed
+        JSON only loses its own questions instead of the whole batch.
+
+        Material longer than MCQ_MATERIAL_CHUNK_TOKENS is always handled map-reduce style
+        (see _generate_mcq_from_material) rather than pasted into one prompt. `material` passes
+        already-extracted text (e.g. passages retrieved from material_index) instead of a file.
+
+        Questions failing validation are regenerated individually (see _validate_mcq), then
+        near-duplicates are removed and only the shortfall is regenerated (see _dedupe_mcq);
+        the result carries `validation` and `dedup` reports.
+        """
+
+        file_text = material or ''
         if input_file != "":
-            with open(input_file, "r", encoding="utf-8") as f:
-                file_text = f.read()
-        
-        prompt = f"""Based on the {'given prompt' if input_file == '' else 'uploaded lecture material'}, generate {num_questions} questions in this JSON format:
+            file_text = extraction.extract_text(input_file)
+
+        chunk_size = chunk_size or MCQ_CHUNK_SIZE
+        if material_chunks.estimate_tokens(file_text) > MCQ_MATERIAL_CHUNK_TOKENS:
+            result = self._generate_mcq_from_material(num_questions, file_text, prompt, max_workers or MCQ_MAX_WORKERS)
+        elif parallel and num_questions > chunk_size:
+            result = self._generate_mcq_parallel(num_questions, file_text, prompt, chunk_size, max_workers or MCQ_MAX_WORKERS)
+        else:
+            result = self._generate_mcq_chunk(num_questions, file_text, prompt)
+        result = self._validate_mcq(result, file_text, prompt)
+        return self._dedupe_mcq(result, num_questions, file_text, prompt)
+
+    def _validate_mcq(self, result, file_text: str, prompt: str):
+        """Validate every question and send only the broken ones back to the model for repair.
+
+        Local fixes (e.g. a bare int answer) are applied first; anything still failing after
+        MCQ_REPAIR_ATTEMPTS repair calls is dropped, leaving the gap to the dedup top-up.
+        """
+        if not isinstance(result, dict) or not isinstance(result.get("questions"), list):
+            return result
+        checked = mcq_validation.validate_batch(result["questions"])
+        questions = checked["questions"]
+        invalid = checked["invalid"]
+        report = {"checked": len(questions), "invalid": invalid, "repaired": 0, "dropped": 0}
+
+        for attempt in range(MCQ_REPAIR_ATTEMPTS):
+            if not invalid:
+                break
+            fixed = self.repair_mcq([(questions[item["index"]], item["problems"]) for item in invalid],
+                                    file_text, prompt, variant=f"repair-{attempt}")
+            still = []
+            for n, item in enumerate(invalid):
+                replacement = mcq_validation.normalize_question(fixed[n]) if n < len(fixed) else None
+                problems = mcq_validation.question_problems(replacement)
+                if not problems:
+                    questions[item["index"]] = replacement
+                    report["repaired"] += 1
+                else:
+                    still.append(item)
+            invalid = still
+
+        dropped = {item["index"] for item in invalid}
+        report["dropped"] = len(dropped)
+        if report["invalid"]:
+            print(f"generate_mcq: {len(report['invalid'])} invalid questions, repaired {report['repaired']}, dropped {len(dropped)}")
+        return dict(result, questions=[q for i, q in enumerate(questions) if i not in dropped], validation=report)
+
+    def repair_mcq(self, broken: list, file_text: str = "", prompt: str = "", variant=None) -> list:
+        """One model call that fixes `broken` [(question, problems)] and returns the questions in order.
+
+        Returns [] if the call fails or the output can't be parsed; callers keep whatever validates.
+        """
+        items = "\n".join(
+            f"{n + 1}. {json.dumps(q, ensure_ascii=False) if isinstance(q, (dict, list)) else str(q)}\n   Problems: {'; '.join(problems)}"
+            for n, (q, problems) in enumerate(broken))
+        context = file_text if material_chunks.estimate_tokens(file_text) <= MCQ_MATERIAL_CHUNK_TOKENS else ""
+        repair_prompt = f"""The following {len(broken)} multiple-choice questions are broken. Fix each one so that it has question text,
+        at least 2 distinct non-empty options, and an "answer" list of valid indices into its options array.
+        Return ONLY JSON of the form {{"questions": [...]}} with exactly {len(broken)} questions, in the same order, each in this format:
+        {{"type": "multiple-choice", "question": "...", "options": ["A: ...", "B: ...", "C: ...", "D: ..."], "answer": [2], "explanation": "..."}}
+        {f"Topic: {prompt}" if prompt else ""}
+        {f"Source material: {context}" if context else ""}
+        Broken questions:
+        {items}
+        """
+        body = {
+            "inferenceConfig": {"maxTokens": 4000, "temperature": 0.2, "topP": 0.9},
+            "messages": [{"role": "user", "content": [{"text": repair_prompt}]}],
+        }
+        try:
+            print(f"Repairing {len(broken)} questions with model {self.model_id}")
+            text = self._invoke(body)["output"]["message"]["content"][0]["text"]
+        except Exception as e:
+            print(f"Bedrock repair failed: {e}")
+            return []
+        try:
+            parsed = json.loads(text)
+        except Exception:
+            return mcq_validation.salvage(text)
+        if isinstance(parsed, dict):
+            parsed = parsed.get("questions") if isinstance(parsed.get("questions"), list) else [parsed]
+        return parsed if isinstance(parsed, list) else []
+
+    def _dedupe_mcq(self, result, num_questions: int, file_text: str, prompt: str):
+        """Drop near-duplicate questions from `result` and top up only the shortfall.
+
+        Each top-up asks for exactly the missing count, tells the model which questions it
+        already has, and is itself filtered against everything kept so far. Long material is
+        topped up from one chunk at a time rather than the whole text.
+        """
+        if not MCQ_DEDUP or not isinstance(result, dict) or not isinstance(result.get("questions"), list):
+            return result
+        deduper = question_dedup.QuestionDeduper()
+        questions, report = question_dedup.dedupe(result["questions"], deduper)
+        report["toppedUp"] = 0
+
+        chunks = None
+        if material_chunks.estimate_tokens(file_text) > MCQ_MATERIAL_CHUNK_TOKENS:
+            chunks = material_chunks.split_chunks(file_text, MCQ_MATERIAL_CHUNK_TOKENS)
+        for attempt in range(MCQ_TOPUP_ATTEMPTS):
+            shortfall = num_questions - len(questions)
+            if shortfall <= 0:
+                break
+            existing = "; ".join(question_dedup.question_text(q) for q in questions)
+            topup_prompt = f"{prompt or ''}\nDo not repeat or rephrase any of these existing questions: {existing}"
+            context = chunks[(len(questions) + attempt) % len(chunks)] if chunks else file_text
+            try:
+                extra = self._generate_mcq_chunk(shortfall, context, topup_prompt, variant=f"topup-{attempt}")
+            except admission.Throttled:
+                # a short bank beats failing the whole request after the main call succeeded
+                break
+            if isinstance(extra, dict) and isinstance(extra.get("questions"), list):
+                extra = extra["questions"]
+            elif isinstance(extra, dict) and extra.get("question"):
+                extra = [extra]
+            else:
+                continue
+            # top-ups aren't repaired; anything broken just doesn't count towards the shortfall
+            extra = [q for q in mcq_validation.validate_batch(extra)["questions"] if not mcq_validation.question_problems(q)]
+            added, extra_report = question_dedup.dedupe(extra, deduper)
+            for removed in extra_report["removed"]:
+                removed["topUp"] = attempt + 1
+            report["removed"].extend(extra_report["removed"])
+            questions.extend(added[:shortfall])
+            report["toppedUp"] += len(added[:shortfall])
+
+        report["kept"] = len(questions[:num_questions])
+        if report["removed"] or report["toppedUp"]:
+            print(f"generate_mcq: dropped {len(report['removed'])} near-duplicates, topped up {report['toppedUp']}")
+        return dict(result, questions=questions[:num_questions], dedup=report)
+
+    def _generate_mcq_parallel(self, num_questions: int, file_text: str, prompt: str, chunk_size: int, max_workers: int):
+        # e.g. 25 questions with chunk_size 10 -> [10, 10, 5]
+        counts = [chunk_size] * (num_questions // chunk_size)
+        if num_questions % chunk_size:
+            counts.append(num_questions % chunk_size)
+
+        results = [None] * len(counts)
+        throttled = None
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(counts)))) as pool:
+            # each chunk runs in a copy of this context so it stays in the caller's admission lane
+            futures = {pool.submit(contextvars.copy_context().run, self._generate_mcq_chunk, n, file_text, prompt, i,
+                                   self._chunk_hint(i, counts, num_questions, bool(file_text))): i
+                       for i, n in enumerate(counts)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except admission.Throttled as e:
+                    results[i] = {"raw": str(e)}
+                    throttled = e
+                except Exception as e:
+                    results[i] = {"raw": str(e)}
+
+        # Merge in chunk order so the output is deterministic for a given set of responses
+        questions = []
+        failed = []
+        for i, result in enumerate(results):
+            if isinstance(result, dict) and isinstance(result.get("questions"), list):
+                questions.extend(result["questions"])
+            elif isinstance(result, dict) and result.get("question"):
+                # single-question chunks may come back as a bare object
+                questions.append(result)
+            else:
+                failed.append(i)
+
+        if not questions:
+            if throttled:
+                raise throttled
+            # Nothing usable came back; surface the first chunk's error/raw output as before
+            return results[0]
+        if failed:
+            print(f"generate_mcq: {len(failed)}/{len(counts)} chunks failed: {failed}")
+        return {"questions": questions[:num_questions]}
+
+    def _generate_mcq_from_material(self, num_questions: int, file_text: str, prompt: str, max_workers: int):
+        """Map-reduce generation over long material.
+
+        The text is split into token-bounded chunks, the question count is allocated across
+        them by size, every chunk with a non-zero share is generated in parallel, and the
+        results are merged in material order with repeats dropped and trimmed to `num_questions`.
+        """
+        chunks = material_chunks.split_chunks(file_text, MCQ_MATERIAL_CHUNK_TOKENS, MCQ_MATERIAL_OVERLAP_TOKENS)
+        counts = material_chunks.allocate(num_questions, [material_chunks.estimate_tokens(c) for c in chunks])
+        jobs = [(i, n) for i, n in enumerate(counts) if n > 0]
+        print(f"generate_mcq: {len(file_text)} chars -> {len(chunks)} chunks, generating from {len(jobs)}")
+
+        results = {}
+        throttled = None
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(jobs)))) as pool:
+            futures = {pool.submit(contextvars.copy_context().run, self._generate_mcq_chunk, n, chunks[i], prompt, i): i
+                       for i, n in jobs}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except admission.Throttled as e:
+                    results[i] = {"raw": str(e)}
+                    throttled = e
+                except Exception as e:
+                    results[i] = {"raw": str(e)}
+
+        batches = []
+        failed = []
+        for i, n in jobs:
+            result = results[i]
+            if isinstance(result, dict) and isinstance(result.get("questions"), list):
+                batches.append([q for q in result["questions"] if isinstance(q, dict)][:n])
+            elif isinstance(result, dict) and result.get("question"):
+                batches.append([result])
+            else:
+                failed.append(i)
+
+        if not batches:
+            if throttled:
+                raise throttled
+            return results[jobs[0][0]] if jobs else {"questions": []}
+        if failed:
+            print(f"generate_mcq: {len(failed)}/{len(jobs)} material chunks failed: {failed}")
+        return {"questions": material_chunks.merge_questions(batches, num_questions)}
+
+    @staticmethod
+    def _chunk_hint(i: int, counts: list, num_questions: int, from_material: bool) -> str:
+        """Steer parallel chunk `i` towards its own slice of the subject so chunks don't overlap."""
+        start = sum(counts[:i])
+        part = f"part {i + 1} of {len(counts)}"
+        if from_material:
+            focus = f"Draw these questions mainly from {part} of the material (split it into {len(counts)} equal sections in reading order)."
+        else:
+            focus = (f"Split the topic into {len(counts)} distinct subtopics and write these questions only about subtopic {i + 1}; "
+                     f"other parts cover the remaining subtopics.")
+        return f"These are questions {start + 1}-{start + counts[i]} of a {num_questions}-question quiz ({part}). {focus}"
+
+    def _mcq_body(self, num_questions: int, file_text: str = "", prompt: str = "", hint: str = "") -> dict:
+        prompt = f"""Based on the {'given prompt' if file_text == '' else 'uploaded lecture material'}, generate {num_questions} questions in this JSON format:
         {{
         "type": "multiple-choice",
         "question": "The correct answer is C.",
@@ -431,11 +1024,12 @@ class Bedrock:
         }}
         The "answer" field should correspond to the index (or indices) in the options array that corresponds to the right answer
         Ensure that your response is in correct JSON format (INCLUDE NO EXTRA TEXT) as your output will be fed directly into code.
-        {prompt if input_file == "" else file_text}
+        {f"Focus the questions on: {prompt}" if file_text and prompt else ""}
+        {hint}
+        {prompt if file_text == "" else file_text}
         """
 
-
-        body = {
+        return {
             "inferenceConfig" : {
                 "maxTokens": 10000,
                 "temperature": 0.5,
@@ -449,6 +1043,64 @@ class Bedrock:
             ],
         }
 
+    def generate_mcq_stream(self, num_questions: int, input_file="", prompt=""):
+        """Stream questions as the model writes them.
+
+        Uses invoke_model_with_response_stream and feeds each text delta into an
+        IncrementalQuestionParser, yielding every question dict as soon as its closing
+        brace arrives. Questions go through the same checks as generate_mcq (malformed and
+        near-duplicate ones are dropped), and the stream stops after `num_questions`.
+        Raises on invoke errors so the caller can report them.
+        """
+        file_text = ''
+        if input_file != "":
+            file_text = extraction.extract_text(input_file)
+
+        body = self._mcq_body(num_questions, file_text, prompt)
+        request = json.dumps(body)
+        print(f"Streaming model {self.model_id} with body length={len(request)}")
+        response = self._invoke(body, request, stream=True)
+
+        parser = IncrementalQuestionParser()
+        deduper = question_dedup.QuestionDeduper() if MCQ_DEDUP else None
+        emitted = dropped = 0
+        events = response["body"]
+        try:
+            for event in events:
+                chunk = event.get("chunk")
+                if not chunk:
+                    continue
+                payload = json.loads(chunk["bytes"])
+                text = (payload.get("contentBlockDelta") or {}).get("delta", {}).get("text")
+                if not text:
+                    continue
+                for question in parser.feed(text):
+                    question = mcq_validation.normalize_question(question)
+                    if mcq_validation.question_problems(question):
+                        dropped += 1
+                        continue
+                    if deduper is not None and deduper.add(question_dedup.question_text(question)):
+                        continue
+                    yield question
+                    emitted += 1
+                    if emitted >= num_questions:
+                        return
+        finally:
+            if dropped:
+                print(f"generate_mcq_stream: dropped {dropped} malformed question(s)")
+            # stopping early (or a client hanging up) shouldn't leave the model stream open
+            close = getattr(events, "close", None)
+            if close:
+                close()
+
+    def _generate_mcq_chunk(self, num_questions: int, file_text: str = "", prompt: str = "", variant=None, hint: str = ""):
+        # `hint` gives each parallel chunk a different slice of the subject (see _chunk_hint)
+        body = self._mcq_body(num_questions, file_text, prompt, hint)
+        # `variant` keeps equally sized parallel chunks of one request from sharing a cache entry
+        key = self._cache_key(body, variant)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
 
         # Convert the native request to JSON.
         request = json.dumps(body)
@@ -456,9 +1108,11 @@ class Bedrock:
         try:
             # Invoke the model with the request.
             print(f"Invoking model {self.model_id} with body length={len(request)}")
-            response = self.client.invoke_model(modelId=self.model_id, body=request)
+            model_response = self._invoke(body, request)
 
-        except (ClientError, Exception) as e:
+        except admission.Throttled:
+            raise
+        except Exception as e:
             
             # Surface full exception information for debugging
             resp = getattr(e, 'response', None)
@@ -470,23 +1124,28 @@ class Bedrock:
             # Return a structured error so callers can see details
             return {'Error': resp.get('Error') if resp and isinstance(resp, dict) and 'Error' in resp else {'Message': str(e), 'Code': getattr(e, 'code', None)}, 'ResponseMetadata': resp.get('ResponseMetadata') if resp and isinstance(resp, dict) and 'ResponseMetadata' in resp else None, 'message': str(e)}
 
-        # Decode the response body.
-        model_response = json.loads(response["body"].read())
-
         # Extract and print the response text.
         text = model_response["output"]["message"]["content"][0]["text"]
 
         try:
             parsed = json.loads(text)
-            if isinstance(parsed, list):
-                return {"questions": parsed}
-            if isinstance(parsed, dict) and parsed.get("questions"):
-                return {"questions": parsed["questions"]}
-            # if dict but not the expected shape, return it as-is
-            return parsed
         except Exception:
-            # fallback: return raw text (client can handle it) or split into lines
+            # one malformed element shouldn't cost the whole batch: keep the objects that parse
+            salvaged = mcq_validation.salvage(text)
+            if salvaged:
+                print(f"generate_mcq: output was not valid JSON, salvaged {len(salvaged)}/{num_questions} questions")
+                return {"questions": salvaged}
             return {"raw": text}
+
+        if isinstance(parsed, list):
+            result = {"questions": parsed}
+        elif isinstance(parsed, dict) and parsed.get("questions"):
+            result = {"questions": parsed["questions"]}
+        else:
+            # if dict but not the expected shape, return it as-is
+            result = parsed
+        self._cache_store(key, result)
+        return result
         
 
 
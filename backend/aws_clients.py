@@ -0,0 +1,109 @@
+import os
+import threading
+
+# Per-service read timeouts; model calls legitimately run far longer than a DynamoDB read
+_READ_TIMEOUTS = {'bedrock-runtime': 'BEDROCK_READ_TIMEOUT'}
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+_resources = {}
+_tables = {}
+
+
+def client_config(service: str = None):
+    """botocore Config shared by every client; tuned with AWS_* env vars.
+
+    Read at first use rather than import so values from .env (loaded by settings.load_env) apply.
+    """
+    from botocore.config import Config
+    read_timeout = float(os.getenv('AWS_READ_TIMEOUT', 60))
+    if service in _READ_TIMEOUTS:
+        read_timeout = float(os.getenv(_READ_TIMEOUTS[service], 300))
+    pool = int(os.getenv('AWS_MAX_POOL_CONNECTIONS', 50))
+    if service == 'bedrock-runtime':
+        # the async server (asgi.py) can have ASYNC_MAX_INFLIGHT model calls open at once
+        pool = int(os.getenv('BEDROCK_MAX_POOL_CONNECTIONS') or max(pool, int(os.getenv('ASYNC_MAX_INFLIGHT') or 0)))
+    return Config(
+        max_pool_connections=pool,
+        connect_timeout=float(os.getenv('AWS_CONNECT_TIMEOUT', 5)),
+        read_timeout=read_timeout,
+        tcp_keepalive=os.getenv('AWS_TCP_KEEPALIVE', 'true').lower() in ('1', 'true', 'yes'),
+        retries={'mode': os.getenv('AWS_RETRY_MODE', 'adaptive'),
+                 'max_attempts': int(os.getenv('AWS_MAX_ATTEMPTS', 5))},
+    )
+
+
+def error_code(exc):
+    """AWS error code of a botocore ClientError (e.g. 'NoSuchKey'), else None.
+
+    Lets modules branch on AWS errors without importing botocore.exceptions at load time.
+    """
+    response = getattr(exc, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code')
+    return None
+
+
+def _get_session():
+    # caller holds _lock; creating clients from one Session concurrently is not thread-safe.
+    # boto3 is imported here so importing the backend doesn't pay for it before the first AWS call
+    global _session
+    if _session is None:
+        import boto3
+        _session = boto3.session.Session()
+    return _session
+
+
+def client(service: str, region_name: str = None):
+    """Process-wide client for (service, region), created once under a lock.
+
+    botocore clients are thread-safe, so every request thread shares the same client and its
+    connection pool instead of paying for client and TLS setup per call.
+    """
+    key = (service, region_name)
+    found = _clients.get(key)
+    if found is not None:
+        return found
+    with _lock:
+        if key not in _clients:
+            _clients[key] = _get_session().client(service, region_name=region_name, config=client_config(service))
+        return _clients[key]
+
+
+def resource(service: str, region_name: str = None):
+    """Process-wide boto3 resource for (service, region).
+
+    Shared resources are only used for stateless calls (get_item, put_item, query, ...) which
+    go through their thread-safe client; don't call load()/reload() on shared objects.
+    """
+    key = (service, region_name)
+    found = _resources.get(key)
+    if found is not None:
+        return found
+    with _lock:
+        if key not in _resources:
+            _resources[key] = _get_session().resource(service, region_name=region_name, config=client_config(service))
+        return _resources[key]
+
+
+def table(name: str, region_name: str = None):
+    key = (name, region_name)
+    found = _tables.get(key)
+    if found is None:
+        found = _tables.setdefault(key, resource('dynamodb', region_name).Table(name))
+    return found
+
+
+def reset():
+    """Forget every client, e.g. in a worker process after fork so it opens its own connections."""
+    global _session
+    with _lock:
+        _session = None
+        _clients.clear()
+        _resources.clear()
+        _tables.clear()
+
+
+def stats() -> dict:
+    return {'clients': sorted(f"{s}@{r}" for s, r in _clients), 'resources': sorted(f"{s}@{r}" for s, r in _resources)}
@@ -0,0 +1,88 @@
+"""Join throughput benchmark: players map on the session item vs. PLAYER# rows.
+
+Usage:
+    python bench_join.py --players 200 --threads 32           # against the real tables
+    python bench_join.py --players 200 --threads 32 --moto    # in-process moto mock
+
+Each mode joins `--players` players to a fresh session from `--threads` concurrent workers
+and reports joins/s plus p50/p99 latency. Against real DynamoDB the map mode also shows the
+cost of two round trips per join on one hot item.
+"""
+import argparse
+import os
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _create_mock_tables():
+    import boto3
+    boto3.client('dynamodb', region_name='us-east-1').create_table(
+        TableName='QuizSessions',
+        KeySchema=[{'AttributeName': 'sessionID', 'KeyType': 'HASH'}],
+        AttributeDefinitions=[{'AttributeName': 'sessionID', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST')
+    boto3.client('dynamodb', region_name='us-east-2').create_table(
+        TableName='Quiz',
+        KeySchema=[{'AttributeName': 'pk', 'KeyType': 'HASH'}, {'AttributeName': 'sk', 'KeyType': 'RANGE'}],
+        AttributeDefinitions=[{'AttributeName': 'pk', 'AttributeType': 'S'}, {'AttributeName': 'sk', 'AttributeType': 'S'}],
+        BillingMode='PAY_PER_REQUEST')
+
+
+def run_mode(aws, dynamo, mode: str, players: int, threads: int) -> dict:
+    aws.PLAYER_STORAGE = mode
+    session_id = f"BENCH-{uuid.uuid4().hex[:8]}"
+    dynamo.put_session({'sessionID': session_id, 'playerStorage': mode, 'players': {}} if mode == 'map'
+                       else {'sessionID': session_id, 'playerStorage': mode})
+
+    def join(i):
+        start = time.perf_counter()
+        res = dynamo.join_game(session_id, f"player{i}")
+        return time.perf_counter() - start, res.get('ok', False)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(join, range(players)))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    return {
+        'mode': mode,
+        'joins': players,
+        'errors': sum(1 for r in results if not r[1]),
+        'joins_per_sec': round(players / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2),
+        'players_visible': len(dynamo.get_game_info(session_id).get('data', {}).get('players', [])),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--players', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--moto', action='store_true', help='run against an in-process moto mock')
+    args = parser.parse_args()
+
+    mock = None
+    if args.moto:
+        from moto import mock_aws
+        for var in ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'):
+            os.environ.setdefault(var, 'testing')
+        mock = mock_aws()
+        mock.start()
+        _create_mock_tables()
+
+    import aws
+    dynamo = aws.DynamoDB()
+    try:
+        for mode in ('map', 'items'):
+            print(run_mode(aws, dynamo, mode, args.players, args.threads))
+    finally:
+        if mock:
+            mock.stop()
+
+
+if __name__ == '__main__':
+    main()
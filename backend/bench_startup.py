@@ -0,0 +1,84 @@
+"""Cold-start benchmark: how long `import app` takes and which modules it spends that time on.
+
+Usage:
+    python bench_startup.py                     # 5 fresh interpreters, top 15 modules
+    python bench_startup.py --runs 10 --top 25
+    python bench_startup.py --budget-ms 400     # exit 1 if the median import exceeds the budget
+    python bench_startup.py --module aws        # profile another module instead of app
+
+Each run imports the module in a fresh `python -X importtime` subprocess, so nothing is
+warm in sys.modules. Reports the median wall time of the import, the median self/cumulative
+time of the slowest modules, and whether heavy dependencies that should load lazily
+(botocore, boto3, stripe, jose, requests, PyPDF2) were pulled in at import.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+LAZY_MODULES = ('botocore', 'boto3', 'stripe', 'jose', 'requests', 'PyPDF2')
+
+_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+sys.stderr.write('bench_startup: wall_us=%d\\n' % (elapsed * 1e6))
+sys.stderr.write('bench_startup: loaded=%s\\n' % ','.join(m for m in {lazy!r} if m in sys.modules))
+"""
+
+
+def run_once(module: str) -> dict:
+    script = _SCRIPT.format(module=module, lazy=LAZY_MODULES)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', script], cwd=os.path.dirname(os.path.abspath(__file__)),
+                          capture_output=True, text=True, check=True)
+    modules = {}
+    wall_us = 0
+    loaded = []
+    for line in proc.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us))
+        elif line.startswith('bench_startup: wall_us='):
+            wall_us = int(line.split('=', 1)[1])
+        elif line.startswith('bench_startup: loaded='):
+            loaded = [m for m in line.split('=', 1)[1].split(',') if m]
+    return {'wall_us': wall_us, 'modules': modules, 'loaded': loaded}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--budget-ms', type=float, default=None, help='fail if the median import takes longer')
+    args = parser.parse_args()
+
+    runs = [run_once(args.module) for _ in range(args.runs)]
+    wall_ms = statistics.median(r['wall_us'] for r in runs) / 1000
+    names = set().union(*(r['modules'] for r in runs))
+    rows = []
+    for name in names:
+        samples = [r['modules'][name] for r in runs if name in r['modules']]
+        rows.append((statistics.median(s[1] for s in samples) / 1000, statistics.median(s[0] for s in samples) / 1000, name))
+    rows.sort(reverse=True)
+
+    print(f"import {args.module}: median {wall_ms:.1f} ms over {args.runs} runs")
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for cumulative, self_ms, name in rows[:args.top]:
+        print(f"{cumulative:14.1f} {self_ms:9.1f}  {name}")
+    eager = sorted(set().union(*(r['loaded'] for r in runs)))
+    print(f"lazy dependencies loaded at import: {', '.join(eager) if eager else 'none'}")
+
+    if args.budget_ms is not None and wall_ms > args.budget_ms:
+        print(f"FAIL: {wall_ms:.1f} ms exceeds budget of {args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,21 @@
-import boto3
+import base64
 import datetime
+import json
+import time
 import uuid
-from boto3.dynamodb.conditions import Key
+from decimal import Decimal
+import leaderboard
+import game_events
+import aws_clients
+
+QUIZ_TABLE = 'Quiz'
+QUIZ_REGION = 'us-east-2'
+
+
+def _table():
+    # from the shared registry, so importing this module opens no connections
+    return aws_clients.table(QUIZ_TABLE, QUIZ_REGION)
 
-dynamodb = boto3.resource('dynamodb', region_name='us-east-2')
-table = dynamodb.Table('Quiz')
 
 def create_game(host_id: str, seconds_per_question=20):
     game_id = str(uuid.uuid4())
@@ -18,10 +29,14 @@ def create_game(host_id: str, seconds_per_question=20):
         "createdAt": datetime.datetime.utcnow().isoformat() + "Z",
         "settings": {"secondsPerQuestion": seconds_per_question}
     }
-    table.put_item(Item=item)
+    _table().put_item(Item=item)
     return game_id
 
 def join_game(game_id: str, player_id: str, name: str):
+    """Add a PLAYER#<player_id> row with a single conditional put.
+
+    Returns the new item, or None if that player already joined this game.
+    """
     item = {
         "pk": f"GAME#{game_id}",
         "sk": f"PLAYER#{player_id}",
@@ -31,31 +46,199 @@ def join_game(game_id: str, player_id: str, name: str):
         "score": 0,
         "joinedAt": datetime.datetime.utcnow().isoformat() + "Z"
     }
-    table.put_item(
-        Item=item,
-        #ConditionExpression="attribute_not_exists(#sk)",
-        #ExpressionAttributeNames={"#sk": "sk"}
-    )
+    try:
+        _table().put_item(
+            Item=item,
+            ConditionExpression="attribute_not_exists(#sk)",
+            ExpressionAttributeNames={"#sk": "sk"}
+        )
+    except Exception as e:
+        if aws_clients.error_code(e) == 'ConditionalCheckFailedException':
+            return None
+        raise
+    game_events.publish(game_id, 'player_joined', {'playerId': player_id, 'name': name, 'score': 0})
     return item
 
 
-def list_players(game_id: str):
-    resp = table.query(
-        KeyConditionExpression=Key('pk').eq(f"GAME#{game_id}") & Key('sk').begins_with("PLAYER#")
-    )
-    return resp['Items']
+def _query_args(game_id: str, prefix: str, projection: list = None, limit: int = None):
+    from boto3.dynamodb.conditions import Key  # pulls in boto3; deferred to the first query
+    args = {'KeyConditionExpression': Key('pk').eq(f"GAME#{game_id}") & Key('sk').begins_with(prefix)}
+    if projection:
+        # placeholders for every attribute so reserved words (name, index, ...) just work
+        names = {f"#p{i}": attr for i, attr in enumerate(projection)}
+        args['ProjectionExpression'] = ', '.join(names)
+        args['ExpressionAttributeNames'] = names
+    if limit:
+        args['Limit'] = limit
+    return args
 
-def list_questions(game_id: str):
-    resp = table.query(
-        KeyConditionExpression=Key('pk').eq(f"GAME#{game_id}") & Key('sk').begins_with("QUESTION#")
-    )
-    return resp['Items']
+def iter_partition(game_id: str, prefix: str, projection: list = None, page_size: int = None):
+    """Yield every item under GAME#<game_id> whose sk starts with `prefix`.
+
+    Follows LastEvaluatedKey across pages, so partitions larger than one 1 MB query page are
+    read completely while only one page is held in memory. `projection` limits the
+    attributes fetched; `page_size` sets Limit per underlying query.
+    """
+    args = _query_args(game_id, prefix, projection, page_size)
+    while True:
+        resp = _table().query(**args)
+        yield from resp['Items']
+        if 'LastEvaluatedKey' not in resp:
+            return
+        args['ExclusiveStartKey'] = resp['LastEvaluatedKey']
+
+def encode_cursor(last_key: dict):
+    if not last_key:
+        return None
+    raw = json.dumps(last_key, default=lambda v: int(v) if isinstance(v, Decimal) else str(v))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str):
+    """The LastEvaluatedKey behind a cursor token; ValueError('invalid cursor') for anything else."""
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+    except (ValueError, UnicodeError):
+        raise ValueError('invalid cursor')
+    if not isinstance(key, dict) or not isinstance(key.get('pk'), str) or not isinstance(key.get('sk'), str):
+        raise ValueError('invalid cursor')
+    return key
+
+def query_page(game_id: str, prefix: str, cursor: str = None, limit: int = 50, projection: list = None):
+    """One page of a partition for HTTP callers: returns (items, next_cursor).
+
+    `next_cursor` is an opaque token to pass back as `cursor`, or None on the last page.
+    """
+    args = _query_args(game_id, prefix, projection, limit)
+    start_key = decode_cursor(cursor)
+    if start_key:
+        if start_key.get('pk') != f"GAME#{game_id}":
+            raise ValueError('Cursor does not belong to this game')
+        args['ExclusiveStartKey'] = start_key
+    resp = _table().query(**args)
+    return resp['Items'], encode_cursor(resp.get('LastEvaluatedKey'))
+
+def list_players(game_id: str, projection: list = None):
+    return list(iter_partition(game_id, "PLAYER#", projection))
+
+def list_questions(game_id: str, projection: list = None):
+    return list(iter_partition(game_id, "QUESTION#", projection))
+
+def get_question(game_id: str, index: int):
+    """Targeted read of a single QUESTION#<index> row."""
+    resp = _table().get_item(Key={'pk': f"GAME#{game_id}", 'sk': f"QUESTION#{index}"})
+    return resp.get('Item')
+
+def question_item(game_id: str, index: int, question: dict):
+    """Shape one bank question as a QUESTION#<index> row under the game partition."""
+    item = {
+        "pk": f"GAME#{game_id}",
+        "sk": f"QUESTION#{index}",
+        "entity": "QUESTION",
+        "gameId": game_id,
+        "index": index,
+    }
+    if isinstance(question, dict):
+        for field in ("type", "question", "options", "explanation"):
+            if question.get(field) is not None:
+                item[field] = question[field]
+        answer = question.get("answer", [])
+        # submit_answer expects a list of numeric indices
+        answer = answer if isinstance(answer, list) else [answer]
+        item["answer"] = [int(a) for a in answer if str(a).lstrip('-').isdigit()]
+    else:
+        item["question"] = str(question)
+    return item
+
+def put_questions(game_id: str, questions: list, max_attempts: int = 5):
+    """Write a bank's questions as QUESTION#<n> rows with BatchWriteItem.
+
+    Requests are chunked to the 25-item BatchWriteItem limit and any UnprocessedItems are
+    retried with exponential backoff. Returns the number of rows written; raises if some
+    rows are still unprocessed after `max_attempts`.
+    """
+    return batch_put([question_item(game_id, i, q) for i, q in enumerate(questions)], max_attempts)
+
+def batch_put(items: list, max_attempts: int = 5):
+    """Put `items` with chunked BatchWriteItem calls, retrying UnprocessedItems with backoff."""
+    requests = [{'PutRequest': {'Item': item}} for item in items]
+    for start in range(0, len(requests), 25):
+        pending = {QUIZ_TABLE: requests[start:start + 25]}
+        for attempt in range(max_attempts):
+            resp = aws_clients.resource('dynamodb', QUIZ_REGION).batch_write_item(RequestItems=pending)
+            pending = resp.get('UnprocessedItems') or {}
+            if not pending:
+                break
+            time.sleep(min(0.05 * (2 ** attempt), 1.0))
+        if pending:
+            raise RuntimeError(f"BatchWriteItem left {len(pending.get(QUIZ_TABLE, []))} items unprocessed")
+    return len(requests)
 
 def update_score(game_id: str, player_id: str, delta: int):
-    """Atomically increment player score."""
-    table.update_item(
+    """Atomically increment player score and keep the game's leaderboard current.
+
+    Returns the new score. The persisted top-K snapshot is only rewritten when this
+    change actually moves the top-K.
+    """
+    resp = _table().update_item(
         Key={'pk': f"GAME#{game_id}", 'sk': f"PLAYER#{player_id}"},
         UpdateExpression="ADD #s :inc",
         ExpressionAttributeNames={"#s": "score"},
-        ExpressionAttributeValues={":inc": delta}
+        ExpressionAttributeValues={":inc": delta},
+        ReturnValues="UPDATED_NEW"
     )
+    new_score = int(resp.get('Attributes', {}).get('score', 0))
+    board = _apply_score(game_id, player_id, new_score)
+    game_events.publish(game_id, 'score', {'playerId': player_id, 'score': new_score, 'rank': board.rank(player_id)})
+    return new_score
+
+def _board(game_id: str):
+    """The game's in-process board, seeded from PLAYER# rows the first time it's used."""
+    board = leaderboard.get_board(game_id)
+    if not board.loaded:
+        board.load(list_players(game_id, projection=['playerId', 'score']))
+        # the stored snapshot may predate changes this board was seeded with
+        leaderboard.save_snapshot(_table(), game_id, board)
+    return board
+
+def _apply_score(game_id: str, player_id: str, score: int):
+    board = _board(game_id)
+    if board.set_score(player_id, score):
+        leaderboard.save_snapshot(_table(), game_id, board)
+        game_events.publish(game_id, 'leaderboard', {'top': board.top()})
+    return board
+
+def apply_stream_record(record: dict) -> list:
+    """events_from_stream_record for the Quiz table poller, folding PLAYER# scores into the boards.
+
+    Scores written outside this process (the submit_answer Lambda, other workers) reach the
+    board and the persisted top-K this way, instead of the board re-reading the partition.
+    """
+    events = game_events.events_from_stream_record(record)
+    for game_id, event_type, data in events:
+        if event_type in ('player_joined', 'score') and data.get('playerId') and data.get('score') is not None:
+            try:
+                _apply_score(game_id, data['playerId'], int(data['score']))
+            except Exception as e:
+                print(f"leaderboard: applying stream score for {game_id} failed: {e}")
+    return events
+
+def get_leaderboard(game_id: str, k: int = leaderboard.LEADERBOARD_K):
+    """Top-K for the host screen from the persisted snapshot: one get_item, no partition query.
+
+    The snapshot only holds LEADERBOARD_K entries, so a larger `k` raises ValueError.
+    """
+    if k < 1 or k > leaderboard.LEADERBOARD_K:
+        raise ValueError(f"k must be between 1 and {leaderboard.LEADERBOARD_K}")
+    snap = leaderboard.read_snapshot(_table(), game_id)
+    return snap['top'][:k]
+
+def get_rank(game_id: str, player_id: str):
+    """1-based rank of a player from the in-process board.
+
+    Scores written elsewhere (the submit_answer Lambda, other workers) reach the board through
+    the Quiz table stream (GAME_EVENTS_STREAM_ARN, see apply_stream_record).
+    """
+    board = _board(game_id)
+    return {'playerId': player_id, 'rank': board.rank(player_id), 'score': board.score(player_id), 'players': len(board)}
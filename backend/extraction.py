@@ -0,0 +1,163 @@
+import codecs
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from response_cache import ResponseCache
+
+# What doc/docx and other formats without an extractor "extract" to; it isn't the file's text
+UNSUPPORTED_TEXT = "File content extracted successfully"
+# Per-file caps so one huge deck can't pin a worker or blow up memory
+EXTRACT_MAX_PAGES = int(os.getenv('EXTRACT_MAX_PAGES', 500))
+EXTRACT_MAX_BYTES = int(os.getenv('EXTRACT_MAX_BYTES', 5 * 1024 * 1024))
+# Pages per task handed to the process pool, and pool size
+EXTRACT_BATCH_PAGES = int(os.getenv('EXTRACT_BATCH_PAGES', 16))
+EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', os.cpu_count() or 2))
+
+# Extracted text keyed by the SHA-256 of the uploaded file, so re-uploads skip extraction
+extraction_cache = ResponseCache(
+    max_entries=int(os.getenv('EXTRACT_CACHE_SIZE', 64)),
+    ttl=float(os.getenv('EXTRACT_CACHE_TTL', 7 * 24 * 3600)),
+    disk_dir=os.getenv('EXTRACT_CACHE_DIR') or None,
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+        return _pool
+
+
+def file_sha256(file_path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _extract_page_range(file_path: str, start: int, stop: int) -> list:
+    # Runs in a worker process: PyPDF2 page objects can't be pickled, so each task reopens the file
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        reader = PyPDF2.PdfReader(f)
+        return [reader.pages[i].extract_text() or '' for i in range(start, stop)]
+
+
+def _pdf_page_count(file_path: str) -> int:
+    import PyPDF2
+    with open(file_path, 'rb') as f:
+        return len(PyPDF2.PdfReader(f).pages)
+
+
+def iter_pdf_text(file_path: str, max_pages: int = None, max_bytes: int = None):
+    """Yield a PDF's text page by page, in order, extracting batches of pages in a process pool.
+
+    Stops after `max_pages` pages or once `max_bytes` of text has been produced; batches
+    still in flight past the cap are cancelled.
+    """
+    max_pages = max_pages or EXTRACT_MAX_PAGES
+    max_bytes = max_bytes or EXTRACT_MAX_BYTES
+    pages = min(_pdf_page_count(file_path), max_pages)
+    ranges = [(start, min(start + EXTRACT_BATCH_PAGES, pages)) for start in range(0, pages, EXTRACT_BATCH_PAGES)]
+
+    if len(ranges) <= 1:
+        # small documents: the pool round trip costs more than it saves
+        batches = (_extract_page_range(file_path, start, stop) for start, stop in ranges)
+        futures = []
+    else:
+        pool = _get_pool()
+        futures = [pool.submit(_extract_page_range, file_path, start, stop) for start, stop in ranges]
+        batches = (future.result() for future in futures)
+
+    produced = 0
+    try:
+        for batch in batches:
+            for text in batch:
+                if not text:
+                    continue
+                encoded = len(text.encode('utf-8'))
+                if produced + encoded > max_bytes:
+                    yield text.encode('utf-8')[:max_bytes - produced].decode('utf-8', errors='ignore')
+                    return
+                produced += encoded
+                yield text
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def iter_file_text(file_path: str, max_bytes: int = None):
+    """Yield an uploaded file's text in chunks (PDF pages, or blocks of a text file)."""
+    max_bytes = max_bytes or EXTRACT_MAX_BYTES
+    if file_path.endswith('.txt'):
+        with open(file_path, 'r', encoding='utf-8', errors='replace') as f:
+            produced = 0
+            for block in iter(lambda: f.read(64 * 1024), ''):
+                block = block.encode('utf-8')[:max_bytes - produced].decode('utf-8', errors='ignore')
+                produced += len(block.encode('utf-8'))
+                yield block
+                if produced >= max_bytes:
+                    return
+    elif file_path.endswith('.pdf'):
+        yield from iter_pdf_text(file_path, max_bytes=max_bytes)
+    else:
+        # Add more file type handlers as needed
+        yield UNSUPPORTED_TEXT
+
+
+def iter_object_text(s3_client, bucket: str, key: str, max_bytes: int = None):
+    """Yield the text of an uploaded object stored in S3.
+
+    Text files are decoded straight off the response stream up to `max_bytes`. PDFs need
+    random access, so they are spooled to a temporary file that is removed afterwards.
+    """
+    max_bytes = max_bytes or EXTRACT_MAX_BYTES
+    body = s3_client.get_object(Bucket=bucket, Key=key)['Body']
+    try:
+        if key.endswith('.txt'):
+            decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+            produced = 0
+            for chunk in body.iter_chunks(64 * 1024):
+                chunk = chunk[:max_bytes - produced]
+                produced += len(chunk)
+                yield decoder.decode(chunk, final=produced >= max_bytes)
+                if produced >= max_bytes:
+                    return
+            yield decoder.decode(b'', final=True)
+        elif key.endswith('.pdf'):
+            fd, tmp_path = tempfile.mkstemp(suffix='.pdf')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in body.iter_chunks(1024 * 1024):
+                        f.write(chunk)
+                yield from iter_pdf_text(tmp_path, max_bytes=max_bytes)
+            finally:
+                os.remove(tmp_path)
+        else:
+            yield UNSUPPORTED_TEXT
+    finally:
+        body.close()
+
+
+def cached_text(digest: str, ext: str, produce) -> str:
+    """Text for content `digest` from the cache, or ''.join(produce()) stored under it."""
+    key = digest + ext.lower()
+    cached = extraction_cache.get(key)
+    if cached is not None:
+        return cached
+    text = ''.join(produce())
+    extraction_cache.set(key, text)
+    return text
+
+
+def extract_text(file_path: str) -> str:
+    """Full extracted text of an upload, served from the content-hash cache when possible."""
+    return cached_text(file_sha256(file_path), os.path.splitext(file_path)[1], lambda: iter_file_text(file_path))
@@ -0,0 +1,258 @@
+import itertools
+import json
+from decimal import Decimal
+import queue
+import threading
+import time
+
+HEARTBEAT_SECONDS = 15
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class Subscription:
+    """One connected client's view of a game: a bounded queue of events from the hub.
+
+    If the client falls so far behind that its queue fills up, the hub drops the backlog and
+    queues a single `resync` event instead, telling the client to re-read the full state.
+    """
+
+    def __init__(self, hub, game_id: str):
+        self.hub = hub
+        self.game_id = game_id
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+
+    def offer(self, event: dict):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            self.queue.put_nowait({'type': 'resync', 'gameId': self.game_id, 'seq': event.get('seq')})
+
+    def events(self, heartbeat: float = HEARTBEAT_SECONDS):
+        """Yield events as they arrive, or None every `heartbeat` seconds of silence."""
+        while True:
+            try:
+                yield self.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class GameHub:
+    """In-process pub/sub of game state deltas, keyed by game/session id.
+
+    Mutations (join, start, next question, score changes) call `publish`; every open
+    Subscription for that game receives the event with a per-game sequence number. A game's
+    counter only exists while it has subscribers, so finished games leave nothing behind;
+    every new connection starts from a snapshot, so restarting the sequence is harmless.
+    """
+
+    def __init__(self):
+        self._subs = {}
+        self._seq = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, game_id: str) -> Subscription:
+        sub = Subscription(self, game_id)
+        with self._lock:
+            self._subs.setdefault(game_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        with self._lock:
+            subs = self._subs.get(sub.game_id)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    del self._subs[sub.game_id]
+                    self._seq.pop(sub.game_id, None)
+
+    def publish(self, game_id: str, event_type: str, data: dict = None) -> dict:
+        with self._lock:
+            subs = list(self._subs.get(game_id, ()))
+            # nobody listening: no counter to create (and never prune)
+            seq = next(self._seq.setdefault(game_id, itertools.count(1))) if subs else None
+            event = {'type': event_type, 'gameId': game_id, 'seq': seq, 'ts': time.time(), 'data': data or {}}
+        for sub in subs:
+            sub.offer(event)
+        return event
+
+    def subscriber_count(self, game_id: str = None) -> int:
+        with self._lock:
+            if game_id is not None:
+                return len(self._subs.get(game_id, ()))
+            return sum(len(s) for s in self._subs.values())
+
+
+hub = GameHub()
+
+
+def publish(game_id: str, event_type: str, data: dict = None):
+    """Publish on the process-wide hub; never lets a notification failure break a mutation."""
+    try:
+        return hub.publish(game_id, event_type, data)
+    except Exception as e:
+        print(f"game_events: publish failed for {game_id}: {e}")
+
+
+def _json_default(value):
+    # DynamoDB resource reads come back as Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+
+def sse_format(event: dict) -> str:
+    if event is None:
+        return ": keep-alive\n\n"
+    return f"id: {event.get('seq', '')}\nevent: {event['type']}\ndata: {json.dumps(event, default=_json_default)}\n\n"
+
+
+# ---- change-stream adapter ----
+
+def _plain(attr: dict):
+    # minimal DynamoDB-JSON -> python for the attribute types we publish
+    if not attr:
+        return None
+    if 'S' in attr:
+        return attr['S']
+    if 'N' in attr:
+        n = attr['N']
+        return int(n) if n.lstrip('-').isdigit() else float(n)
+    if 'BOOL' in attr:
+        return attr['BOOL']
+    return None
+
+
+def events_from_stream_record(record: dict) -> list:
+    """Translate one DynamoDB Streams record on the Quiz table into (game_id, type, data) tuples.
+
+    Covers mutations made outside this process (AppSync resolvers, the submit_answer Lambda,
+    the Step Function): new PLAYER# rows, PLAYER# score changes and GAME item status/currentQ.
+    """
+    ddb = record.get('dynamodb', {})
+    new = ddb.get('NewImage') or {}
+    old = ddb.get('OldImage') or {}
+    pk = _plain(ddb.get('Keys', {}).get('pk')) or ''
+    sk = _plain(ddb.get('Keys', {}).get('sk')) or ''
+    if not pk.startswith('GAME#'):
+        return []
+    game_id = pk[len('GAME#'):]
+    name = record.get('eventName')
+    out = []
+    if sk.startswith('PLAYER#'):
+        player = {'playerId': _plain(new.get('playerId')), 'name': _plain(new.get('name')), 'score': _plain(new.get('score'))}
+        if name == 'INSERT':
+            out.append((game_id, 'player_joined', player))
+        elif name == 'MODIFY' and _plain(new.get('score')) != _plain(old.get('score')):
+            out.append((game_id, 'score', player))
+    elif sk == pk and name in ('INSERT', 'MODIFY'):
+        if _plain(new.get('status')) != _plain(old.get('status')):
+            out.append((game_id, 'status', {'status': _plain(new.get('status'))}))
+        if _plain(new.get('currentQ')) != _plain(old.get('currentQ')):
+            out.append((game_id, 'question', {'currentQ': _plain(new.get('currentQ'))}))
+    return out
+
+
+def events_from_sessions_record(record: dict) -> list:
+    """Translate one DynamoDB Streams record on QuizSessions into (session_id, type, data) tuples.
+
+    In Step Functions mode the state machine advances questions on the session item, not on
+    the Quiz table, so this is the stream that carries "next question" for those games.
+    """
+    ddb = record.get('dynamodb', {})
+    new = ddb.get('NewImage') or {}
+    old = ddb.get('OldImage') or {}
+    session_id = _plain(ddb.get('Keys', {}).get('sessionID'))
+    if not session_id or record.get('eventName') not in ('INSERT', 'MODIFY'):
+        return []
+    out = []
+    if _plain(new.get('status')) != _plain(old.get('status')):
+        out.append((session_id, 'status', {'status': _plain(new.get('status'))}))
+    for field in ('currentQuestion', 'currentQ'):
+        if _plain(new.get(field)) != _plain(old.get(field)):
+            out.append((session_id, 'question', {'currentQ': _plain(new.get(field)), 'status': _plain(new.get('status'))}))
+            break
+    return out
+
+
+def publish_stream_records(records: list, translate=events_from_stream_record) -> int:
+    """Feed a batch of stream records (e.g. a Lambda stream event's Records) into the hub."""
+    count = 0
+    for record in records:
+        for game_id, event_type, data in translate(record):
+            publish(game_id, event_type, data)
+            count += 1
+    return count
+
+
+class StreamPoller(threading.Thread):
+    """Background reader of a DynamoDB stream that publishes its changes to the hub.
+
+    Shards open at startup are read from LATEST (older changes are covered by each client's
+    snapshot); shards that appear later (rollovers, splits) are read from TRIM_HORIZON so the
+    records written before the next refresh aren't lost. Run one per process that serves SSE clients.
+    `translate` turns a record into events: events_from_stream_record for the Quiz table,
+    events_from_sessions_record for QuizSessions.
+    """
+
+    def __init__(self, stream_arn: str, region_name: str = 'us-east-2', interval: float = 1.0,
+                 translate=events_from_stream_record):
+        super().__init__(name='game-stream-poller', daemon=True)
+        import aws_clients
+        self.client = aws_clients.client('dynamodbstreams', region_name)
+        self.stream_arn = stream_arn
+        self.translate = translate
+        self.interval = interval
+        self.iterators = {}
+        self.finished = set()
+        self.started = False
+        self.stopped = threading.Event()
+
+    def _refresh_shards(self):
+        desc = self.client.describe_stream(StreamArn=self.stream_arn)['StreamDescription']
+        shards = desc.get('Shards', [])
+        # shards age out of the stream after 24h; forget them here too
+        self.finished &= {shard['ShardId'] for shard in shards}
+        for shard in shards:
+            sid = shard['ShardId']
+            if sid in self.iterators or sid in self.finished:
+                continue
+            closed = 'EndingSequenceNumber' in shard.get('SequenceNumberRange', {})
+            if not self.started and closed:
+                # history from before we started
+                self.finished.add(sid)
+                continue
+            self.iterators[sid] = self.client.get_shard_iterator(
+                StreamArn=self.stream_arn, ShardId=sid,
+                ShardIteratorType='TRIM_HORIZON' if self.started else 'LATEST')['ShardIterator']
+        self.started = True
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self._refresh_shards()
+                for sid, it in list(self.iterators.items()):
+                    resp = self.client.get_records(ShardIterator=it, Limit=1000)
+                    publish_stream_records(resp.get('Records', []), self.translate)
+                    if resp.get('NextShardIterator'):
+                        self.iterators[sid] = resp['NextShardIterator']
+                    else:
+                        # shard closed and fully read
+                        del self.iterators[sid]
+                        self.finished.add(sid)
+            except Exception as e:
+                print(f"game_events: stream poll failed: {e}")
+            self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,44 @@
+"""Gunicorn settings for the backend: `gunicorn -c gunicorn.conf.py app:app` from backend/.
+
+The master imports the heavy libraries once before forking (warmup.prefork); every worker
+then builds its AWS clients, prefetches JWKS and opens pooled connections before it takes
+traffic (warmup.postfork). Point the load balancer's health check at /api/ready.
+
+Some state lives in each worker process, so more than one worker needs a shared backend:
+- the game event hub (game_events) only reaches SSE clients of the worker that published,
+  so set GAME_EVENTS_STREAM_ARN / SESSION_EVENTS_STREAM_ARN and every worker tails the streams;
+- JOB_QUEUE_BACKEND=memory keeps jobs in one worker; use sqlite, whose file they all share;
+- QUESTION_SCHEDULER=local owns its state file and timers, so it forces a single worker.
+"""
+import os
+
+import settings
+
+settings.load_env()
+
+import warmup
+
+bind = f"0.0.0.0:{os.getenv('FLASK_PORT', 6767)}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+if os.getenv('QUESTION_SCHEDULER', 'stepfunctions').lower() == 'local' and workers != 1:
+    print(f"gunicorn.conf: QUESTION_SCHEDULER=local runs in exactly one process; using 1 worker, not {workers}")
+    workers = 1
+# workers inherit this; admission.py splits the Bedrock rate limits between them
+os.environ['WEB_CONCURRENCY'] = str(workers)
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 120))
+# Background threads (job workers, scheduler, stream pollers) start in post_worker_init, after
+# the fork, so preloading the app in the master is safe
+preload_app = os.getenv('GUNICORN_PRELOAD', 'false').lower() in ('1', 'true', 'yes')
+
+
+def on_starting(server):
+    warmup.prefork()
+
+
+def post_worker_init(worker):
+    # Drop the clients inherited from the master before any background thread can pick them up
+    warmup.postfork()
+    import app
+    app.start_background()
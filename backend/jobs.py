@@ -0,0 +1,354 @@
+"""Background generation jobs: POST a job, then poll or stream its status instead of holding
+the HTTP request open for the whole model call.
+
+A JobRunner runs a fixed number of worker threads (JOB_WORKERS) that claim jobs from a
+JobStore and call the handler registered for the job's kind. Stores:
+
+- SQLiteJobStore (default): a WAL SQLite file (JOB_STATE_PATH) that every worker process on the host
+  shares. Claims are atomic, so any process may run any job and any process can answer a
+  poll. A running job holds a lease that its runner renews; when a worker dies its lease
+  lapses and the job is claimed again (up to JOB_MAX_ATTEMPTS times), so queued and
+  interrupted jobs survive restarts.
+- MemoryJobStore: in-process; jobs are lost when the process exits, and a job can only be
+  read from the worker process that accepted it, so it is only for single-process servers.
+
+Once JOB_MAX_QUEUED jobs are waiting, submit() raises QueueFull and the API answers 429
+rather than letting requests pile up behind the model.
+"""
+import collections
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+import game_events
+
+JOB_QUEUE_BACKEND = os.getenv('JOB_QUEUE_BACKEND', 'sqlite').lower()
+JOB_STATE_PATH = os.getenv('JOB_STATE_PATH', 'jobs_state.db')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 4))
+JOB_MAX_QUEUED = int(os.getenv('JOB_MAX_QUEUED', 100))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 2))
+# Seconds a claimed job stays owned without a renewal before another worker may take it over
+JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', 60))
+# How long finished jobs (and their results) stay readable
+JOB_RESULT_TTL = float(os.getenv('JOB_RESULT_TTL', 3600))
+# Idle workers re-check the store this often, so jobs submitted by other processes get picked up
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', 1))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+FINISHED = (SUCCEEDED, FAILED)
+
+# Status changes are published here (keyed by job id) so SSE streams in this process wake at once
+hub = game_events.GameHub()
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _notify(job_id: str, status: str):
+    # only jobs someone is streaming (the hub drops a job's counter with its last subscriber)
+    if hub.subscriber_count(job_id):
+        hub.publish(job_id, 'status', {'status': status})
+
+
+def _new_job(kind: str, params: dict, owner=None) -> dict:
+    return {'id': uuid.uuid4().hex, 'kind': kind, 'params': params, 'owner': owner, 'status': QUEUED,
+            'result': None, 'error': None, 'attempts': 0, 'created': time.time(), 'started': None,
+            'finished': None, 'updated': time.time()}
+
+
+def public_view(job: dict) -> dict:
+    """What the API returns for a job (the params stay server-side)."""
+    view = {k: job[k] for k in ('id', 'kind', 'status', 'attempts', 'created', 'started', 'finished', 'updated')}
+    if job['status'] == SUCCEEDED:
+        view['result'] = job['result']
+    if job['error']:
+        view['error'] = job['error']
+    return view
+
+
+class MemoryJobStore:
+    """In-process queue; jobs are lost on restart."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+
+    def submit(self, job: dict, max_queued: int):
+        with self._lock:
+            self._prune()
+            if len(self._queue) >= max_queued:
+                raise QueueFull()
+            self._jobs[job['id']] = job
+            self._queue.append(job['id'])
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def claim(self, worker: str, lease: float):
+        with self._lock:
+            if not self._queue:
+                return None
+            job = self._jobs[self._queue.popleft()]
+            job.update(status=RUNNING, started=time.time(), updated=time.time(), attempts=job['attempts'] + 1)
+            return dict(job)
+
+    def renew(self, job_ids: list, worker: str, lease: float):
+        pass
+
+    def finish(self, job_id: str, status: str, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job:
+                job.update(status=status, result=result, error=error, finished=time.time(), updated=time.time())
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job['status']] = counts.get(job['status'], 0) + 1
+            return counts
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RESULT_TTL
+        for job_id in [j['id'] for j in self._jobs.values() if j['status'] in FINISHED and j['finished'] < cutoff]:
+            del self._jobs[job_id]
+
+
+class SQLiteJobStore:
+    """Jobs in a SQLite file shared by every worker process on the host; survives restarts."""
+
+    _COLUMNS = 'id, kind, params, owner, status, result, error, attempts, created, started, finished, updated'
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        # several processes write this file; wait on their locks instead of failing with "database is locked"
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT, params TEXT, owner TEXT, status TEXT, result TEXT, error TEXT,"
+            " attempts INTEGER, created REAL, started REAL, finished REAL, updated REAL,"
+            " worker TEXT, lease_until REAL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)")
+
+    def _row(self, row) -> dict:
+        job = dict(zip([c.strip() for c in self._COLUMNS.split(',')], row))
+        job['params'] = json.loads(job['params'])
+        job['result'] = json.loads(job['result']) if job['result'] is not None else None
+        return job
+
+    def submit(self, job: dict, max_queued: int):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM jobs WHERE status IN (?, ?) AND finished < ?",
+                                   (SUCCEEDED, FAILED, time.time() - JOB_RESULT_TTL))
+                queued = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+                if queued >= max_queued:
+                    raise QueueFull()
+                self._conn.execute(
+                    f"INSERT INTO jobs ({self._COLUMNS}) VALUES (?, ?, ?, ?, ?, NULL, NULL, 0, ?, NULL, NULL, ?)",
+                    (job['id'], job['kind'], json.dumps(job['params']), job['owner'], QUEUED, job['created'], job['updated']))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row(row) if row else None
+
+    def claim(self, worker: str, lease: float):
+        """Take the oldest queued job, or a running one whose owner stopped renewing its lease."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # out of attempts: a job that keeps killing its worker shouldn't loop forever
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, error = 'worker stopped while running the job', finished = ?, updated = ?"
+                    " WHERE status = ? AND lease_until < ? AND attempts >= ?",
+                    (FAILED, now, now, RUNNING, now, JOB_MAX_ATTEMPTS))
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = ? OR (status = ? AND lease_until < ?)"
+                    " ORDER BY created LIMIT 1", (QUEUED, RUNNING, now)).fetchone()
+                if row is None:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "UPDATE jobs SET status = ?, started = ?, updated = ?, attempts = attempts + 1, worker = ?,"
+                    " lease_until = ? WHERE id = ?", (RUNNING, now, now, worker, now + lease, row[0]))
+                job = self._conn.execute(f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", (row[0],)).fetchone()
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return self._row(job)
+
+    def renew(self, job_ids: list, worker: str, lease: float):
+        if not job_ids:
+            return
+        with self._lock:
+            self._conn.executemany("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+                                   [(time.time() + lease, job_id, worker, RUNNING) for job_id in job_ids])
+
+    def finish(self, job_id: str, status: str, result=None, error=None):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished = ?, updated = ?, lease_until = NULL"
+                " WHERE id = ?", (status, json.dumps(result, default=str) if result is not None else None, error, now, now, job_id))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+class JobRunner:
+    """Bounded pool of worker threads running jobs from a store.
+
+    `handlers` maps a job kind to `fn(params) -> result`; the result must be JSON-serializable.
+    A handler signals failure by raising; the message becomes the job's `error`.
+    """
+
+    def __init__(self, store, handlers: dict, workers: int = JOB_WORKERS, max_queued: int = JOB_MAX_QUEUED,
+                 lease: float = JOB_LEASE_SECONDS):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.max_queued = max_queued
+        self.lease = lease
+        self.name = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._running = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._stopped = threading.Event()
+        self._threads = []
+
+    @classmethod
+    def from_env(cls, handlers: dict):
+        if JOB_QUEUE_BACKEND == 'sqlite':
+            store = SQLiteJobStore(JOB_STATE_PATH)
+        elif JOB_QUEUE_BACKEND == 'memory':
+            store = MemoryJobStore()
+        else:
+            raise ValueError(f"Unknown JOB_QUEUE_BACKEND {JOB_QUEUE_BACKEND!r} (use 'memory' or 'sqlite')")
+        return cls(store, handlers)
+
+    def start(self):
+        if not self._threads:
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._renew_leases, name='job-leases', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        with self._wake:
+            self._wake.notify_all()
+
+    def submit(self, kind: str, params: dict, owner=None) -> dict:
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job type {kind!r}; expected one of {sorted(self.handlers)}")
+        job = _new_job(kind, params, owner)
+        self.store.submit(job, self.max_queued)
+        with self._wake:
+            self._wake.notify()
+        return job
+
+    def get(self, job_id: str):
+        return self.store.get(job_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            running_here = len(self._running)
+        return {'backend': type(self.store).__name__, 'workers': self.workers, 'maxQueued': self.max_queued,
+                'runningHere': running_here, 'jobs': self.store.stats()}
+
+    def _work(self):
+        while not self._stopped.is_set():
+            try:
+                job = self.store.claim(self.name, self.lease)
+            except Exception as e:
+                print(f"jobs: claim failed: {e}")
+                job = None
+            if job is None:
+                with self._wake:
+                    self._wake.wait(JOB_POLL_SECONDS)
+                continue
+            self._run(job)
+
+    def _run(self, job: dict):
+        with self._lock:
+            self._running.add(job['id'])
+        _notify(job['id'], RUNNING)
+        start = time.perf_counter()
+        try:
+            result = self.handlers[job['kind']](job['params'])
+            status, error = SUCCEEDED, None
+        except Exception as e:
+            result, status, error = None, FAILED, str(e)
+        try:
+            self.store.finish(job['id'], status, result=result, error=error)
+        finally:
+            with self._lock:
+                self._running.discard(job['id'])
+        print(f"jobs: {job['kind']} {job['id']} {status} in {time.perf_counter() - start:.1f}s"
+              + (f": {error}" if error else ''))
+        _notify(job['id'], status)
+
+    def _renew_leases(self):
+        while not self._stopped.wait(self.lease / 3):
+            with self._lock:
+                running = list(self._running)
+            try:
+                self.store.renew(running, self.name, self.lease)
+            except Exception as e:
+                print(f"jobs: lease renewal failed: {e}")
+
+
+def stream(runner: JobRunner, job_id: str, heartbeat: float = game_events.HEARTBEAT_SECONDS):
+    """SSE events for one job: its current state, then every change until it finishes.
+
+    Changes made in this process arrive through `hub` immediately; the store is also re-read
+    every JOB_POLL_SECONDS so jobs run by another worker process (SQLite backend) are seen too.
+    """
+    sub = hub.subscribe(job_id)
+    with sub:
+        seq = 0
+        last = None
+        quiet = 0.0
+        while True:
+            job = runner.get(job_id)
+            if job is None:
+                yield game_events.sse_format({'type': 'error', 'seq': seq, 'data': {'error': 'job not found'}})
+                return
+            if (job['status'], job['updated']) != last:
+                last = (job['status'], job['updated'])
+                seq += 1
+                quiet = 0.0
+                yield game_events.sse_format({'type': 'job', 'jobId': job_id, 'seq': seq, 'data': public_view(job)})
+                if job['status'] in FINISHED:
+                    return
+            elif quiet >= heartbeat:
+                quiet = 0.0
+                yield game_events.sse_format(None)
+            try:
+                sub.queue.get(timeout=JOB_POLL_SECONDS)
+            except queue.Empty:
+                quiet += JOB_POLL_SECONDS
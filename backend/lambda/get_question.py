@@ -0,0 +1,61 @@
+import collections, os, json, boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+# Created once per container and reused by warm invocations; adaptive retries ride out throttling
+S3 = boto3.client("s3", config=Config(connect_timeout=3, read_timeout=10, tcp_keepalive=True,
+                                      retries={"mode": "adaptive", "max_attempts": 5}))
+
+# (bucket, key, versionId) -> (etag, questions), least recently used first. A versioned
+# object never changes, so a hit is served as is; an unversioned key can be re-saved via
+# /api/save, so its hit is revalidated with a conditional GET on the stored ETag.
+BANK_CACHE_SIZE = int(os.getenv("BANK_CACHE_SIZE", 16))
+_BANKS = collections.OrderedDict()
+
+
+def handler(event, context):
+    # Step Functions task: {"gameId", "qIndex", "questionRef": {"bucket", "key", "versionId", "numQuestions"}}
+    ref = event["questionRef"]
+    q_index = int(event.get("qIndex", 0))
+
+    questions = _load_questions(ref)
+    if q_index >= len(questions):
+        return {"gameId": event.get("gameId"), "qIndex": q_index, "done": True, "numQuestions": len(questions)}
+
+    return {
+        "gameId": event.get("gameId"),
+        "qIndex": q_index,
+        "question": questions[q_index],
+        "done": False,
+        "numQuestions": len(questions)
+    }
+
+
+def _load_questions(ref):
+    bucket = ref.get("bucket") or os.getenv("QUESTIONBANK_BUCKET", "questionbankaristotle")
+    version = ref.get("versionId")
+    cache_key = (bucket, ref["key"], version)
+    cached = _BANKS.get(cache_key)
+    if cached is not None and version:
+        _BANKS.move_to_end(cache_key)
+        return cached[1]
+
+    args = {"Bucket": bucket, "Key": ref["key"]}
+    if version:
+        args["VersionId"] = version
+    elif cached is not None:
+        args["IfNoneMatch"] = cached[0]
+    try:
+        response = S3.get_object(**args)
+    except ClientError as e:
+        if cached is not None and e.response.get("Error", {}).get("Code") in ("304", "NotModified"):
+            _BANKS.move_to_end(cache_key)
+            return cached[1]
+        raise
+    body = json.loads(response["Body"].read().decode("utf-8"))
+    questions = body.get("questions", []) if isinstance(body, dict) else body
+    _BANKS[cache_key] = (response.get("ETag"), questions)
+    _BANKS.move_to_end(cache_key)
+    while len(_BANKS) > BANK_CACHE_SIZE:
+        _BANKS.popitem(last=False)
+    return questions
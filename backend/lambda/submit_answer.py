@@ -1,7 +1,15 @@
 import os, json, datetime, boto3
+from botocore.config import Config
 
-DDB = boto3.client("dynamodb")
-TABLE = "QUIZ"
+# Created once per container and reused by warm invocations; adaptive retries ride out throttling
+DDB = boto3.client("dynamodb", config=Config(connect_timeout=3, read_timeout=5, tcp_keepalive=True,
+                                             retries={"mode": "adaptive", "max_attempts": 5}))
+TABLE = os.getenv("TABLE_NAME", "QUIZ")
+
+# (gameId, qIndex) -> correct answer indices. Lives at module level so it survives across
+# warm invocations; the answer key of a question never changes during a game.
+_ANSWER_KEYS = {}
+_ANSWER_KEYS_MAX = 10000
 
 def handler(event, context):
     # AppSync resolver event
@@ -15,32 +23,47 @@ def handler(event, context):
     # normalize to list[int]
     selected = [int(x) for x in selected]
 
-    # 1) read question to get the correct answer
-    q_key = {"pk": {"S": f"GAME#{game_id}"}, "sk": {"S": f"QUESTION#{q_index}"}}
-    q_resp = DDB.get_item(TableName=TABLE, Key=q_key)
-    q_item = q_resp.get("Item", {})
-    if not q_item:
+    # 1) correct answer, from the warm cache or the QUESTION row
+    correct = _answer_key(game_id, q_index)
+    if correct is None:
         return _err(400, "Question not found")
 
-    # stored answer: a list of numeric indices
-    correct_attr = q_item.get("answer")
-    correct = []
-    if correct_attr and "L" in correct_attr:
-        for v in correct_attr["L"]:
-            correct.append(int(v.get("N")))
-
     is_correct = (selected == correct)
 
-    # 2) write ANSWER row conditionally + optionally update score atomically
-    now_iso = datetime.datetime.utcnow().isoformat() + "Z"
-    answer_sk = f"ANSWER#{q_index}#{username}"
+    # 2) record the answer on the player row and bump the score in one update. The
+    #    `answered` number set guards against double submission, and ALL_NEW hands the
+    #    new score back so no read-back is needed.
+    player_key = {"pk": {"S": f"GAME#{game_id}"}, "sk": {"S": f"PLAYER#{username}"}}
+    try:
+        resp = DDB.update_item(
+            TableName=TABLE,
+            Key=player_key,
+            UpdateExpression="ADD #s :inc, #a :q",
+            ConditionExpression="attribute_not_exists(#a) OR NOT contains(#a, :qi)",
+            ExpressionAttributeNames={"#s": "score", "#a": "answered"},
+            ExpressionAttributeValues={
+                ":inc": {"N": "10" if is_correct else "0"},
+                ":q": {"NS": [str(q_index)]},
+                ":qi": {"N": str(q_index)}
+            },
+            ReturnValues="ALL_NEW",
+            ReturnValuesOnConditionCheckFailure="ALL_OLD"
+        )
+        new_score = int(resp.get("Attributes", {}).get("score", {}).get("N", 0))
+    except DDB.exceptions.ConditionalCheckFailedException as e:
+        # duplicate answer: keep the first one and report the score as it stands
+        old = e.response.get("Item", {})
+        new_score = int(old.get("score", {}).get("N", 0))
+        return _result(game_id, username, q_index, is_correct, new_score)
 
-    tx_items = [{
-        "Put": {
-            "TableName": TABLE,
-            "Item": {
+    # 3) ANSWER row for history/auditing; the player-row guard above already deduplicated
+    now_iso = datetime.datetime.utcnow().isoformat() + "Z"
+    try:
+        DDB.put_item(
+            TableName=TABLE,
+            Item={
                 "pk": {"S": f"GAME#{game_id}"},
-                "sk": {"S": answer_sk},
+                "sk": {"S": f"ANSWER#{q_index}#{username}"},
                 "entity": {"S": "ANSWER"},
                 "gameId": {"S": game_id},
                 "qIndex": {"N": str(q_index)},
@@ -49,39 +72,38 @@ def handler(event, context):
                 "isCorrect": {"BOOL": is_correct},
                 "submittedAt": {"S": now_iso}
             },
-            "ConditionExpression": "attribute_not_exists(pk)"
-        }
-    }]
+            ConditionExpression="attribute_not_exists(pk)"
+        )
+    except DDB.exceptions.ConditionalCheckFailedException:
+        pass
 
-    if is_correct:
-        tx_items.append({
-            "Update": {
-                "TableName": TABLE,
-                "Key": {
-                    "pk": {"S": f"GAME#{game_id}"},
-                    "sk": {"S": f"PLAYER#{username}"}
-                },
-                "UpdateExpression": "ADD #s :inc",
-                "ExpressionAttributeNames": {"#s": "score"},
-                "ExpressionAttributeValues": {":inc": {"N": "10"}}
-            }
-        })
+    return _result(game_id, username, q_index, is_correct, new_score)
 
-    try:
-        DDB.transact_write_items(TransactItems=tx_items)
-    except DDB.exceptions.TransactionCanceledException as e:
-        # likely duplicate answer
-        pass
+def _answer_key(game_id, q_index):
+    cache_key = (game_id, q_index)
+    if cache_key in _ANSWER_KEYS:
+        return _ANSWER_KEYS[cache_key]
+
+    q_key = {"pk": {"S": f"GAME#{game_id}"}, "sk": {"S": f"QUESTION#{q_index}"}}
+    q_resp = DDB.get_item(TableName=TABLE, Key=q_key, ProjectionExpression="answer")
+    q_item = q_resp.get("Item")
+    if not q_item:
+        # not cached: the question may simply not be written yet
+        return None
+
+    # stored answer: a list of numeric indices
+    correct_attr = q_item.get("answer")
+    correct = []
+    if correct_attr and "L" in correct_attr:
+        for v in correct_attr["L"]:
+            correct.append(int(v.get("N")))
 
-    # 3) read back new score
-    p_resp = DDB.get_item(
-        TableName=TABLE,
-        Key={"pk": {"S": f"GAME#{game_id}"}, "sk": {"S": f"PLAYER#{username}"}}
-    )
-    new_score = 0
-    if "Item" in p_resp and "score" in p_resp["Item"]:
-        new_score = int(p_resp["Item"]["score"]["N"])
+    if len(_ANSWER_KEYS) >= _ANSWER_KEYS_MAX:
+        _ANSWER_KEYS.clear()
+    _ANSWER_KEYS[cache_key] = correct
+    return correct
 
+def _result(game_id, username, q_index, is_correct, new_score):
     return {
         "gameId": game_id,
         "playerId": username,
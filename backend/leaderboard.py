@@ -0,0 +1,152 @@
+import bisect
+import datetime
+import os
+import threading
+import time
+
+import aws_clients
+
+# Entries kept in the persisted snapshot; reads can't ask for more than this
+LEADERBOARD_K = 10
+# Boards not used for this long are dropped (covers games whose end this process never sees)
+LEADERBOARD_IDLE_SECONDS = float(os.getenv('LEADERBOARD_IDLE_SECONDS', 3600))
+
+
+class Leaderboard:
+    """Sorted scores for one game, kept up to date by score deltas.
+
+    `_order` is a sorted list of (-score, player_id) so the leader is at index 0; `_scores`
+    maps player_id -> score. Applying a delta is a bisect remove + insert, `top(k)` is a
+    slice of the first k entries and `rank` is a bisect, so no read ever re-sorts the game.
+    A board is seeded from the PLAYER# rows once; after that only score changes are applied
+    (this process's update_score, and the Quiz table stream for everyone else's writes).
+    """
+
+    def __init__(self, k: int = LEADERBOARD_K):
+        self.k = k
+        self._order = []
+        self._scores = {}
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.used_at = time.monotonic()
+        self.snapshot_version = None  # version of the last snapshot this process wrote or read
+
+    def load(self, players: list):
+        """Seed from PLAYER# rows (dicts with playerId/score), e.g. dynamodb_helper.list_players."""
+        with self._lock:
+            self._scores = {p['playerId']: int(p.get('score', 0)) for p in players if p.get('playerId')}
+            self._order = sorted((-s, pid) for pid, s in self._scores.items())
+            self.loaded = True
+
+    def set_score(self, player_id: str, score: int) -> bool:
+        """Set a player's absolute score. Returns True if the top-k changed."""
+        score = int(score)
+        with self._lock:
+            old = self._scores.get(player_id)
+            if old == score:
+                return False
+            before = self._order[:self.k]
+            if old is not None:
+                del self._order[bisect.bisect_left(self._order, (-old, player_id))]
+            bisect.insort(self._order, (-score, player_id))
+            self._scores[player_id] = score
+            return self._order[:self.k] != before
+
+    def apply_delta(self, player_id: str, delta: int) -> bool:
+        return self.set_score(player_id, self._scores.get(player_id, 0) + int(delta))
+
+    def score(self, player_id: str):
+        return self._scores.get(player_id)
+
+    def rank(self, player_id: str):
+        """1-based rank (ties share the best rank), or None for unknown players."""
+        score = self._scores.get(player_id)
+        if score is None:
+            return None
+        with self._lock:
+            return bisect.bisect_left(self._order, (-score, '')) + 1
+
+    def top(self, k: int = None) -> list:
+        with self._lock:
+            return [{'playerId': pid, 'score': -neg} for neg, pid in self._order[:k or self.k]]
+
+    def __len__(self):
+        return len(self._scores)
+
+
+_boards = {}
+_boards_lock = threading.Lock()
+_last_prune = time.monotonic()
+
+
+def get_board(game_id: str) -> Leaderboard:
+    global _last_prune
+    now = time.monotonic()
+    with _boards_lock:
+        if now - _last_prune > 60:
+            _last_prune = now
+            for idle in [g for g, b in _boards.items() if now - b.used_at > LEADERBOARD_IDLE_SECONDS]:
+                del _boards[idle]
+        board = _boards.get(game_id)
+        if board is None:
+            board = _boards[game_id] = Leaderboard()
+        board.used_at = now
+        return board
+
+
+def drop_board(game_id: str):
+    with _boards_lock:
+        _boards.pop(game_id, None)
+
+
+def snapshot_key(game_id: str) -> dict:
+    return {'pk': f"GAME#{game_id}", 'sk': 'LEADERBOARD'}
+
+
+def read_snapshot(table, game_id: str) -> dict:
+    """Single get_item of the persisted top-K: {'top': [...], 'version': n} (empty if none yet)."""
+    item = table.get_item(Key=snapshot_key(game_id)).get('Item') or {}
+    return {
+        'top': [{'playerId': e['playerId'], 'score': int(e['score'])} for e in item.get('top', [])],
+        'version': int(item.get('version', 0)),
+        'updatedAt': item.get('updatedAt'),
+    }
+
+
+def save_snapshot(table, game_id: str, board: Leaderboard, max_attempts: int = 3) -> bool:
+    """Persist the board's top-K for the host screen with an optimistic version check.
+
+    Every backend process keeps its board from the same PLAYER# rows, so several may save
+    the same change: on a version conflict the stored top-K is re-read and the write skipped
+    if it already matches, otherwise retried over it.
+    """
+    if board.snapshot_version is None:
+        snap = read_snapshot(table, game_id)
+    else:
+        # optimistic: assume nobody else wrote since our last save and skip the read
+        snap = {'top': None, 'version': board.snapshot_version}
+    for _ in range(max_attempts):
+        if snap['top'] == board.top():
+            board.snapshot_version = snap['version']
+            return True
+        item = dict(snapshot_key(game_id))
+        item.update({
+            'entity': 'LEADERBOARD',
+            'top': board.top(),
+            'version': snap['version'] + 1,
+            'updatedAt': datetime.datetime.utcnow().isoformat() + "Z",
+        })
+        try:
+            table.put_item(
+                Item=item,
+                ConditionExpression='attribute_not_exists(#v) OR #v = :v',
+                ExpressionAttributeNames={'#v': 'version'},
+                ExpressionAttributeValues={':v': snap['version']}
+            )
+            board.snapshot_version = snap['version'] + 1
+            return True
+        except Exception as e:
+            if aws_clients.error_code(e) != 'ConditionalCheckFailedException':
+                raise
+            snap = read_snapshot(table, game_id)
+    return False
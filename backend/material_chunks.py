@@ -0,0 +1,93 @@
+import re
+
+# Rough tokens-per-character for English prose; close enough to budget prompts without a tokenizer
+CHARS_PER_TOKEN = 4
+
+_PARAGRAPH = re.compile(r'\n\s*\n')
+_SENTENCE = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _pieces(text: str, max_tokens: int):
+    # paragraphs, falling back to sentences and finally hard cuts for anything still too long
+    for paragraph in _PARAGRAPH.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if estimate_tokens(paragraph) <= max_tokens:
+            yield paragraph
+            continue
+        for sentence in _SENTENCE.split(paragraph):
+            limit = max_tokens * CHARS_PER_TOKEN
+            for start in range(0, len(sentence), limit):
+                yield sentence[start:start + limit]
+
+
+def split_chunks(text: str, max_tokens: int, overlap_tokens: int = 0) -> list:
+    """Split material into chunks of at most `max_tokens` estimated tokens.
+
+    Chunks are built from whole paragraphs (or sentences, for very long paragraphs) so a
+    question's context isn't cut mid-thought. With `overlap_tokens`, each chunk starts with
+    the tail of the previous one.
+    """
+    chunks = []
+    current = []
+    size = 0
+    for piece in _pieces(text, max_tokens):
+        tokens = estimate_tokens(piece)
+        if current and size + tokens > max_tokens:
+            chunks.append('\n\n'.join(current))
+            tail = chunks[-1][-overlap_tokens * CHARS_PER_TOKEN:] if overlap_tokens else ''
+            current, size = ([tail], estimate_tokens(tail)) if tail else ([], 0)
+        current.append(piece)
+        size += tokens
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
+
+
+def allocate(total: int, weights: list) -> list:
+    """Split `total` questions across chunks in proportion to `weights` (largest remainder).
+
+    When there are more chunks than questions, the questions go to chunks spread evenly
+    through the material rather than all to the first ones.
+    """
+    n = len(weights)
+    if n == 0 or total <= 0:
+        return [0] * n
+    if total < n:
+        counts = [0] * n
+        for i in range(total):
+            counts[(2 * i + 1) * n // (2 * total)] += 1
+        return counts
+    weights = weights if sum(weights) > 0 else [1] * n
+    whole = sum(weights)
+    exact = [total * w / whole for w in weights]
+    counts = [int(x) for x in exact]
+    by_remainder = sorted(range(n), key=lambda i: exact[i] - counts[i], reverse=True)
+    for i in by_remainder[:total - sum(counts)]:
+        counts[i] += 1
+    return counts
+
+
+def question_key(question: dict) -> str:
+    """Normalised question text used to drop exact/near-verbatim repeats when merging chunks."""
+    text = str(question.get('question', '')).lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', text))
+
+
+def merge_questions(batches: list, limit: int) -> list:
+    """Concatenate per-chunk question lists in material order, dropping repeats, trimmed to `limit`."""
+    seen = set()
+    merged = []
+    for batch in batches:
+        for question in batch:
+            key = question_key(question)
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            merged.append(question)
+    return merged[:limit]
@@ -0,0 +1,147 @@
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+import material_chunks
+
+# Passage size when indexing, and how much retrieved text a prompt gets by default
+INDEX_CHUNK_TOKENS = int(os.getenv('MATERIAL_INDEX_CHUNK_TOKENS', 300))
+CONTEXT_TOKENS = int(os.getenv('MATERIAL_CONTEXT_TOKENS', 2000))
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_WORD = re.compile(r'[a-z0-9]+')
+_STOPWORDS = frozenset(
+    'a an and are as at be but by for from has have in is it its of on or that the their this to was '
+    'were which will with what when where who how'.split())
+
+
+def tokenize(text: str) -> list:
+    return [w for w in _WORD.findall(text.lower()) if len(w) > 1 and w not in _STOPWORDS]
+
+
+class MaterialIndex:
+    """BM25 inverted index over passages of each user's uploaded materials, persisted in SQLite.
+
+    Every material is split into ~INDEX_CHUNK_TOKENS passages; `postings` maps (owner, term)
+    to the passages containing it with term frequencies. Adding a material only writes its
+    own rows, and re-adding the same material_id (content hash) is a no-op. Corpus statistics
+    (passage count, average length) are per owner, so one user's uploads never skew another's.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS materials ("
+            " owner TEXT, material_id TEXT, filename TEXT, PRIMARY KEY (owner, material_id));"
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            " id INTEGER PRIMARY KEY, owner TEXT, material_id TEXT, position INTEGER, text TEXT, length INTEGER);"
+            "CREATE INDEX IF NOT EXISTS chunks_owner ON chunks (owner);"
+            "CREATE TABLE IF NOT EXISTS postings (owner TEXT, term TEXT, chunk_id INTEGER, tf INTEGER);"
+            "CREATE INDEX IF NOT EXISTS postings_term ON postings (owner, term);")
+        self._conn.commit()
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv('MATERIAL_INDEX_PATH', 'material_index.db'))
+
+    def add_material(self, owner: str, material_id: str, text: str, filename: str = None) -> int:
+        """Index one material for `owner`. Returns the number of passages added (0 if already indexed)."""
+        passages = material_chunks.split_chunks(text, INDEX_CHUNK_TOKENS)
+        with self._lock:
+            exists = self._conn.execute(
+                "SELECT 1 FROM materials WHERE owner = ? AND material_id = ?", (owner, material_id)).fetchone()
+            if exists:
+                return 0
+            with self._conn:
+                self._conn.execute("INSERT INTO materials VALUES (?, ?, ?)", (owner, material_id, filename))
+                for position, passage in enumerate(passages):
+                    terms = tokenize(passage)
+                    if not terms:
+                        continue
+                    chunk_id = self._conn.execute(
+                        "INSERT INTO chunks (owner, material_id, position, text, length) VALUES (?, ?, ?, ?, ?)",
+                        (owner, material_id, position, passage, len(terms))).lastrowid
+                    self._conn.executemany(
+                        "INSERT INTO postings VALUES (?, ?, ?, ?)",
+                        [(owner, term, chunk_id, tf) for term, tf in Counter(terms).items()])
+        return len(passages)
+
+    def remove_material(self, owner: str, material_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM postings WHERE chunk_id IN (SELECT id FROM chunks WHERE owner = ? AND material_id = ?)",
+                (owner, material_id))
+            self._conn.execute("DELETE FROM chunks WHERE owner = ? AND material_id = ?", (owner, material_id))
+            self._conn.execute("DELETE FROM materials WHERE owner = ? AND material_id = ?", (owner, material_id))
+
+    def has_materials(self, owner: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM chunks WHERE owner = ? LIMIT 1", (owner,)).fetchone() is not None
+
+    def search(self, owner: str, query: str, k: int = 10) -> list:
+        """Top-`k` passages for `query` by BM25: [{'text', 'score', 'materialId', 'position'}]."""
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        with self._lock:
+            count, avg_length = self._conn.execute(
+                "SELECT COUNT(*), AVG(length) FROM chunks WHERE owner = ?", (owner,)).fetchone()
+            if not count:
+                return []
+            scores = Counter()
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c ON c.id = p.chunk_id"
+                    " WHERE p.owner = ? AND p.term = ?", (owner, term)).fetchall()
+                if not rows:
+                    continue
+                idf = math.log(1 + (count - len(rows) + 0.5) / (len(rows) + 0.5))
+                for chunk_id, tf, length in rows:
+                    norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                    scores[chunk_id] += idf * tf * (BM25_K1 + 1) / norm
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            if not best:
+                return []
+            placeholders = ','.join('?' * len(best))
+            rows = self._conn.execute(
+                f"SELECT id, material_id, position, text FROM chunks WHERE id IN ({placeholders})",
+                [chunk_id for chunk_id, _ in best]).fetchall()
+        by_id = {r[0]: r for r in rows}
+        return [{'text': by_id[cid][3], 'score': round(score, 4), 'materialId': by_id[cid][1], 'position': by_id[cid][2]}
+                for cid, score in best if cid in by_id]
+
+    def context(self, owner: str, query: str, max_tokens: int = None) -> str:
+        """Best-matching passages that fit in `max_tokens`, joined in reading order for a prompt."""
+        max_tokens = max_tokens or CONTEXT_TOKENS
+        picked = []
+        used = 0
+        for hit in self.search(owner, query, k=max(1, 4 * max_tokens // INDEX_CHUNK_TOKENS)):
+            tokens = material_chunks.estimate_tokens(hit['text'])
+            if used + tokens > max_tokens:
+                continue
+            picked.append(hit)
+            used += tokens
+        picked.sort(key=lambda h: (h['materialId'], h['position']))
+        return '\n\n'.join(h['text'] for h in picked)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index() -> MaterialIndex:
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = MaterialIndex.from_env()
+        return _index
@@ -0,0 +1,55 @@
+import json
+
+
+class IncrementalQuestionParser:
+    """Pull complete question objects out of a JSON document that arrives in pieces.
+
+    The model may answer with a bare array `[{...}, {...}]` or with `{"questions": [...]}`.
+    Either way, every object that closes and contains a "question" key is returned by
+    `feed` as soon as its closing brace is seen, without waiting for the rest of the document.
+    Braces inside string literals (including escaped quotes) are ignored.
+    """
+
+    def __init__(self):
+        self.buffer = []
+        self.base = 0           # absolute offset of buffer[0]
+        self.pos = 0            # absolute offset of the next character to scan
+        self.starts = []        # stack of absolute offsets of currently open '{'
+        self.in_string = False
+        self.escape = False
+        self.emitted = 0
+
+    def feed(self, text: str) -> list:
+        found = []
+        for ch in text:
+            self.buffer.append(ch)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == '{':
+                self.starts.append(self.pos)
+            elif ch == '}' and self.starts:
+                start = self.starts.pop()
+                obj = self._load(''.join(self.buffer[start - self.base:self.pos - self.base + 1]))
+                if isinstance(obj, dict) and 'question' in obj:
+                    found.append(obj)
+            self.pos += 1
+        if not self.starts and not self.in_string:
+            # nothing open: drop what we've scanned so memory stays bounded by one object
+            self.buffer = []
+            self.base = self.pos
+        self.emitted += len(found)
+        return found
+
+    @staticmethod
+    def _load(text: str):
+        try:
+            return json.loads(text)
+        except Exception:
+            return None
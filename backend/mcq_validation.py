@@ -0,0 +1,65 @@
+import re
+
+from mcq_stream import IncrementalQuestionParser
+
+_LABEL = re.compile(r'^\s*[A-Za-z][:.)]\s*')
+
+
+def _option_key(option) -> str:
+    # "A: Paris" and "B: paris" are the same option
+    return ' '.join(_LABEL.sub('', str(option)).lower().split())
+
+
+def normalize_question(question):
+    """Cheap local fixes that don't need the model, e.g. a bare int answer -> [int]."""
+    if isinstance(question, dict) and isinstance(question.get('answer'), int) and not isinstance(question['answer'], bool):
+        question = dict(question, answer=[question['answer']])
+    return question
+
+
+def question_problems(question) -> list:
+    """Everything wrong with one MCQ; an empty list means it's usable as-is."""
+    if not isinstance(question, dict):
+        return ['not a question object']
+    problems = []
+    if not str(question.get('question') or '').strip():
+        problems.append('missing question text')
+
+    options = question.get('options')
+    if not isinstance(options, list) or len(options) < 2:
+        problems.append('missing options (need at least 2)')
+        options = options if isinstance(options, list) else []
+    else:
+        if any(not _option_key(o) for o in options):
+            problems.append('empty option')
+        keys = [_option_key(o) for o in options if _option_key(o)]
+        if len(set(keys)) != len(keys):
+            problems.append('duplicate options')
+
+    answer = question.get('answer')
+    if not isinstance(answer, list) or not answer:
+        problems.append('answer must be a non-empty list of option indices')
+    elif any(not isinstance(a, int) or isinstance(a, bool) for a in answer):
+        problems.append('answer indices must be integers')
+    elif options and any(a < 0 or a >= len(options) for a in answer):
+        problems.append(f'answer index out of range (options 0-{len(options) - 1})')
+    return problems
+
+
+def validate_batch(questions: list) -> dict:
+    """Check every question: {'questions': normalised list, 'invalid': [{'index', 'problems'}]}."""
+    questions = [normalize_question(q) for q in questions]
+    invalid = []
+    for i, question in enumerate(questions):
+        problems = question_problems(question)
+        if problems:
+            invalid.append({'index': i, 'problems': problems})
+    return {'questions': questions, 'invalid': invalid}
+
+
+def salvage(text: str) -> list:
+    """Pull every well-formed question object out of model output that isn't valid JSON as a whole.
+
+    One malformed element then costs that element rather than the whole batch.
+    """
+    return IncrementalQuestionParser().feed(text)
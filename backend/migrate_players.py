@@ -0,0 +1,8 @@
+import json
+import aws
+
+# One-shot migration: move every QuizSessions `players` map into PLAYER#<name> rows.
+# Run once after setting PLAYER_STORAGE=items; re-running is harmless.
+
+if __name__ == "__main__":
+    print(json.dumps(aws.DynamoDB().migrate_all_players(), indent=2))
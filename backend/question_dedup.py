@@ -0,0 +1,118 @@
+import hashlib
+import os
+import re
+import struct
+import zlib
+
+# Questions whose estimated Jaccard similarity (over character shingles) reaches this are duplicates
+DEDUP_THRESHOLD = float(os.getenv('QUESTION_DEDUP_THRESHOLD', 0.6))
+SHINGLE_SIZE = 5
+# 16 bands x 4 rows: pairs above ~0.5 similarity land in a shared bucket with high probability
+LSH_BANDS = 16
+LSH_ROWS = 4
+
+_MERSENNE = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalize(text: str) -> str:
+    return ' '.join(re.findall(r'[a-z0-9]+', str(text).lower()))
+
+
+def shingles(text: str, k: int = SHINGLE_SIZE) -> set:
+    text = normalize(text)
+    if len(text) <= k:
+        return {text} if text else set()
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+class MinHasher:
+    """MinHash signatures from `num_perm` universal hash functions over 32-bit shingle hashes."""
+
+    def __init__(self, num_perm: int = LSH_BANDS * LSH_ROWS, seed: int = 1):
+        self.num_perm = num_perm
+        self.params = []
+        for i in range(num_perm):
+            a, b = struct.unpack_from('<QQ', hashlib.sha256(f"minhash-{seed}-{i}".encode()).digest())
+            self.params.append((a % (_MERSENNE - 1) + 1, b % _MERSENNE))
+
+    def signature(self, text: str) -> tuple:
+        hashes = [zlib.crc32(s.encode()) for s in shingles(text)]
+        if not hashes:
+            return tuple([_MAX_HASH] * self.num_perm)
+        return tuple(min(((a * h + b) % _MERSENNE) & _MAX_HASH for h in hashes) for a, b in self.params)
+
+
+def similarity(sig_a: tuple, sig_b: tuple) -> float:
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+class QuestionDeduper:
+    """Incremental near-duplicate filter for question texts.
+
+    Each accepted question's MinHash signature is split into LSH bands and bucketed, so a new
+    question is only compared against the few earlier ones sharing a band rather than all of
+    them. `add` returns None for a new question or {'duplicateOf', 'similarity'} for a repeat,
+    where duplicateOf is the earlier question's text.
+    """
+
+    def __init__(self, threshold: float = None, bands: int = LSH_BANDS, rows: int = LSH_ROWS):
+        self.threshold = DEDUP_THRESHOLD if threshold is None else threshold
+        self.bands = bands
+        self.rows = rows
+        self.hasher = MinHasher(bands * rows)
+        self.buckets = {}
+        self.signatures = []
+        self.texts = []
+
+    def _band_keys(self, sig: tuple):
+        return [(b, sig[b * self.rows:(b + 1) * self.rows]) for b in range(self.bands)]
+
+    def match(self, text: str):
+        sig = self.hasher.signature(text)
+        best = None
+        candidates = set()
+        for key in self._band_keys(sig):
+            candidates.update(self.buckets.get(key, ()))
+        for i in candidates:
+            score = similarity(sig, self.signatures[i])
+            if score >= self.threshold and (best is None or score > best['similarity']):
+                best = {'duplicateOf': self.texts[i], 'similarity': round(score, 3)}
+        return sig, best
+
+    def add(self, text: str):
+        sig, duplicate = self.match(text)
+        if duplicate:
+            return duplicate
+        index = len(self.signatures)
+        self.signatures.append(sig)
+        self.texts.append(text)
+        for key in self._band_keys(sig):
+            self.buckets.setdefault(key, []).append(index)
+        return None
+
+
+def question_text(question) -> str:
+    if isinstance(question, dict):
+        return str(question.get('question', ''))
+    return str(question)
+
+
+def dedupe(questions: list, deduper: QuestionDeduper = None):
+    """Drop near-duplicate questions, keeping the first of each group.
+
+    Returns (kept, report) where report is {'input', 'kept', 'removed': [{'index', 'duplicateOf',
+    'similarity', 'question'}]} where index points into `questions`.
+    Pass a `deduper` to keep filtering later batches (e.g. top-ups) against the same set.
+    """
+    deduper = deduper or QuestionDeduper()
+    kept = []
+    removed = []
+    for i, question in enumerate(questions):
+        text = question_text(question)
+        duplicate = deduper.add(text) if normalize(text) else None
+        if duplicate:
+            removed.append(dict(duplicate, index=i, question=text))
+        else:
+            kept.append(question)
+    return kept, {'input': len(questions), 'kept': len(kept), 'removed': removed}
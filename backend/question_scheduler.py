@@ -0,0 +1,227 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+
+
+class Timer:
+    __slots__ = ('deadline_tick', 'callback', 'cancelled')
+
+    def __init__(self, deadline_tick: int, callback):
+        self.deadline_tick = deadline_tick
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimingWheel:
+    """Hierarchical timing wheel (Varghese & Lauck).
+
+    Level 0 has `wheel_size` slots of `tick` seconds each; every level above covers
+    `wheel_size` times the span of the one below. A timer is placed in the lowest level whose
+    span covers its delay and is cascaded down as the wheel turns, so scheduling and
+    cancelling are O(1) and each tick only touches one slot per level that wrapped.
+    Not thread-safe on its own; QuestionScheduler serialises access.
+    """
+
+    def __init__(self, tick: float = 0.1, wheel_size: int = 64, levels: int = 4, now: float = None):
+        self.tick = tick
+        self.size = wheel_size
+        self.levels = levels
+        self.current_tick = int((time.time() if now is None else now) / tick)
+        self.wheels = [[[] for _ in range(wheel_size)] for _ in range(levels)]
+        self._due = []
+
+    def schedule(self, deadline: float, callback) -> Timer:
+        """Run `callback()` once the wheel has advanced past `deadline` (epoch seconds)."""
+        timer = Timer(math.ceil(deadline / self.tick), callback)
+        self._place(timer)
+        return timer
+
+    def _place(self, timer: Timer):
+        delta = timer.deadline_tick - self.current_tick
+        if delta <= 0:
+            self._due.append(timer)
+            return
+        for level in range(self.levels):
+            if delta < self.size ** (level + 1) or level == self.levels - 1:
+                slot = (timer.deadline_tick // self.size ** level) % self.size
+                self.wheels[level][slot].append(timer)
+                return
+
+    def advance(self, now: float) -> list:
+        """Turn the wheel up to `now` and return the callbacks of every timer that expired."""
+        fired = []
+        target = int(now / self.tick)
+        while self.current_tick < target:
+            self.current_tick += 1
+            # cascade: a higher level only turns when every level below it has wrapped
+            for level in range(1, self.levels):
+                span = self.size ** level
+                if self.current_tick % span:
+                    break
+                slot = (self.current_tick // span) % self.size
+                timers, self.wheels[level][slot] = self.wheels[level][slot], []
+                for timer in timers:
+                    if not timer.cancelled:
+                        self._place(timer)
+            slot = self.current_tick % self.size
+            timers, self.wheels[0][slot] = self.wheels[0][slot], []
+            for timer in timers:
+                if not timer.cancelled:
+                    self._place(timer)
+            due, self._due = self._due, []
+            fired.extend(t.callback for t in due if not t.cancelled)
+        return fired
+
+
+class SchedulerStore:
+    """SQLite file holding each running game's position so a restart can resume it."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # one small write per advance; WAL without full fsync keeps that off the tick thread's back
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS games ("
+            " game_id TEXT PRIMARY KEY, current_q INTEGER, num_questions INTEGER,"
+            " seconds_per_question REAL, deadline REAL, status TEXT)")
+        self._conn.commit()
+
+    def save(self, game: dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO games VALUES (?, ?, ?, ?, ?, ?)",
+                (game['gameId'], game['currentQ'], game['numQuestions'], game['secondsPerQuestion'],
+                 game['deadline'], game['status']))
+            self._conn.commit()
+
+    def running(self) -> list:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT game_id, current_q, num_questions, seconds_per_question, deadline, status"
+                " FROM games WHERE status = 'running'").fetchall()
+        return [{'gameId': r[0], 'currentQ': r[1], 'numQuestions': r[2], 'secondsPerQuestion': r[3],
+                 'deadline': r[4], 'status': r[5]} for r in rows]
+
+
+class QuestionScheduler:
+    """Local replacement for the quiz Step Function.
+
+    Each running game owns one timer on a shared TimingWheel, so thousands of concurrent games
+    cost one background thread. When a game's `secondsPerQuestion` deadline passes, `currentQ`
+    is advanced and `on_advance(game_id, current_q, status)` is called (status is 'running',
+    or 'ended' after the last question). Positions are persisted in a SchedulerStore and
+    `recover()` resumes every running game after a restart, skipping questions whose
+    deadlines passed while the process was down.
+    """
+
+    def __init__(self, on_advance, store: SchedulerStore = None, tick: float = 0.1):
+        self.on_advance = on_advance
+        self.store = store
+        self.wheel = TimingWheel(tick=tick)
+        self.games = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls, on_advance):
+        path = os.getenv('SCHEDULER_STATE_PATH', 'scheduler_state.db')
+        return cls(on_advance, SchedulerStore(path))
+
+    def start(self):
+        if self._thread is None:
+            self.recover()
+            self._thread = threading.Thread(target=self._run, name='question-scheduler', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+
+    def start_game(self, game_id: str, seconds_per_question: float, num_questions: int) -> dict:
+        game = {
+            'gameId': game_id,
+            'currentQ': 0,
+            'numQuestions': int(num_questions),
+            'secondsPerQuestion': float(seconds_per_question),
+            'deadline': time.time() + float(seconds_per_question),
+            'status': 'running' if num_questions > 0 else 'ended',
+        }
+        self._commit(game)
+        self.on_advance(game_id, game['currentQ'], game['status'])
+        return game
+
+    def cancel_game(self, game_id: str):
+        with self._lock:
+            timer = self._timers.pop(game_id, None)
+            game = self.games.pop(game_id, None)
+        if timer:
+            timer.cancel()
+        if game and self.store:
+            game['status'] = 'cancelled'
+            self.store.save(game)
+
+    def recover(self) -> int:
+        if not self.store:
+            return 0
+        now = time.time()
+        games = self.store.running()
+        for game in games:
+            # catch up on questions whose deadlines passed while we were down
+            missed = max(0, math.floor((now - game['deadline']) / game['secondsPerQuestion']) + 1) \
+                if game['deadline'] <= now else 0
+            if missed:
+                game['currentQ'] += missed
+                game['deadline'] += missed * game['secondsPerQuestion']
+                if game['currentQ'] >= game['numQuestions']:
+                    game['status'] = 'ended'
+                self.on_advance(game['gameId'], min(game['currentQ'], game['numQuestions']), game['status'])
+            self._commit(game)
+        return len(games)
+
+    def _commit(self, game: dict):
+        if self.store:
+            self.store.save(game)
+        with self._lock:
+            old = self._timers.pop(game['gameId'], None)
+            if old:
+                old.cancel()
+            if game['status'] != 'running':
+                self.games.pop(game['gameId'], None)
+                return
+            self.games[game['gameId']] = game
+            self._timers[game['gameId']] = self.wheel.schedule(
+                game['deadline'], lambda gid=game['gameId']: self._advance(gid))
+
+    def _advance(self, game_id: str):
+        with self._lock:
+            game = self.games.get(game_id)
+            if not game:
+                return
+            game = dict(game)
+        game['currentQ'] += 1
+        game['deadline'] += game['secondsPerQuestion']
+        if game['currentQ'] >= game['numQuestions']:
+            game['status'] = 'ended'
+        self._commit(game)
+        try:
+            self.on_advance(game_id, game['currentQ'], game['status'])
+        except Exception as e:
+            print(f"QuestionScheduler: on_advance failed for {game_id}: {e}")
+
+    def _run(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                fired = self.wheel.advance(time.time())
+            for callback in fired:
+                callback()
+            self._stopped.wait(self.wheel.tick)
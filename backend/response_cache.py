@@ -0,0 +1,143 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+_MISSING = object()
+
+
+class ResponseCache:
+    """LRU + TTL cache for model responses with an optional on-disk tier.
+
+    Keys are built from (model_id, normalized prompt, inferenceConfig) by `make_key`.
+    The in-memory tier holds at most `max_entries` values and evicts the least recently
+    used one. If `disk_dir` is set every value is also written to `<disk_dir>/<key>.json`
+    so entries survive a restart; a memory miss falls back to disk and promotes the hit.
+    Entries older than `ttl` seconds are treated as misses in both tiers.
+
+    Values are copied in and out, so a caller mutating a result can't change what later
+    callers get back.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 3600, disk_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            max_entries=int(os.getenv('BEDROCK_CACHE_SIZE', 256)),
+            ttl=float(os.getenv('BEDROCK_CACHE_TTL', 3600)),
+            disk_dir=os.getenv('BEDROCK_CACHE_DIR') or None,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl > 0
+
+    @staticmethod
+    def make_key(model_id: str, prompt: str, inference_config: dict, variant: Any = None) -> str:
+        # Collapse whitespace so the same prompt with different indentation/newlines hits
+        normalized = ' '.join(str(prompt).split())
+        raw = json.dumps([model_id, normalized, inference_config or {}, variant], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str, default=None):
+        if not self.enabled:
+            return default
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return copy.deepcopy(value)
+                del self._entries[key]
+
+        expires_at, value = self._disk_get(key, now)
+        with self._lock:
+            if value is _MISSING:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self.disk_hits += 1
+        # promoted with its on-disk expiry, not a fresh TTL
+        self._memory_set(key, value, expires_at)
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Any):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        value = copy.deepcopy(value)
+        self._memory_set(key, value, expires_at)
+        self._disk_set(key, value, expires_at)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'disk_dir': self.disk_dir,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / total) if total else 0.0,
+            }
+
+    def _memory_set(self, key: str, value: Any, expires_at: float):
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_get(self, key: str, now: float):
+        if not self.disk_dir:
+            return 0, _MISSING
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            if entry.get('expires_at', 0) > now:
+                return entry['expires_at'], entry.get('value')
+            os.remove(path)
+        except Exception:
+            # missing, expired or unreadable files are all just misses
+            pass
+        return 0, _MISSING
+
+    def _disk_set(self, key: str, value: Any, expires_at: float):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({'expires_at': expires_at, 'value': value}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"ResponseCache: failed to write {path}: {e}")
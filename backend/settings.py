@@ -0,0 +1,21 @@
+_loaded = False
+
+
+def load_env():
+    """Load backend/.env into the environment once per process.
+
+    app.py and aws.py both need it before reading configuration; only the first call searches
+    for the file and reports where settings come from.
+    """
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    from dotenv import load_dotenv, find_dotenv
+    # searched upwards from this file, as app.py and aws.py each used to do
+    path = find_dotenv()
+    if path:
+        load_dotenv(path)
+        print(f"Loaded .env from: {path}")
+    else:
+        print("No .env file found (falling back to shell environment / instance role)")
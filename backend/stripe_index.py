@@ -0,0 +1,119 @@
+import json
+import os
+import sys
+from typing import Optional
+
+import aws_clients
+
+AWS_REGION = "us-east-1"
+
+
+class S3CustomerIndex:
+    """Reverse index stripe_customer_id -> sub kept as one small object per customer.
+
+    Entries live at `index/stripe-customer/{customer_id}.json` in the question bank bucket,
+    so a lookup is a single GET and concurrent writers never touch the same object.
+    """
+
+    prefix = 'index/stripe-customer/'
+
+    def __init__(self, s3_client, bucket_name: str = None):
+        self.s3_client = s3_client
+        self.bucket = bucket_name or os.getenv('QUESTIONBANK_BUCKET', 'questionbankaristotle')
+
+    def get(self, stripe_customer_id: str) -> Optional[str]:
+        try:
+            resp = self.s3_client.get_object(Bucket=self.bucket, Key=f"{self.prefix}{stripe_customer_id}.json")
+            return json.loads(resp['Body'].read().decode('utf-8')).get('sub')
+        except Exception as e:
+            if aws_clients.error_code(e) in ('NoSuchKey', '404'):
+                return None
+            raise
+
+    def put(self, stripe_customer_id: str, sub: str):
+        body = json.dumps({'stripe_customer_id': stripe_customer_id, 'sub': sub})
+        self.s3_client.put_object(Bucket=self.bucket, Key=f"{self.prefix}{stripe_customer_id}.json",
+                                  Body=body.encode('utf-8'), ContentType='application/json')
+
+
+class DynamoCustomerIndex:
+    """Reverse index stripe_customer_id -> sub in a DynamoDB table keyed on `stripe_customer_id`."""
+
+    def __init__(self, table_name: str = None):
+        table_name = table_name or os.getenv('STRIPE_INDEX_TABLE', 'StripeCustomers')
+        self.table = aws_clients.table(table_name, AWS_REGION)
+
+    def get(self, stripe_customer_id: str) -> Optional[str]:
+        resp = self.table.get_item(Key={'stripe_customer_id': stripe_customer_id}, ProjectionExpression='#s',
+                                   ExpressionAttributeNames={'#s': 'sub'})
+        return (resp.get('Item') or {}).get('sub')
+
+    def put(self, stripe_customer_id: str, sub: str):
+        self.table.put_item(Item={'stripe_customer_id': stripe_customer_id, 'sub': sub})
+
+
+class CustomerIndex:
+    """Backend-agnostic wrapper over an index backend.
+
+    Only the billing flow writes mappings (checkout creating a customer, the Stripe
+    webhook, the rebuild backfill), never a user-editable profile save: whoever owns the
+    mapping for a customer id receives that customer's premium upgrade. Lookups always
+    read the backend, so a corrected mapping applies in every process at once.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def lookup(self, stripe_customer_id: str) -> Optional[str]:
+        if not stripe_customer_id:
+            return None
+        return self.backend.get(stripe_customer_id)
+
+    def record(self, stripe_customer_id: str, sub: str):
+        if not stripe_customer_id or not sub:
+            return
+        self.backend.put(stripe_customer_id, sub)
+
+
+def make_customer_index(s3_client, bucket_name: str = None) -> CustomerIndex:
+    """Build the index selected by STRIPE_INDEX_BACKEND ('s3' (default) or 'dynamodb')."""
+    if os.getenv('STRIPE_INDEX_BACKEND', 's3').lower() == 'dynamodb':
+        return CustomerIndex(DynamoCustomerIndex())
+    return CustomerIndex(S3CustomerIndex(s3_client, bucket_name))
+
+
+def rebuild(s3, bucket_name: str = None) -> dict:
+    """One-shot backfill: scan every user/{sub}.json profile and index its stripe_customer_id.
+
+    Profiles written before /api/profile stopped accepting billing fields may carry a
+    client-supplied customer id; review the output before relying on it. `s3` is an aws.S3 instance. Returns counts of scanned, indexed and failed profiles.
+    """
+    bucket = bucket_name or os.getenv('QUESTIONBANK_BUCKET', 'questionbankaristotle')
+    scanned = indexed = failed = 0
+    paginator = s3.s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix='user/'):
+        for obj in page.get('Contents', []) or []:
+            key = obj.get('Key') or ''
+            if not key.endswith('.json'):
+                continue
+            scanned += 1
+            try:
+                resp = s3.s3_client.get_object(Bucket=bucket, Key=key)
+                data = json.loads(resp['Body'].read().decode('utf-8'))
+                customer = data.get('stripe_customer_id') if isinstance(data, dict) else None
+                if customer:
+                    s3.customer_index.record(customer, data.get('sub') or key.split('/')[-1][:-5])
+                    indexed += 1
+            except Exception as e:
+                print(f"rebuild: failed on {key}: {e}")
+                failed += 1
+    return {'scanned': scanned, 'indexed': indexed, 'failed': failed}
+
+
+if __name__ == '__main__':
+    # python stripe_index.py rebuild
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print("usage: python stripe_index.py rebuild")
+        sys.exit(1)
+    import aws
+    print(rebuild(aws.S3()))
@@ -0,0 +1,83 @@
+import json
+import threading
+import time
+
+import pytest
+
+from admission import PREMIUM, STANDARD, AdmissionController, Throttled, TokenBucket
+
+
+def test_token_bucket_refills_up_to_capacity():
+    bucket = TokenBucket(rate=2, capacity=4)
+    start = bucket._stamp
+    bucket.take(4)
+    assert bucket.wait_for(1) == pytest.approx(0.5)
+    bucket.refill(start + 1)
+    assert bucket.level == pytest.approx(2)
+    bucket.give(10)
+    assert bucket.level == 4
+    # a cost larger than the bucket only ever waits for a full bucket
+    bucket.take(100)
+    assert bucket.level == 0
+
+
+def test_fails_fast_when_the_wait_exceeds_max_wait():
+    controller = AdmissionController(rps=1, burst=1, tpm=0)
+    controller.acquire(0)
+    with pytest.raises(Throttled) as e:
+        controller.acquire(0, max_wait=0.1)
+    assert e.value.retry_after == 1
+    assert controller.stats()['lanes'][STANDARD]['rejected'] == 1
+
+
+def test_settle_returns_unused_tokens():
+    controller = AdmissionController(rps=0, tpm=60, token_burst=100)
+    permit = controller.acquire(80)
+    assert controller.tokens.level == pytest.approx(20, abs=0.5)
+    permit.settle({'inputTokens': 10, 'outputTokens': 20})
+    assert controller.tokens.level == pytest.approx(70, abs=0.5)
+    controller.acquire(30).settle(None)
+    assert controller.tokens.level == pytest.approx(70, abs=0.5)
+
+
+def test_premium_calls_go_ahead_of_queued_standard_ones():
+    controller = AdmissionController(rps=5, burst=1, tpm=0)
+    controller.acquire(0)
+    order = []
+
+    def call(lane):
+        controller.acquire(0, lane, max_wait=2)
+        order.append(lane)
+    standard = threading.Thread(target=call, args=(STANDARD,))
+    premium = threading.Thread(target=call, args=(PREMIUM,))
+    standard.start()
+    time.sleep(0.05)
+    premium.start()
+    standard.join()
+    premium.join()
+    assert order == [PREMIUM, STANDARD]
+
+
+def test_stream_settles_with_the_usage_in_its_last_event():
+    import aws
+
+    class Permit:
+        usage = 'unsettled'
+
+        def settle(self, usage=None):
+            self.usage = usage
+
+    def event(payload):
+        return {'chunk': {'bytes': json.dumps(payload).encode()}}
+    events = [event({'contentBlockDelta': {'delta': {'text': '[]'}}}),
+              event({'metadata': {'usage': {'inputTokens': 7, 'outputTokens': 3}},
+                     'amazon-bedrock-invocationMetrics': {'inputTokenCount': 7, 'outputTokenCount': 3}})]
+    permit = Permit()
+    assert list(aws.Bedrock._settled_stream(iter(events), permit)) == events
+    assert permit.usage == {'inputTokens': 7, 'outputTokens': 3}
+
+    abandoned = Permit()
+    stream = aws.Bedrock._settled_stream(iter(events), abandoned)
+    next(stream)
+    stream.close()
+    assert abandoned.usage == 'unsettled'
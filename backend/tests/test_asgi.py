@@ -0,0 +1,39 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip('a2wsgi')
+asgi = pytest.importorskip('asgi')
+
+
+def _scope(path):
+    return {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+            'root_path': '', 'headers': [], 'client': ('127.0.0.1', 1), 'server': ('testserver', 80)}
+
+
+async def _get(path):
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+    await asgi.application(_scope(path), receive, send)
+    return sent[0]['status']
+
+
+def test_delegated_flask_routes_run_concurrently(monkeypatch):
+    # each request waits for the other; serialised onto one thread, the barrier would break
+    barrier = threading.Barrier(2, timeout=5)
+
+    def ready():
+        barrier.wait()
+        return 'ok'
+    monkeypatch.setitem(asgi.flask_backend.app.view_functions, 'ready', ready)
+
+    async def both():
+        return await asyncio.gather(_get('/api/ready'), _get('/api/ready'))
+    assert asyncio.run(both()) == [200, 200]
@@ -0,0 +1,22 @@
+import base64
+import json
+
+import pytest
+
+from dynamodb_helper import decode_cursor
+
+
+def _token(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode('utf-8')).decode('ascii')
+
+
+def test_round_trips_a_key():
+    key = {'pk': 'GAME#g', 'sk': 'PLAYER#p'}
+    assert decode_cursor(_token(key)) == key
+    assert decode_cursor('') is None
+
+
+@pytest.mark.parametrize('cursor', [_token([]), _token(1), _token({'pk': 1}), 'not base64!', _token('x')[:-2] + '@@'])
+def test_rejects_anything_else(cursor):
+    with pytest.raises(ValueError, match='invalid cursor'):
+        decode_cursor(cursor)
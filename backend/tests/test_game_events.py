@@ -0,0 +1,50 @@
+from game_events import GameHub, events_from_sessions_record
+
+
+def test_sequence_counter_lives_only_while_subscribed():
+    hub = GameHub()
+    hub.publish('g1', 'status', {'status': 'waiting'})
+    assert 'g1' not in hub._seq
+
+    sub = hub.subscribe('g1')
+    hub.publish('g1', 'question', {'currentQ': 0})
+    assert sub.queue.get_nowait()['seq'] == 1
+    hub.unsubscribe(sub)
+    assert hub._seq == {} and hub._subs == {}
+
+
+def test_sessions_record_becomes_question_and_status_events():
+    record = {'eventName': 'MODIFY', 'dynamodb': {
+        'Keys': {'sessionID': {'S': 's1'}},
+        'OldImage': {'currentQuestion': {'N': '0'}, 'status': {'S': 'waiting'}},
+        'NewImage': {'currentQuestion': {'N': '1'}, 'status': {'S': 'active'}},
+    }}
+    events = events_from_sessions_record(record)
+    assert [(g, t) for g, t, _ in events] == [('s1', 'status'), ('s1', 'question')]
+    assert events[1][2]['currentQ'] == 1
+    assert events_from_sessions_record({'eventName': 'REMOVE', 'dynamodb': record['dynamodb']}) == []
+
+
+def test_stream_poller_reads_later_shards_from_trim_horizon():
+    from game_events import StreamPoller
+
+    class Streams:
+        def __init__(self):
+            self.shards = [{'ShardId': 'old', 'SequenceNumberRange': {'EndingSequenceNumber': '9'}},
+                           {'ShardId': 'open', 'SequenceNumberRange': {}}]
+            self.opened = []
+
+        def describe_stream(self, StreamArn):
+            return {'StreamDescription': {'Shards': self.shards}}
+
+        def get_shard_iterator(self, StreamArn, ShardId, ShardIteratorType):
+            self.opened.append((ShardId, ShardIteratorType))
+            return {'ShardIterator': ShardId}
+
+    poller = StreamPoller.__new__(StreamPoller)
+    poller.client, poller.stream_arn = Streams(), 'arn'
+    poller.iterators, poller.finished, poller.started = {}, set(), False
+    poller._refresh_shards()
+    poller.client.shards.append({'ShardId': 'child', 'SequenceNumberRange': {}})
+    poller._refresh_shards()
+    assert poller.client.opened == [('open', 'LATEST'), ('child', 'TRIM_HORIZON')]
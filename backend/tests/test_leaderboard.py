@@ -0,0 +1,70 @@
+import leaderboard
+from leaderboard import Leaderboard
+
+
+def test_top_and_rank_follow_score_changes():
+    board = Leaderboard(k=2)
+    board.load([{'playerId': 'a', 'score': 5}, {'playerId': 'b', 'score': 3}, {'playerId': 'c', 'score': 1}])
+    assert board.top() == [{'playerId': 'a', 'score': 5}, {'playerId': 'b', 'score': 3}]
+    assert board.set_score('c', 10) is True
+    assert board.rank('c') == 1
+    assert board.top()[0] == {'playerId': 'c', 'score': 10}
+    # b is outside the top 2 now; changing its score below them doesn't move the top-k
+    assert board.apply_delta('b', -1) is False
+    assert board.apply_delta('b', 10) is True
+
+
+def test_ties_share_the_best_rank():
+    board = Leaderboard()
+    board.load([{'playerId': 'a', 'score': 2}, {'playerId': 'b', 'score': 2}, {'playerId': 'c', 'score': 1}])
+    assert board.rank('a') == board.rank('b') == 1
+    assert board.rank('c') == 3
+    assert board.rank('nobody') is None
+
+
+class _SnapshotTable:
+    def __init__(self):
+        self.item = None
+        self.puts = 0
+
+    def get_item(self, Key):
+        return {'Item': self.item} if self.item else {}
+
+    def put_item(self, Item, **kwargs):
+        self.puts += 1
+        self.item = Item
+
+
+def _record(name, player, score, old_score=None):
+    image = {'playerId': {'S': player}, 'score': {'N': str(score)}}
+    old = {'OldImage': {'playerId': {'S': player}, 'score': {'N': str(old_score)}}} if old_score is not None else {}
+    return {'eventName': name, 'dynamodb': dict(old, Keys={'pk': {'S': 'GAME#g'}, 'sk': {'S': f'PLAYER#{player}'}},
+                                                   NewImage=image)}
+
+
+def test_board_is_seeded_once_then_follows_the_stream(monkeypatch):
+    import dynamodb_helper as db
+    table = _SnapshotTable()
+    seeds = []
+    monkeypatch.setattr(db, '_table', lambda: table)
+    monkeypatch.setattr(db, 'list_players', lambda game_id, projection=None: seeds.append(game_id) or
+                        [{'playerId': 'a', 'score': 10}, {'playerId': 'b', 'score': 5}])
+    leaderboard.drop_board('g')
+
+    assert db.get_rank('g', 'b')['rank'] == 2
+    db.apply_stream_record(_record('MODIFY', 'b', 20, old_score=5))
+    # a score that can go down again (negative deltas) is applied as written
+    db.apply_stream_record(_record('MODIFY', 'a', 3, old_score=10))
+    db.apply_stream_record(_record('INSERT', 'c', 0))
+
+    assert seeds == ['g']
+    assert [e['playerId'] for e in table.item['top']] == ['b', 'a', 'c']
+    assert db.get_rank('g', 'a')['rank'] == 2
+    leaderboard.drop_board('g')
+
+
+def test_drop_board_forgets_the_game():
+    first = leaderboard.get_board('game-1')
+    leaderboard.drop_board('game-1')
+    assert leaderboard.get_board('game-1') is not first
+    leaderboard.drop_board('game-1')
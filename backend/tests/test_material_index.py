@@ -0,0 +1,21 @@
+from material_index import MaterialIndex
+
+
+def test_search_ranks_by_bm25_within_one_owner(tmp_path):
+    index = MaterialIndex(str(tmp_path / 'index.db'))
+    index.add_material('alice', 'm1', 'Mitochondria produce ATP through cellular respiration.')
+    index.add_material('alice', 'm2', 'Photosynthesis in chloroplasts turns light into sugar.')
+    index.add_material('bob', 'm3', 'Mitochondria mitochondria mitochondria.')
+
+    hits = index.search('alice', 'How do mitochondria make ATP?')
+    assert [h['materialId'] for h in hits] == ['m1']
+    assert index.search('alice', 'chloroplasts light')[0]['materialId'] == 'm2'
+    assert index.search('carol', 'mitochondria') == []
+
+
+def test_re_adding_a_material_is_a_no_op(tmp_path):
+    index = MaterialIndex(str(tmp_path / 'index.db'))
+    assert index.add_material('alice', 'm1', 'Osmosis moves water across membranes.') == 1
+    assert index.add_material('alice', 'm1', 'Osmosis moves water across membranes.') == 0
+    index.remove_material('alice', 'm1')
+    assert not index.has_materials('alice')
@@ -0,0 +1,40 @@
+import json
+
+from mcq_stream import IncrementalQuestionParser
+
+
+def test_questions_are_returned_as_soon_as_they_close():
+    questions = [{'question': 'Is "{" a brace?', 'options': ['yes', 'no']}, {'question': 'a\\"b}', 'answer': 1}]
+    document = json.dumps({'questions': questions})
+    parser = IncrementalQuestionParser()
+    found = []
+    for i in range(0, len(document), 7):
+        found.extend(parser.feed(document[i:i + 7]))
+    assert found == questions
+    assert parser.emitted == 2
+
+
+def test_bare_array_and_objects_without_question_key():
+    parser = IncrementalQuestionParser()
+    assert parser.feed('[{"question": "q1"}, {"note": 1}, {"question": "q2"') == [{'question': 'q1'}]
+    assert parser.feed('}]') == [{'question': 'q2'}]
+    assert parser.buffer == []
+
+
+def test_generate_mcq_stream_drops_malformed_questions_and_stops_at_the_count():
+    import aws
+
+    questions = [{'question': 'Q1?', 'options': ['A: x', 'B: y'], 'answer': 0},
+                 {'question': 'no options'},
+                 {'question': 'Q2?', 'options': ['A: x', 'B: y'], 'answer': [1]},
+                 {'question': 'Q3?', 'options': ['A: x', 'B: y'], 'answer': [0]}]
+    text = json.dumps(questions)
+    events = [{'chunk': {'bytes': json.dumps({'contentBlockDelta': {'delta': {'text': text[i:i + 9]}}}).encode()}}
+              for i in range(0, len(text), 9)]
+    bedrock = aws.Bedrock.__new__(aws.Bedrock)
+    bedrock.model_id = 'test-model'
+    bedrock._invoke = lambda body, request, stream: {'body': iter(events)}
+
+    streamed = list(bedrock.generate_mcq_stream(2, prompt='cells'))
+    assert [q['question'] for q in streamed] == ['Q1?', 'Q2?']
+    assert streamed[0]['answer'] == [0]
@@ -0,0 +1,21 @@
+from question_dedup import MinHasher, dedupe, similarity
+
+
+def test_signature_similarity_tracks_text_overlap():
+    hasher = MinHasher()
+    a = hasher.signature('What is the powerhouse of the cell?')
+    assert similarity(a, hasher.signature('What is the powerhouse of the cell')) == 1.0
+    assert similarity(a, hasher.signature('Which planet is closest to the sun?')) < 0.3
+
+
+def test_dedupe_keeps_the_first_of_each_group():
+    questions = [
+        {'question': 'What is the powerhouse of the cell?'},
+        {'question': 'Which organelle is the powerhouse of the cell?'},
+        {'question': 'what is the POWERHOUSE of the cell'},
+        {'question': 'Which planet is closest to the sun?'},
+    ]
+    kept, report = dedupe(questions)
+    assert kept == [questions[0], questions[1], questions[3]]
+    assert [r['index'] for r in report['removed']] == [2]
+    assert report['removed'][0]['duplicateOf'] == questions[0]['question']
@@ -0,0 +1,35 @@
+from question_scheduler import QuestionScheduler, SchedulerStore, TimingWheel
+
+
+def test_timers_fire_once_their_deadline_passes():
+    wheel = TimingWheel(tick=1, wheel_size=4, levels=3, now=0)
+    fired = []
+    for deadline in (2, 5, 40):
+        wheel.schedule(deadline, lambda d=deadline: fired.append(d))
+    cancelled = wheel.schedule(3, lambda: fired.append('cancelled'))
+    cancelled.cancel()
+
+    for cb in wheel.advance(4):
+        cb()
+    assert fired == [2]
+    for cb in wheel.advance(39):
+        cb()
+    assert fired == [2, 5]
+    # 40 sits on the top level and has to cascade down before it fires
+    for cb in wheel.advance(40):
+        cb()
+    assert fired == [2, 5, 40]
+
+
+def test_recover_skips_questions_missed_while_down(tmp_path, monkeypatch):
+    store = SchedulerStore(str(tmp_path / 'state.db'))
+    store.save({'gameId': 'g', 'currentQ': 0, 'numQuestions': 10, 'secondsPerQuestion': 10.0,
+                'deadline': 1000.0, 'status': 'running'})
+    advances = []
+    scheduler = QuestionScheduler(lambda *args: advances.append(args), store)
+    monkeypatch.setattr('question_scheduler.time.time', lambda: 1025.0)
+    assert scheduler.recover() == 1
+    # deadlines at 1000, 1010 and 1020 all passed
+    assert scheduler.games['g']['currentQ'] == 3
+    assert scheduler.games['g']['deadline'] == 1030.0
+    assert advances == [('g', 3, 'running')]
@@ -0,0 +1,45 @@
+import json
+import os
+import time
+
+from response_cache import ResponseCache
+
+
+def test_lru_evicts_least_recently_used():
+    cache = ResponseCache(max_entries=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_expired_entries_are_misses():
+    cache = ResponseCache(max_entries=4, ttl=0.01)
+    cache.set('a', 1)
+    time.sleep(0.02)
+    assert cache.get('a') is None
+
+
+def test_returns_copies():
+    cache = ResponseCache(max_entries=4, ttl=60)
+    value = {'questions': [{'question': 'q'}]}
+    cache.set('a', value)
+    value['questions'].append({'question': 'changed by the writer'})
+    first = cache.get('a')
+    first['questions'].clear()
+    assert cache.get('a') == {'questions': [{'question': 'q'}]}
+
+
+def test_disk_hit_keeps_its_expiry(tmp_path):
+    cache = ResponseCache(max_entries=4, ttl=3600, disk_dir=str(tmp_path))
+    key = 'k'
+    expires_at = time.time() + 0.05
+    with open(os.path.join(str(tmp_path), f'{key}.json'), 'w', encoding='utf-8') as f:
+        json.dump({'expires_at': expires_at, 'value': 'v'}, f)
+    assert cache.get(key) == 'v'
+    time.sleep(0.06)
+    # promoted into memory, but still expires when the disk entry did
+    assert cache.get(key) is None
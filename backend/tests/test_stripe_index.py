@@ -0,0 +1,31 @@
+from stripe_index import CustomerIndex
+
+
+class FakeBackend:
+    def __init__(self):
+        self.items = {}
+
+    def get(self, customer_id):
+        return self.items.get(customer_id)
+
+    def put(self, customer_id, sub):
+        self.items[customer_id] = sub
+
+
+def test_lookup_sees_mappings_changed_elsewhere():
+    backend = FakeBackend()
+    index = CustomerIndex(backend)
+    index.record('cus_1', 'alice')
+    assert index.lookup('cus_1') == 'alice'
+    # another process corrects the mapping; this one must not keep serving the old sub
+    backend.items['cus_1'] = 'bob'
+    assert index.lookup('cus_1') == 'bob'
+
+
+def test_ignores_empty_values():
+    backend = FakeBackend()
+    index = CustomerIndex(backend)
+    index.record('', 'alice')
+    index.record('cus_1', None)
+    assert backend.items == {}
+    assert index.lookup(None) is None
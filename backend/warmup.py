@@ -0,0 +1,134 @@
+import importlib
+import os
+import threading
+import time
+
+# Steps run by run(), in order; see register() and the built-ins below
+WARMUP_STEPS = [s.strip() for s in os.getenv('WARMUP_STEPS', 'clients,jwks,connections').split(',') if s.strip()]
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+# 'sync' blocks the worker until warm; 'background' serves immediately and flips /api/ready when done
+WARMUP_MODE = os.getenv('WARMUP_MODE', 'sync').lower()
+# With strict readiness a failed step keeps the worker out of rotation
+WARMUP_STRICT = os.getenv('WARMUP_STRICT', 'false').lower() in ('1', 'true', 'yes')
+
+# Imported once in the pre-fork master so every worker shares the loaded modules copy-on-write
+PREFORK_IMPORTS = ('boto3', 'botocore.config', 'botocore.exceptions', 'requests', 'jose.jwk', 'jose.jwt')
+
+_steps = {}
+_lock = threading.Lock()
+_status = {'ready': False, 'ok': None, 'started': None, 'finished': None, 'steps': {}}
+
+
+def register(name: str, fn):
+    """Add (or replace) a named warm-up step; `fn()` should create clients or open connections."""
+    _steps[name] = fn
+
+
+def status() -> dict:
+    with _lock:
+        return dict(_status, steps=dict(_status['steps']), pid=os.getpid())
+
+
+def is_ready() -> bool:
+    if not WARMUP_ENABLED:
+        return True
+    with _lock:
+        return _status['ready'] and (_status['ok'] or not WARMUP_STRICT)
+
+
+def run(steps: list = None) -> dict:
+    """Run warm-up steps in order, recording each one's duration and outcome.
+
+    A failing step is recorded and skipped rather than raised: a worker that can't prefetch
+    JWKS still serves requests, it just pays that cost on its first login.
+    """
+    steps = WARMUP_STEPS if steps is None else steps
+    with _lock:
+        _status.update(ready=False, ok=None, started=time.time(), finished=None, steps={})
+    ok = True
+    for name in steps:
+        fn = _steps.get(name)
+        start = time.perf_counter()
+        if fn is None:
+            result = {'ok': False, 'error': 'unknown step'}
+        else:
+            try:
+                detail = fn()
+                result = {'ok': True}
+                if detail:
+                    result['detail'] = detail
+            except Exception as e:
+                result = {'ok': False, 'error': str(e)}
+        result['ms'] = round((time.perf_counter() - start) * 1000, 1)
+        ok = ok and result['ok']
+        with _lock:
+            _status['steps'][name] = result
+    with _lock:
+        _status.update(ready=True, ok=ok, finished=time.time())
+    print(f"warmup: pid {os.getpid()} ready in {(_status['finished'] - _status['started']) * 1000:.0f} ms "
+          f"({'ok' if ok else 'with failures'}): {_status['steps']}")
+    return status()
+
+
+def prefork():
+    """Pre-fork hook (server master): import heavy modules once, open no sockets."""
+    if not WARMUP_ENABLED:
+        return
+    for module in PREFORK_IMPORTS:
+        try:
+            importlib.import_module(module)
+        except ImportError as e:
+            print(f"warmup: prefork import of {module} failed: {e}")
+
+
+def postfork():
+    """Post-fork hook (each worker): drop anything inherited from the master and warm up."""
+    import aws_clients
+    aws_clients.reset()
+    start()
+
+
+def start():
+    if not WARMUP_ENABLED:
+        with _lock:
+            _status.update(ready=True, ok=True, finished=time.time())
+        return
+    if WARMUP_MODE == 'background':
+        threading.Thread(target=run, name='warmup', daemon=True).start()
+    else:
+        run()
+
+
+# ---- built-in steps ----
+
+def _jwks():
+    import auth
+    if not auth.COGNITO_USER_POOL_ID:
+        return 'skipped: COGNITO_USER_POOL_ID not set'
+    return f"{len(auth._fetch_jwks(force=True).get('keys', []))} keys"
+
+
+def _connections():
+    # One cheap call per client opens a pooled TLS connection the first request can reuse
+    # (through the same clients/resources the request path uses, so it's their pools that warm up).
+    import aws
+    import aws_clients
+    import dynamodb_helper as db
+    bucket = os.getenv('QUESTIONBANK_BUCKET', 'questionbankaristotle')
+    aws_clients.client('s3', aws.AWS_REGION).head_bucket(Bucket=bucket)
+    aws_clients.resource('dynamodb', aws.AWS_REGION).meta.client.describe_table(TableName='QuizSessions')
+    aws_clients.resource('dynamodb', db.QUIZ_REGION).meta.client.describe_table(TableName=db.QUIZ_TABLE)
+    return f"s3:{bucket}, dynamodb:QuizSessions,{db.QUIZ_TABLE}"
+
+
+def _extraction():
+    # Spawns the PDF extraction process pool so the first large upload doesn't pay to start it
+    import extraction
+    pool = extraction._get_pool()
+    list(pool.map(abs, range(extraction.EXTRACT_WORKERS)))
+    return f"{extraction.EXTRACT_WORKERS} workers"
+
+
+register('jwks', _jwks)
+register('connections', _connections)
+register('extraction', _extraction)